@@ -3,6 +3,7 @@ PayFineAction class for handling fine payment actions in a library system.
 """
 # pylint: disable=R0801
 import logging
+from src.actions.bulk_fine_action import BulkFineAction
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,10 @@ class PayFineAction:
     public methods:
     - check: Validates if the payment can be processed for a given fine.
     - execute: Processes the payment for a given fine.
+    - check_many: Validates the payment for a list of fines, in bulk when
+      execution_mode is "BULK".
+    - execute_many: Processes the payment for a list of fines, in bulk when
+      execution_mode is "BULK".
     - undo: Reverts the payment action.
     """
 
@@ -34,6 +39,9 @@ class PayFineAction:
         self.__do_pay = not (str(process_active).lower() == "false" or
                              str(trans_active).lower() == "false")
         logger.debug("Pay process active: %s", self.__do_pay)
+        self.__bulk = BulkFineAction(
+            conf, folio_connection, "pay", self.__do_pay, self
+        ) if str(conf.get("execution_mode", "SINGLE")).upper() == "BULK" else None
 
     def check(self, fine):
         """
@@ -129,6 +137,28 @@ class PayFineAction:
             }
         return fine
 
+    def check_many(self, fines):
+        """
+        Check if the pay can proceed for a list of fines. With execution_mode
+        "BULK" the fines are checked with /accounts-bulk/check-pay.
+        :param fines: The fines to check.
+        :return: fines.
+        """
+        if self.__bulk is None:
+            return [self.check(fine) for fine in fines]
+        return self.__bulk.check_many(fines)
+
+    def execute_many(self, fines):
+        """
+        Execute the pay for a list of fines that passed the check. With
+        execution_mode "BULK" the fines are sent to /accounts-bulk/pay.
+        :param fines: The fines to pay.
+        :return: fines.
+        """
+        if self.__bulk is None:
+            return [self.execute(fine) for fine in fines]
+        return self.__bulk.execute_many(fines)
+
     def undo(self):
         """
         Revert the pay action.
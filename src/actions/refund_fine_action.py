@@ -3,6 +3,7 @@ RefundFineAction class for handling fine refund actions in a library system.
 """
 # pylint: disable=R0801
 import logging
+from src.actions.bulk_fine_action import BulkFineAction
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,10 @@ class RefundFineAction:
     public methods:
     - check: Validates if the refund can be processed for a given fine.
     - execute: Processes the refund for a given fine.
+    - check_many: Validates the refund for a list of fines, in bulk when
+      execution_mode is "BULK".
+    - execute_many: Processes the refund for a list of fines, in bulk when
+      execution_mode is "BULK".
     - undo: Reverts the refund action.
     """
 
@@ -34,6 +39,9 @@ class RefundFineAction:
         self.__do_refund = not (str(process_active).lower(
         ) == "false" or str(trans_active).lower() == "false")
         logger.debug("Refund process active: %s", self.__do_refund)
+        self.__bulk = BulkFineAction(
+            conf, folio_connection, "refund", self.__do_refund, self
+        ) if str(conf.get("execution_mode", "SINGLE")).upper() == "BULK" else None
 
     def check(self, fine):
         """
@@ -132,6 +140,28 @@ class RefundFineAction:
             }
         return fine
 
+    def check_many(self, fines):
+        """
+        Check if the refund can proceed for a list of fines. With execution_mode
+        "BULK" the fines are checked with /accounts-bulk/check-refund.
+        :param fines: The fines to check.
+        :return: fines.
+        """
+        if self.__bulk is None:
+            return [self.check(fine) for fine in fines]
+        return self.__bulk.check_many(fines)
+
+    def execute_many(self, fines):
+        """
+        Execute the refund for a list of fines that passed the check. With
+        execution_mode "BULK" the fines are sent to /accounts-bulk/refund.
+        :param fines: The fines to refund.
+        :return: fines.
+        """
+        if self.__bulk is None:
+            return [self.execute(fine) for fine in fines]
+        return self.__bulk.execute_many(fines)
+
     def undo(self):
         """
         Revert the refund action.
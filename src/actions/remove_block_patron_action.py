@@ -56,30 +56,37 @@ class RemoveBlockPatronAction:
     def execute(self, fine):
         """
         Execute the block removal for a given fine.
+        Manual blocks are paged with the "paging_mode" (OFFSET or KEYSET) and
+        "page_size" values from the action configuration.
         :param fine: The fine object to unblock.
         :return: The updated fine object with block removal details.
         """
         logger.info("Executing block removal for fine ID: %s", fine.get("id"))
-        url_1 = "/manualblocks"
         try:
-            all_blocks = self.__connector.get_request(url_1)
-            logger.debug("Retrieved all blocks: %s", all_blocks)
-            for block in all_blocks:
-                if block["type"] == "Manual" and fine["id"] in block["staffInformation"]:
-                    url_2 = f"/manualblocks/{block['id']}"
-                    self.__connector.delete_request(url_2)
-                    logger.info(
-                        "Deleted existing block for fine ID: %s",
-                        fine["id"])
-                    fine[self.__conf["name"]]["delete"] = {
-                        "status": "DELETED",
-                        "message": "Block deleted successfully",
-                        "block_id": block['id'],
-                        "block_data": block
-                    }
-                    logger.debug("Block removal details for fine ID %s: %s",
-                                 fine.get("id"), fine[self.__conf["name"]]["delete"]
-                                 )
+            # Collect the matches before deleting so offset paging does not skip records
+            fine_blocks = [
+                block for block in self.__connector.iter_records(
+                    "/manualblocks", "cql.allRecords=1",
+                    page_size=int(self.__conf.get("page_size", 1000)),
+                    paging_mode=self.__conf.get("paging_mode", "OFFSET"))
+                if block["type"] == "Manual"
+                and fine["id"] in block.get("staffInformation", "")]
+            logger.debug("Retrieved matching blocks: %s", fine_blocks)
+            for block in fine_blocks:
+                url_2 = f"/manualblocks/{block['id']}"
+                self.__connector.delete_request(url_2)
+                logger.info(
+                    "Deleted existing block for fine ID: %s",
+                    fine["id"])
+                fine[self.__conf["name"]]["delete"] = {
+                    "status": "DELETED",
+                    "message": "Block deleted successfully",
+                    "block_id": block['id'],
+                    "block_data": block
+                }
+                logger.debug("Block removal details for fine ID %s: %s",
+                             fine.get("id"), fine[self.__conf["name"]]["delete"]
+                             )
         except Exception as e:
             logger.error("Error during block removal for fine ID: %s. Error: %s",
                          fine.get("id"), e, exc_info=True)
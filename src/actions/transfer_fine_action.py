@@ -3,6 +3,7 @@ TransferFineAction class for transfer fine refund actions in a library system.
 """
 # pylint: disable=R0801
 import logging
+from src.actions.bulk_fine_action import BulkFineAction
 
 logger = logging.getLogger(__name__)
 
@@ -14,6 +15,10 @@ class TransferFineAction:
     public methods:
     - check: Validates if the transfer can be processed for a given fine.
     - execute: Processes the transfer for a given fine.
+    - check_many: Validates the transfer for a list of fines, in bulk when
+      execution_mode is "BULK".
+    - execute_many: Processes the transfer for a list of fines, in bulk when
+      execution_mode is "BULK".
     - undo: Reverts the transfer action.
     """
 
@@ -34,6 +39,9 @@ class TransferFineAction:
         self.__do_transfer = not (str(process_active).lower(
         ) == "false" or str(trans_active).lower() == "false")
         logger.debug("Transfer process active: %s", self.__do_transfer)
+        self.__bulk = BulkFineAction(
+            conf, folio_connection, "transfer", self.__do_transfer, self
+        ) if str(conf.get("execution_mode", "SINGLE")).upper() == "BULK" else None
 
     def check(self, fine):
         """
@@ -135,6 +143,28 @@ class TransferFineAction:
             }
         return fine
 
+    def check_many(self, fines):
+        """
+        Check if the transfer can proceed for a list of fines. With execution_mode
+        "BULK" the fines are checked with /accounts-bulk/check-transfer.
+        :param fines: The fines to check.
+        :return: fines.
+        """
+        if self.__bulk is None:
+            return [self.check(fine) for fine in fines]
+        return self.__bulk.check_many(fines)
+
+    def execute_many(self, fines):
+        """
+        Execute the transfer for a list of fines that passed the check. With
+        execution_mode "BULK" the fines are sent to /accounts-bulk/transfer.
+        :param fines: The fines to transfer.
+        :return: fines.
+        """
+        if self.__bulk is None:
+            return [self.execute(fine) for fine in fines]
+        return self.__bulk.execute_many(fines)
+
     def undo(self):
         """
         Revert the transfer action.
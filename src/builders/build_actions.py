@@ -26,17 +26,18 @@ class BuildActions:
 
     """
 
-    def __init__(self, connector, working_data, settings, trans_active):
+    def __init__(self, connector, working_data, settings, trans_active, entity_cache=None):
         """
         Initialize the BuildActions class.
         :param connector: The connector to the FOLIO system.
         :param fines: The list of fines to be processed.
         :param settings: The configuration settings for the job.
         :param trans_active: Is the transfer active form the jobs.yaml setting profile.
+        :param entity_cache: The run-scoped EntityCache shared by the job's builders.
         """
         logger.info("Initializing BuildActions.")
         self.__connector = connector
-        self.__data_processor = DataProcessor(connector)  # Initialize DataProcessor
+        self.__data_processor = DataProcessor(connector, entity_cache)  # Initialize DataProcessor
         self.__working_data = working_data
 
         working_fines = working_data["charge_data"]["data"]
@@ -116,6 +117,13 @@ class BuildActions:
             conf, self.__connector, trans_active)
         logger.info("sending to %s.", conf['action_type'])
 
+        if hasattr(connector_instance, "check_many"):
+            # Fine actions check and execute many fines at once, which lets
+            # them use the FOLIO bulk endpoints.
+            fines = connector_instance.check_many(fines)
+            connector_instance.execute_many(
+                [fine for fine in fines if fine[conf["name"]]["check"]["allowed"]])
+            return fines
         for fine in fines:
             logger.debug("Processing fine ID: %s", fine["id"])
             fine = connector_instance.check(fine)
@@ -7,8 +7,11 @@ configuration file.
 """
 # pylint: disable=R0801,too-few-public-methods
 import logging
-from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
 from src.shared.data_processor import DataProcessor  # Import the new class
+from src.shared.env_loader import EnvLoader
+from src.shared.state_store import StateStore
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +26,17 @@ class BuildCharges:
     Internal methods:
         __get_outstanding_fines_all() -> list: This function retrieves
             the outstanding fines from the FOLIO system.
+        __get_outstanding_fines_incremental(window: dict) -> list: This function
+            updates the saved fines with the accounts changed since the last run.
+        __fetch_fines(cql: str, on_total: callable, max_records: int) -> list:
+            This function pages through /accounts with the job's paging settings.
+        __fetch_window(window: dict, on_total: callable, max_records: int) -> list:
+            This function fetches the open fines of the charge window, in
+            date shards when "fines_shards" is set.
+        __fetch_shards(window: dict, shards: int) -> list: This function
+            fetches the charge window as date shards at the same time.
+        __shard_bounds(start: date, end: date, shards: int) -> list: This
+            function splits the charge window into shard dates.
         __get_patron_data(fines: list, patron_id: list) -> list: This
             function retrieves the patron data from the FOLIO system
             and adds it to the fine data.
@@ -37,6 +51,7 @@ class BuildCharges:
         "new_field": "patron",
         "api_action": "BATCH",
         "api_root": False,
+        "api_batch_key": "users",
     }
     MATERIAL_MERGE_SETTINGS = {
         "merge_type": "API",
@@ -47,11 +62,12 @@ class BuildCharges:
         "api_root": "mtypes",
     }
 
-    def __init__(self, connector, settings):
+    def __init__(self, connector, settings, entity_cache=None):
         """
         Initialize the BuildCharges class.
         :param connector: The connector to the FOLIO system.
         :param settings: The configuration settings for the job.
+        :param entity_cache: The run-scoped EntityCache shared by the job's builders.
         """
         logger.info("Initializing BuildCharges.")
         self.__settings = settings
@@ -66,7 +82,7 @@ class BuildCharges:
             "uniquePatronCount": 0,
             "rawRecordCount": 0,
         }
-        self.__data_processor = DataProcessor(connector)
+        self.__data_processor = DataProcessor(connector, entity_cache)
         logger.info("BuildCharges initialized with settings: %s", settings)
 
     def get_charges(self):
@@ -137,6 +153,14 @@ class BuildCharges:
     def __get_outstanding_fines_all(self):
         """
         This function retrieves the outstanding fines from the FOLIO system.
+        The fines are pulled a page at a time ("fines_page_size", default 1000)
+        up to "max_fines_to_be_pulled" records. "fines_paging_mode" selects
+        OFFSET (default) or KEYSET paging. With OFFSET paging,
+        "fines_page_workers" pages are fetched at the same time once the total
+        is known and "fines_page_ordered" keeps them in query order.
+        "fines_stream_decode" parses sequential pages as they download.
+        "fines_incremental" only fetches the accounts changed since the last run.
+        "fines_shards" splits the window into date shards fetched at the same time.
         :return: A list of outstanding fines.
         """
         logger.info("Retrieving outstanding fines.")
@@ -145,20 +169,251 @@ class BuildCharges:
             "charge_days_outstanding", 0)
         limit = self.__settings.get("max_fines_to_be_pulled", 10000000)
 
-        cur_date = date.today()
+        cur_date = self.__connector.today()
         file_name_date = cur_date - \
             timedelta(days=int(charge_days_outstanding))
         max_age = cur_date - timedelta(days=int(charges_max_age))
+        window = {
+            "start": max_age.strftime("%Y-%m-%d"),
+            "end": file_name_date.strftime("%Y-%m-%d"),
+            "max_age": int(charges_max_age),
+            "days_outstanding": int(charge_days_outstanding),
+        }
+        if self.__settings.get("fines_incremental", False):
+            return self.__get_outstanding_fines_incremental(window)
 
-        url = f'/accounts?query=(status.name=="Open" and metadata.createdDate < {
-            file_name_date.strftime("%Y-%m-%d")} and metadata.createdDate > {
-            max_age.strftime("%Y-%m-%d")})&limit={limit}'
-        logger.debug("Generated URL for outstanding fines: %s", url)
+        def set_reported_count(total):
+            self.__filter_data['reportedRecordCount'] = total
 
-        data = self.__connector.get_request(url)
-        self.__filter_data['reportedRecordCount'] = data['resultInfo']['totalRecords']
+        fines = self.__fetch_window(window, set_reported_count, int(limit))
         logger.info("Reported record count: %d",
                     self.__filter_data['reportedRecordCount'])
-        return data['accounts']
-    
+        return fines
+
+    def __fetch_fines(self, cql, on_total=None, max_records=None):
+        """
+        This function pages through /accounts with the job's paging settings.
+        :param cql: The CQL query to run.
+        :param on_total: Called with the total record count from the first page.
+        :param max_records: Stop after this many records.
+        :return: A list of accounts.
+        """
+        return list(self.__connector.iter_records(
+            '/accounts', cql,
+            page_size=int(self.__settings.get("fines_page_size", 1000)),
+            max_records=max_records,
+            on_total=on_total,
+            paging_mode=self.__settings.get("fines_paging_mode", "OFFSET"),
+            workers=int(self.__settings.get("fines_page_workers", 1)),
+            ordered=bool(self.__settings.get("fines_page_ordered", True)),
+            stream=bool(self.__settings.get("fines_stream_decode", False))))
+
+    @staticmethod
+    def __window_cql(start, end, first=True):
+        """
+        This function builds the query for the open fines created in a window.
+        :param start: The first day, excluded for the first shard of the window.
+        :param end: The day after the window.
+        :param first: The window starts at the charge window's start.
+        :return: The CQL query.
+        """
+        return f'(status.name=="Open" and metadata.createdDate < {end} and ' \
+            f'metadata.createdDate {">" if first else ">="} {start})'
+
+    def __state_store(self):
+        """
+        This function returns the store that keeps charge state between runs.
+        :return: The StateStore.
+        """
+        env = EnvLoader()
+        return StateStore({
+            "type": env.get(name='CHARGE_STATE_STORAGE_TYPE', default='local'),
+            "location": env.get(name='CHARGE_STATE_LOCATION', default='state')})
+
+    def __fetch_window(self, window, on_total=None, max_records=None):
+        """
+        This function fetches the open fines of the whole charge window.
+        With "fines_shards" above 1 the window is split into date shards that
+        are fetched at the same time.
+        :param window: The charge window dates and settings.
+        :param on_total: Called with the total record count.
+        :param max_records: Stop after this many records.
+        :return: A list of accounts.
+        """
+        shards = int(self.__settings.get("fines_shards", 1))
+        if shards <= 1:
+            cql = self.__window_cql(window["start"], window["end"])
+            logger.debug("Generated query for outstanding fines: %s", cql)
+            return self.__fetch_fines(cql, on_total, max_records)
+        fines = self.__fetch_shards(window, shards)
+        if on_total is not None:
+            on_total(len(fines))
+        return fines[:max_records] if max_records is not None else fines
+
+    def __shard_bounds(self, start, end, shards):
+        """
+        This function splits the charge window into shards of whole days.
+        "fines_shard_mode" DAYS (the default) gives every shard the same number
+        of days. COUNT probes day slices with "limit=0" requests and gives every
+        shard about the same number of fines.
+        :param start: The first day of the window.
+        :param end: The day after the window.
+        :param shards: The number of shards wanted.
+        :return: A sorted list of shard dates, from start to end.
+        """
+        days = max((end - start).days, 1)
+        mode = str(self.__settings.get("fines_shard_mode", "DAYS")).upper()
+        if mode != "COUNT":
+            bounds = [start + timedelta(days=round(i * days / shards)) for i in range(shards)]
+            return sorted(set(bounds)) + [end]
+        slices = sorted({start + timedelta(days=round(i * days / (shards * 4)))
+                         for i in range(shards * 4)}) + [end]
+        workers = int(self.__settings.get("fines_shard_workers", shards))
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix="charge-probe") as executor:
+            counts = list(executor.map(
+                lambda i: self.__connector.count_records('/accounts', self.__window_cql(
+                    slices[i], slices[i + 1], i == 0)),
+                range(len(slices) - 1)))
+        target = sum(counts) / shards
+        bounds = [start]
+        seen = 0
+        for i, count in enumerate(counts[:-1]):
+            seen += count
+            if seen >= target * len(bounds) and len(bounds) < shards:
+                bounds.append(slices[i + 1])
+        logger.info("Probed %d fines in %d slices for %d shards.",
+                    sum(counts), len(counts), len(bounds))
+        return bounds + [end]
+
+    def __fetch_shards(self, window, shards):
+        """
+        This function fetches the charge window as date shards, with up to
+        "fines_shard_workers" (default one per shard) at the same time. The
+        shards are joined in date order, and each shard is sorted by id, so
+        the result is the same however the fetches finish.
+        When a shard fails the finished shards are saved to the charge state
+        store and the error is raised. A rerun on the same day only fetches
+        the shards that are missing.
+        :param window: The charge window dates and settings.
+        :param shards: The number of shards wanted.
+        :return: A list of accounts.
+        """
+        bounds = [day.isoformat() for day in self.__shard_bounds(
+            date.fromisoformat(window["start"]), date.fromisoformat(window["end"]), shards)]
+        keys = [f"{bounds[i]}|{bounds[i + 1]}" for i in range(len(bounds) - 1)]
+        store = self.__state_store()
+        name = f"charges_{getattr(self.__connector, 'run_env', 'folio').lower()}_shards.json"
+        saved = store.load_json(name) or {}
+        today = self.__connector.today().isoformat()
+        done = {key: fines for key, fines in saved.get("shards", {}).items()
+                if key in keys} if saved.get("date") == today else {}
+        if done:
+            logger.info("Resuming %d of %d charge shards saved by an earlier run.",
+                        len(done), len(keys))
+        workers = int(self.__settings.get("fines_shard_workers", len(keys)))
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(workers, 1),
+                                thread_name_prefix="charge-shard") as executor:
+            futures = {
+                executor.submit(self.__fetch_fines, self.__window_cql(
+                    *key.split('|'), first=i == 0)): key
+                for i, key in enumerate(keys) if key not in done}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    done[key] = future.result()
+                    logger.info("Fetched %d fines for shard %s.", len(done[key]), key)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error("Charge shard %s failed: %s", key, e)
+                    errors.append(e)
+        if errors:
+            try:
+                store.save_json(name, {"date": today, "shards": done})
+            except Exception as e:  # pylint: disable=broad-except
+                logger.warning("Unable to save the finished charge shards to %s: %s",
+                               name, e)
+            raise errors[0]
+        if saved:
+            store.save_json(name, {})
+        return [fine for key in keys for fine in done[key]]
+
+    def __get_outstanding_fines_incremental(self, window):
+        """
+        This function keeps the open fines of the charge window in a state
+        file and only asks FOLIO for what changed since the last run:
+            - accounts updated at or after the saved metadata.updatedDate
+              high-water mark, whatever their status, so paid, waived or
+              closed fines are dropped and changed ones replaced;
+            - open accounts that aged into the window since the last run.
+        Fines that aged out of the window are dropped. The whole window is
+        pulled again when there is no state, the window settings changed or
+        the last full pull is older than "fines_full_refresh_days" (default 7).
+        The updatedDate query reaches back "fines_watermark_overlap_minutes"
+        (default 10) before the mark, so updates saved while the last run
+        was paging are not missed; fetching a fine twice is harmless.
+        The state is kept under CHARGE_STATE_LOCATION (default "state"), in
+        S3 when CHARGE_STATE_STORAGE_TYPE is S3, and is named by
+        "fines_state_name" (default "charges_{run_env}.json").
+        :param window: The charge window dates and settings.
+        :return: A list of outstanding fines sorted by id.
+        """
+        store = self.__state_store()
+        name = self.__settings.get(
+            "fines_state_name",
+            f"charges_{getattr(self.__connector, 'run_env', 'folio').lower()}.json")
+        limit = int(self.__settings.get("max_fines_to_be_pulled", 10000000))
+        refresh_days = int(self.__settings.get("fines_full_refresh_days", 7))
+        overlap = timedelta(minutes=int(self.__settings.get(
+            "fines_watermark_overlap_minutes", 10)))
+        today = self.__connector.today()
+        settings = {key: window[key] for key in ("max_age", "days_outstanding")}
+
+        state = store.load_json(name) or {}
+        full_pull = state.get("full_pull")
+        rebuild = not state.get("watermark") or state.get("settings") != settings or \
+            not full_pull or \
+            date.fromisoformat(full_pull) <= today - timedelta(days=refresh_days)
+        if rebuild:
+            logger.info("Pulling the whole charge window to rebuild %s.", name)
+            fines = self.__fetch_window(window)
+            accounts = {fine['id']: fine for fine in fines}
+            changed = len(fines)
+            full_pull = today.isoformat()
+        else:
+            accounts = state["accounts"]
+            since = datetime.fromisoformat(state["watermark"].replace('Z', '+00:00')) - overlap
+            updated = self.__fetch_fines(
+                f'metadata.updatedDate >= "{since.isoformat(timespec="milliseconds")}"')
+            aged_in = self.__fetch_fines(
+                self.__window_cql(state["window_end"], window["end"], first=False)
+            ) if state.get("window_end", window["end"]) < window["end"] else []
+            for fine in updated + aged_in:
+                if fine.get('status', {}).get('name') == "Open":
+                    accounts[fine['id']] = fine
+                else:
+                    accounts.pop(fine['id'], None)
+            changed = len(updated) + len(aged_in)
+            fines = updated + aged_in
+            logger.info("Fetched %d changed and %d newly outstanding fines since %s.",
+                        len(updated), len(aged_in), state["watermark"])
+
+        accounts = {
+            account_id: fine for account_id, fine in accounts.items()
+            if window["start"] < fine['metadata']['createdDate'] < window["end"]}
+        watermark = max([state.get("watermark") or ""] + [
+            fine['metadata'].get('updatedDate') or "" for fine in fines])
+        store.save_json(name, {
+            "watermark": watermark,
+            "window_end": window["end"],
+            "settings": settings,
+            "full_pull": full_pull,
+            "accounts": accounts,
+        })
+        self.__filter_data['reportedRecordCount'] = len(accounts)
+        self.__filter_data['changedRecordCount'] = changed
+        logger.info("Incremental charge state holds %d fines, high-water mark %s.",
+                    len(accounts), watermark)
+        return [accounts[account_id] for account_id in sorted(accounts)][:limit]
+
 # End of class BuildCharges
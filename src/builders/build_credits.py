@@ -5,9 +5,10 @@ This class is responsible for building the credit data for FOLIO.
 It retrieves the data from the FOLIO system and processes it according to the
 configuration file."""
 # pylint: disable=R0801,too-few-public-methods
+import copy
 import logging
 import json
-from datetime import date, timedelta
+from datetime import timedelta
 from src.shared.data_processor import DataProcessor  # Import the new class
 
 logger = logging.getLogger(__name__)
@@ -34,6 +35,7 @@ class BuildCredits:
         "new_field": "patron",
         "api_action": "BATCH",
         "api_root": False,
+        "api_batch_key": "users",
     }
     MATERIAL_MERGE_SETTINGS = {
         "merge_type": "API",
@@ -44,15 +46,17 @@ class BuildCredits:
         "api_root": "mtypes",
     }
 
-    def __init__(self, connector, settings):
+    def __init__(self, connector, settings, entity_cache=None):
         """
         Initialize the BuildCredits class.
         :param connector: The connector to the FOLIO system.
         :param settings: The configuration settings for the job.
+        :param entity_cache: The run-scoped EntityCache shared by the job's builders.
         """
         logger.info("Initializing BuildCredits.")
         self.__settings = settings
         self.__connector = connector
+        self.__entity_cache = entity_cache
 
         # ******
         #   Setup some variables to store data for processing
@@ -64,7 +68,7 @@ class BuildCredits:
             "rawRecordCount": 0,
         }
 
-        self.__data_processor = DataProcessor(connector)  # Initialize DataProcessor
+        self.__data_processor = DataProcessor(connector, entity_cache)  # Initialize DataProcessor
         logger.info("BuildCredits initialized with settings: %s", settings)
 
     def get_credits(self):
@@ -99,7 +103,8 @@ class BuildCredits:
         logger.info(
             "Raw record count: %d",
             self.__filter_data['rawRecordCount'])
-        logger.debug("Credit data: %s", json.dumps(credit_data, indent=4))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Credit data: %s", json.dumps(credit_data, indent=4))
         logger.info("Credit data retrieval complete.")
 
         if 'formatters' in self.__settings and 'credit_formatters' in self.__settings[
@@ -115,15 +120,17 @@ class BuildCredits:
                     credit_data, config)
                 logger.debug("Applied merger: %s", config)
 
-        logger.debug("Credit data after formatters and merges: %s",
-                     json.dumps(credit_data, indent=4))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Credit data after formatters and merges: %s",
+                         json.dumps(credit_data, indent=4))
 
         if 'filters' in self.__settings and 'credit_filters' in self.__settings['filters']:
             for config in self.__settings['filters']['credit_filters']:
                 credit_data = self.__data_processor.general_filter_function(
                     credit_data, config)
-                logger.debug("Credit data after filter %s: %s",
-                             config["name"], json.dumps(credit_data, indent=4))
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Credit data after filter %s: %s",
+                                 config["name"], json.dumps(credit_data, indent=4))
                 logger.debug("Applied filter: %s", config)
 
         self.__filter_data.update(self.__data_processor.get_filter_data())
@@ -155,7 +162,7 @@ class BuildCredits:
         logger.info("Retrieving outstanding credits.")
         credit_days_outstanding = self.__settings[
             "credit_days_outstanding"] if self.__settings["credit_days_outstanding"] else 1
-        cur_date = date.today()
+        cur_date = self.__connector.today()
         start_age = cur_date - timedelta(days=int(credit_days_outstanding))
         end_age = cur_date - timedelta(days=1)
         date_format = '%Y-%m-%d'
@@ -178,24 +185,34 @@ class BuildCredits:
     def __get_fee_fine_data(self, credit_data):
         """
         This function retrieves the fee fine data from the FOLIO system and
-        includes it in the credit data.
+        includes it in the credit data. Accounts already in the entity cache are
+        reused; the rest are looked up with chunked "id==(a or b ...)" queries,
+        "credit_lookup_workers" (default 1) at a time; any account the query does
+        not return is fetched on its own.
         :param credit_data: The list of credits to process.
         :return: The list of credits with the fee fine data included.
         """
         logger.info("Retrieving fee fine data for credits.")
+        ids = [c["feeFineId"] for c in credit_data]
+        accounts = {}
+        if self.__entity_cache is not None:
+            accounts = self.__entity_cache.get_many('/accounts', ids)
+        fetched = self.__connector.get_many(
+            '/accounts', [i for i in ids if i not in accounts],
+            workers=int(self.__settings.get("credit_lookup_workers", 1)))
+        if self.__entity_cache is not None:
+            self.__entity_cache.put_many('/accounts', fetched)
+        accounts.update(fetched)
         new_data = []
         for c in credit_data:
-            url = f'/accounts/{c["feeFineId"]}'
-            fine_data = self.__connector.get_request(url)
+            if c["feeFineId"] in accounts:
+                fine_data = copy.deepcopy(accounts[c["feeFineId"]])
+            else:
+                fine_data = self.__connector.get_request(f'/accounts/{c["feeFineId"]}')
             fine_data['report_data'] = c
             new_data.append(fine_data)
-            logger.debug(
-                "Retrieved fee fine data for credit: %s",
-                c["feeFineId"])
-            logger.debug(
-                "Fee fine data: %s",
-                json.dumps(fine_data, indent=4))
-        logger.info("Fee fine data merged into credit_data.")
+        logger.info("Fee fine data merged into credit_data: %d credits, %d accounts.",
+                    len(new_data), len(accounts))
         return new_data
     
 # End of BuildCredits class
@@ -6,9 +6,11 @@ import os
 import logging
 import functools
 from calendar import monthrange
+from concurrent.futures import ThreadPoolExecutor
 from src.builders.build_actions import BuildActions
 from src.shared.yaml_loader import YamlLoader
 from src.shared.folio_connector import FolioConnector
+from src.shared.entity_cache import EntityCache
 from src.builders.build_charges import BuildCharges
 from src.builders.build_credits import BuildCredits
 from src.builders.build_export import ExportData
@@ -43,7 +45,11 @@ class JobProcessor:
     This class processes the active jobs based on the configuration file.
     exposed methods:
         process_active_jobs() -> None
+        run_active_jobs() -> None: Processes the active jobs and raises the
+            first error instead of swallowing it.
     Internal methods:
+        __build_datasets(connector : FolioConnector, settings : dict,
+            entity_cache : EntityCache) -> tuple
         __check_days(job : dict) -> bool
         __check_month(job : dict) -> bool
         __check_day(job : dict) -> bool
@@ -71,6 +77,15 @@ class JobProcessor:
         """
         This function processes the active jobs based on the configuration file.
         This is the main call function after the class has been instantiated.
+        Errors are logged and swallowed; use run_active_jobs() to have them raised.
+        :return: None
+        """
+        self.run_active_jobs()
+
+    def run_active_jobs(self):
+        """
+        This function processes the active jobs based on the configuration file
+        and stops at the first job that fails.
         :return: None
         :raises Exception: If an error occurs during job processing.
         """
@@ -85,19 +100,19 @@ class JobProcessor:
                              settings)
 
                 # set up the connector to FOLIO -- this is used by all
-                # functions to
-                connector = FolioConnector(job)
+                # functions to. Jobs for the same run_env share one connector.
+                connector = FolioConnector.for_env(job)
                 logger.info("Connector initialized.")
 
-                # Build the charge data
-                logger.info("Building charge data.")
-                charge_data = BuildCharges(connector, settings).get_charges()
+                # One entity cache per job so charges, credits and actions
+                # look each patron, account and material type up once.
+                entity_cache = EntityCache(settings.get("entity_cache_size", 50000))
+
+                # Build the charge and credit data
+                charge_data, refund_data = self.__build_datasets(
+                    connector, settings, entity_cache)
                 logger.debug("Charge data %s",
                              charge_data)
-
-                # Build the credit data
-                logger.info("Building credit data.")
-                refund_data = BuildCredits(connector, settings).get_credits()
                 logger.debug("Refund data %s",
                              refund_data)
 
@@ -114,9 +129,14 @@ class JobProcessor:
                     connector,
                     working_data,
                     settings,
-                    trans_active).get_process_data()
+                    trans_active,
+                    entity_cache).get_process_data()
                 logger.debug("Process data %s",
                              working_data)
+                working_data["folio_summary"] = connector.run_summary()
+                working_data["folio_summary"]["entities"] = entity_cache.stats()
+                logger.info("FOLIO summary: %s",
+                            working_data["folio_summary"])
 
                 # Build the export data
                 ExportData(working_data, settings)
@@ -150,14 +170,13 @@ class JobProcessor:
             settings = YamlLoader().load_config(job_config)
 
             # set up the connector to FOLIO -- this is used by all functions to
-            connector = FolioConnector(job)
+            connector = FolioConnector.for_env(job)
+            entity_cache = EntityCache(settings.get("entity_cache_size", 50000))
 
-            # Build the charge data
-            charge_data = BuildCharges(connector, settings).get_charges()
+            # Build the charge and credit data
+            charge_data, refund_data = self.__build_datasets(
+                connector, settings, entity_cache)
             logger.debug("Charge data: %s", charge_data)
-
-            # Build the credit data
-            refund_data = BuildCredits(connector, settings).get_credits()
             logger.debug("Refund data: %s", refund_data)
 
 
@@ -172,8 +191,12 @@ class JobProcessor:
                 connector,
                 working_data,
                 settings,
-                False).get_process_data()
+                False,
+                entity_cache).get_process_data()
             logger.debug("Process data: %s", working_data)
+            working_data["folio_summary"] = connector.run_summary()
+            working_data["folio_summary"]["entities"] = entity_cache.stats()
+            logger.info("FOLIO summary: %s", working_data["folio_summary"])
 
             # Build the export data
             ExportData(working_data, settings)
@@ -185,6 +208,43 @@ class JobProcessor:
                          exc_info=True)
             raise e
 
+    def __build_datasets(self, connector, settings, entity_cache):
+        """
+        This function builds the charge and credit data. The two builds do not
+        depend on each other, so with "concurrent_builds: true" in the job
+        settings they run at the same time in two threads sharing the
+        connector and entity cache. Each build keeps its own data, errors and
+        summary. If a build fails the other one is still waited for, both
+        failures are logged and the first one is raised.
+        :param connector: The FolioConnector for the job.
+        :param settings: The job settings.
+        :param entity_cache: The EntityCache for the job.
+        :return: A tuple of the charge data and the refund data.
+        """
+        builds = {
+            "charge": BuildCharges(connector, settings, entity_cache).get_charges,
+            "credit": BuildCredits(connector, settings, entity_cache).get_credits,
+        }
+        if not settings.get("concurrent_builds", False):
+            results = {}
+            for name, build in builds.items():
+                logger.info("Building %s data.", name)
+                results[name] = build()
+            return results["charge"], results["credit"]
+
+        logger.info("Building charge and credit data concurrently.")
+        with ThreadPoolExecutor(max_workers=len(builds),
+                                thread_name_prefix="build") as executor:
+            futures = {name: executor.submit(build) for name, build in builds.items()}
+        errors = {name: future.exception() for name, future in futures.items()
+                  if future.exception() is not None}
+        for name, error in errors.items():
+            logger.error("Building %s data failed: %s", name, error,
+                         exc_info=error)
+        if errors:
+            raise next(iter(errors.values()))
+        return futures["charge"].result(), futures["credit"].result()
+
     def __check_days(self, job):
         """
         This function checks if the job should run on the current day of the week.
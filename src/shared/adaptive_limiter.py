@@ -0,0 +1,153 @@
+"""
+adaptive_limiter.py - an AIMD concurrency limit that follows the latency and
+error rate FOLIO is showing.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    A thread-safe adaptive concurrency limit. Requests wait in acquire() while
+    the number in flight has reached the limit and report their latency and
+    outcome to release().
+    Once a window of requests has finished (at least "window" and at least the
+    current limit), the limit goes up by one if the window's p95 latency and
+    error rate are within their targets, and is cut by "backoff" if the p95 is
+    too slow. A timeout, 5xx or 429 cuts the limit straight away, at most once
+    per recent p95 latency, so a burst of failures only counts once.
+    When the limiter is disabled it never blocks but still records latency.
+    exposed methods:
+        acquire() -> None: Waits for a free slot.
+        release(latency: float, overloaded: bool) -> None: Frees a slot and
+            records the outcome of the request.
+        stats() -> dict: Returns the current limit and latency stats.
+    """
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, enabled=True, min_limit=1, max_limit=10, initial=None,
+                 target_latency=2.0, target_error_rate=0.05, window=10, backoff=0.5):
+        """
+        Initialize the AdaptiveLimiter class.
+        :param enabled: Turn off to record latency without limiting.
+        :param min_limit: The lowest limit.
+        :param max_limit: The highest limit.
+        :param initial: The starting limit (default min_limit).
+        :param target_latency: The p95 latency target in seconds.
+        :param target_error_rate: The share of failed requests allowed in a window.
+        :param window: The minimum number of requests between increases.
+        :param backoff: The factor the limit is multiplied by when it is cut.
+        """
+        self.enabled = bool(enabled)
+        self.min_limit = max(int(min_limit), 1)
+        self.max_limit = max(int(max_limit), self.min_limit)
+        self.limit = float(min(max(int(initial or self.min_limit), self.min_limit),
+                               self.max_limit))
+        self.target_latency = float(target_latency)
+        self.target_error_rate = float(target_error_rate)
+        self.window = max(int(window), 1)
+        self.backoff = float(backoff)
+        self.__cond = threading.Condition()
+        self.__in_flight = 0
+        self.__window_latencies = []
+        self.__window_errors = 0
+        self.__recent = deque(maxlen=1000)
+        self.__last_cut = 0.0
+        self.__counts = {"requests": 0, "errors": 0, "increases": 0, "decreases": 0}
+        logger.info("AdaptiveLimiter initialized: enabled %s, limit %d (%d-%d), "
+                    "p95 target %.2fs.", self.enabled, int(self.limit),
+                    self.min_limit, self.max_limit, self.target_latency)
+
+    def acquire(self):
+        """
+        This function waits until fewer requests than the limit are in flight.
+        """
+        with self.__cond:
+            while self.enabled and self.__in_flight >= int(self.limit):
+                self.__cond.wait()
+            self.__in_flight += 1
+
+    def release(self, latency, overloaded=False):
+        """
+        This function frees a slot and adjusts the limit.
+        :param latency: The request latency in seconds.
+        :param overloaded: True when the request timed out or FOLIO answered
+            with a 5xx or 429.
+        """
+        with self.__cond:
+            self.__in_flight -= 1
+            self.__counts["requests"] += 1
+            self.__recent.append(latency)
+            self.__window_latencies.append(latency)
+            if overloaded:
+                self.__counts["errors"] += 1
+                self.__window_errors += 1
+                if time.monotonic() - self.__last_cut >= self.__percentile(self.__recent, 95):
+                    self.__cut("overloaded")
+            elif len(self.__window_latencies) >= max(self.window, int(self.limit)):
+                p95 = self.__percentile(self.__window_latencies, 95)
+                error_rate = self.__window_errors / len(self.__window_latencies)
+                if p95 > self.target_latency:
+                    self.__cut(f"p95 {p95:.2f}s")
+                elif error_rate <= self.target_error_rate and self.limit < self.max_limit:
+                    self.limit = min(self.limit + 1, self.max_limit)
+                    self.__counts["increases"] += 1
+                    self.__reset_window()
+                    logger.debug("Concurrency limit raised to %d.", int(self.limit))
+                else:
+                    self.__reset_window()
+            self.__cond.notify_all()
+
+    def __cut(self, reason):
+        """
+        This function multiplies the limit by the backoff factor.
+        :param reason: Why the limit is cut, for the log.
+        """
+        self.__last_cut = time.monotonic()
+        self.__reset_window()
+        if self.limit <= self.min_limit:
+            return
+        self.limit = max(self.limit * self.backoff, self.min_limit)
+        self.__counts["decreases"] += 1
+        logger.info("Concurrency limit cut to %d (%s).", int(self.limit), reason)
+
+    def __reset_window(self):
+        """
+        This function starts a new measurement window.
+        """
+        self.__window_latencies = []
+        self.__window_errors = 0
+
+    @staticmethod
+    def __percentile(values, pct):
+        """
+        This function returns a percentile of a list of values.
+        :param values: The values.
+        :param pct: The percentile from 0 to 100.
+        :return: The value, or 0 for an empty list.
+        """
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def stats(self):
+        """
+        This function returns the current limit and the latency of recent requests.
+        :return: A dict with the limit, counters and latency in milliseconds.
+        """
+        with self.__cond:
+            return {
+                "enabled": self.enabled,
+                "limit": int(self.limit),
+                **self.__counts,
+                "p50_ms": round(self.__percentile(self.__recent, 50) * 1000, 1),
+                "p95_ms": round(self.__percentile(self.__recent, 95) * 1000, 1),
+                "max_ms": round(max(self.__recent, default=0.0) * 1000, 1),
+            }
+
+# End of adaptive_limiter.py
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+    This script is used to call the FOLIO API with asyncio. It is a standalone
+    utility for scripts that want many requests in flight from one event loop;
+    the jobs use the thread-based folio_connector.py.
+"""
+import asyncio
+import logging
+import httpx
+from src.shared.env_loader import EnvLoader
+from src.shared.rate_limiter import RateLimiter
+from src.shared.token_expiry import TokenExpiry
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncFolioConnector:
+    """
+    This class is used to get the auth token and to make concurrent requests
+    to the FOLIO API using a shared httpx.AsyncClient.
+
+    The number of requests in flight is bounded by a semaphore read from
+    {RUN_ENV}_FOLIO_MAX_CONCURRENCY (default 10). Requests go through its own
+    rate limiter, set from the same {RUN_ENV}_FOLIO_RATE_LIMIT and _RATE_BURST
+    as FolioConnector. The connector must be opened before use, either with
+    "async with" or by awaiting open().
+
+    It is not used by the jobs and does not follow FolioConnector's request
+    handling. Timeouts and connection failures are retried up to RETRIES
+    times with exponential backoff, except that a POST is only retried when
+    the connection was never made, as in RetryPolicy.DEFAULT_POLICIES. 429
+    and 503 answers are retried after the Retry-After pause; any other error
+    status is raised.
+    There is no retry policy or budget, no circuit breaker, no adaptive
+    concurrency, no response cache and no request metrics.
+
+    init:
+        job: The job object that is passed to the script. This is used to get the run_env.
+    exposed methods:
+        open() -> AsyncFolioConnector: Creates the client and logs in.
+        close() -> None: Closes the client.
+        get_request(url_part: str) -> dict: Performs a GET against the FOLIO API.
+        post_request(url_part: str, body: dict) -> dict: Performs a POST against
+            the FOLIO API.
+        delete_request(url_part: str) -> dict: Performs a DELETE against the FOLIO API.
+        gather_many(url_parts: list) -> list: Performs many GETs concurrently and
+            returns the results in the order the url parts were given.
+    Internal methods:
+        __login() -> dict: This function is used to get the auth token.
+        __renew_token(used_token: str) -> None: This function is used to renew
+            the auth token.
+        __send(method: str, url_part: str, body: dict, allow_errors: bool) -> dict:
+            Sends a request with timeout retries and 401 refresh.
+    """
+
+    RETRIES = 5
+    TIMEOUT = 30
+
+    def __init__(self, job):
+        self.run_env = job['run_env'].upper()
+        logger.info("Initializing AsyncFolioConnector for environment: %s",
+                    self.run_env)
+        env = EnvLoader()
+        self.__baseurl = env.get(name=f'{self.run_env}_BASE_URL')
+        self.__headers = {
+            "x-okapi-tenant": env.get(name=f'{self.run_env}_FOLIO_TENANT'),
+            "Content-Type": "application/json"
+        }
+        self.__max_concurrency = env.get_number(
+            name=f'{self.run_env}_FOLIO_MAX_CONCURRENCY', default=10)
+        self.__rate_limiter = RateLimiter(
+            rate=env.get_number(name=f'{self.run_env}_FOLIO_RATE_LIMIT', default=0, cast=float),
+            burst=env.get_number(name=f'{self.run_env}_FOLIO_RATE_BURST', default=1))
+        self.__credentials = {
+            "username": env.get(name=f'{self.run_env}_USER_NAME'),
+            "password": env.get(name=f'{self.run_env}_USER_PASSWORD'),
+        }
+        self.__semaphore = None
+        self.__token_lock = None
+        self.__client = None
+        self.__auth_token = None
+        self.__renew_token_value = None
+        self.__expiry = TokenExpiry(env.get_number(
+            name=f'{self.run_env}_FOLIO_TOKEN_REFRESH_SKEW', default=60))
+        logger.info("Base URL: %s", self.__baseurl)
+        logger.info("Max concurrency: %s", self.__max_concurrency)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def open(self):
+        """
+        This function creates the pooled client and logs in to FOLIO.
+        :return: The opened connector.
+        """
+        self.__semaphore = asyncio.Semaphore(self.__max_concurrency)
+        self.__token_lock = asyncio.Lock()
+        self.__client = httpx.AsyncClient(
+            base_url=self.__baseurl,
+            headers=self.__headers,
+            timeout=self.TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=self.__max_concurrency,
+                max_keepalive_connections=self.__max_concurrency))
+        try:
+            cookies = await self.__login()
+            self.__set_tokens(cookies)
+        except Exception as e:
+            logger.error("Raising exception: %s", e)
+            await self.close()
+            raise
+        logger.info("AsyncFolioConnector initialized successfully.")
+        return self
+
+    async def close(self):
+        """
+        This function closes the pooled client.
+        """
+        if self.__client is not None:
+            await self.__client.aclose()
+            self.__client = None
+        logger.info("AsyncFolioConnector closed.")
+
+    def __set_tokens(self, cookies):
+        """
+        This function stores the tokens returned by login or refresh and
+        places the access token on the client.
+        :param cookies: The cookies returned by FOLIO.
+        """
+        self.__auth_token = cookies['folioAccessToken']
+        self.__renew_token_value = cookies['folioRefreshToken']
+        self.__client.cookies.clear()
+        self.__client.cookies.set('folioAccessToken', self.__auth_token)
+
+    async def __login(self):
+        """
+        This function is used to get the auth token.
+        """
+        logger.info("Attempting to log in to FOLIO API.")
+        try:
+            r = await self.__client.post(
+                "/authn/login-with-expiry", json=self.__credentials)
+            r.raise_for_status()
+            if r.status_code == 201:
+                self.__expiry.update(r)
+                logger.info("Login successful. Auth token retrieved.")
+                return dict(r.cookies.items())
+            logger.warning("Unexpected status code during login: %s",
+                           r.status_code)
+        except httpx.HTTPError as e:
+            logger.error("Raising exception in Login: %s", e)
+            raise
+        return None
+
+    async def __renew_token(self, used_token):
+        """
+        This function is used to renew the auth token using the folioRefreshToken.
+        Only one refresh runs at a time. Callers whose token was already
+        replaced by another refresh return without calling FOLIO again. When
+        the refresh token has expired the connector logs in again.
+        :param used_token: The access token the failed request was sent with.
+        """
+        async with self.__token_lock:
+            if used_token != self.__auth_token:
+                logger.debug("Auth token already renewed by another request.")
+                return
+            if self.__expiry.refresh_expiring():
+                logger.info("Refresh token has expired. Logging in again.")
+                self.__set_tokens(await self.__login())
+                return
+            logger.info("Attempting to renew auth token using refresh token.")
+            try:
+                r = await self.__client.post(
+                    "/authn/refresh",
+                    headers={"Cookie": f"folioRefreshToken={self.__renew_token_value}"})
+                r.raise_for_status()
+                if r.status_code != 200:
+                    logger.warning("Unexpected status code during token renewal: %s",
+                                   r.status_code)
+                    raise RuntimeError("Failed to renew auth token.")
+                self.__expiry.update(r)
+                self.__set_tokens(dict(r.cookies.items()))
+                logger.info("Auth token successfully renewed.")
+            except httpx.HTTPError as e:
+                logger.error("Error during token renewal: %s", e, exc_info=True)
+                raise
+
+    async def __send(self, method, url_part, body=None, allow_errors=False):
+        """
+        This function sends a request to the FOLIO API through the rate limiter.
+        Retries up to 4 times on a timeout or connection failure (for a POST,
+        only a connect failure) or when FOLIO answers 429 or 503, and renews the token shortly before it expires or on a 401.
+        :param method: The HTTP method to use.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :param body: The body of the request.
+        :param allow_errors: Return the body of 422 and 404 responses instead of raising.
+        :return: The data returned from the API.
+        """
+        logger.info("Performing %s request to URL: %s", method, url_part)
+        renewed = False
+        attempt = 0
+        while True:
+            if self.__expiry.access_expiring():
+                logger.info("Auth token is about to expire. Renewing before the request.")
+                await self.__renew_token(self.__auth_token)
+            used_token = self.__auth_token
+            try:
+                async with self.__semaphore:
+                    wait = self.__rate_limiter.reserve()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    r = await self.__client.request(method, url_part, json=body)
+                if r.status_code == 401 and not renewed:
+                    logger.warning("Auth token expired. Attempting to renew token.")
+                    await self.__renew_token(used_token)
+                    renewed = True
+                    continue
+                if r.status_code in (429, 503) and attempt < self.RETRIES - 1:
+                    attempt += 1
+                    logger.warning("%s request throttled with status %s. Attempt %d of %d.",
+                                   method, r.status_code, attempt, self.RETRIES)
+                    self.__rate_limiter.pause(
+                        RateLimiter.retry_after(r.headers, 2 ** (attempt - 1)))
+                    continue
+                if not allow_errors or r.status_code not in [422, 404]:
+                    r.raise_for_status()
+                else:
+                    logger.warning("Ignoring error with status code: %s", r.status_code)
+                data = r.json()
+                logger.debug("%s request successful. Data retrieved: %s", method, data)
+                return data
+            except (httpx.TimeoutException, httpx.ConnectError) as e:
+                # A POST that reached FOLIO may have been applied, so it is
+                # only retried when the connection was never made.
+                if method == "POST" and \
+                        not isinstance(e, (httpx.ConnectTimeout, httpx.ConnectError)):
+                    logger.error("POST request to %s failed and is not retried: %s",
+                                 url_part, e, exc_info=True)
+                    raise
+                attempt += 1
+                logger.warning("%s request failed: %s. Attempt %d of %d.",
+                               method, e, attempt, self.RETRIES)
+                if attempt < self.RETRIES:
+                    await asyncio.sleep(2 ** (attempt - 1))  # Exponential backoff
+                    continue
+                logger.error("%s request failed after %d attempts. Error: %s",
+                             method, self.RETRIES, e, exc_info=True)
+                raise
+            except httpx.HTTPError as e:
+                logger.error("Error during %s request to %s: %s",
+                             method, url_part, e, exc_info=True)
+                raise
+
+    async def get_request(self, url_part):
+        """
+        This function is used to perform a GET action against the FOLIO API.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :return: The data returned from the API.
+        """
+        return await self.__send("GET", url_part)
+
+    async def post_request(self, url_part, body, allow_errors=False):
+        """
+        This function is used to perform a POST action against the FOLIO API.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :param body: The body of the request.
+        :param allow_errors: Return the body of 422 and 404 responses instead of raising.
+        :return: The data returned from the API.
+        """
+        return await self.__send("POST", url_part, body, allow_errors)
+
+    async def delete_request(self, url_part):
+        """
+        This function is used to perform a DELETE action against the FOLIO API.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :return: The data returned from the API.
+        """
+        return await self.__send("DELETE", url_part)
+
+    async def gather_many(self, url_parts, return_exceptions=False):
+        """
+        This function performs a GET for every url part at the same time, with
+        no more than {RUN_ENV}_FOLIO_MAX_CONCURRENCY requests in flight.
+        :param url_parts: The url parts to fetch.
+        :param return_exceptions: Return failed calls as exceptions in the
+            result list instead of raising the first one.
+        :return: The results in the same order as url_parts.
+        """
+        url_parts = list(url_parts)
+        logger.info("Gathering %d GET requests.", len(url_parts))
+        return await asyncio.gather(
+            *(self.get_request(u) for u in url_parts),
+            return_exceptions=return_exceptions)
+
+# End of the AsyncFolioConnector class
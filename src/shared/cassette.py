@@ -0,0 +1,268 @@
+"""
+cassette.py - records the FOLIO requests and responses of a run to a
+compressed file and plays them back without a network.
+"""
+import base64
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import cookiejar_from_dict
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "REDACTED"
+
+
+class CassetteMissError(LookupError):
+    """
+    Raised in replay mode when a request was not recorded.
+    """
+
+
+class Cassette:
+    """
+    A gzip-compressed JSON lines file of FOLIO requests and responses.
+    In RECORD mode every exchange is appended to the file as it happens. In
+    REPLAY mode the file is loaded and every request is answered from it;
+    identical requests get their recorded responses in order and the last one
+    is repeated after that. A request that was not recorded raises
+    CassetteMissError.
+    Auth data is never written: cookies are replaced with "REDACTED", and the
+    body of /authn requests and responses is dropped, so replay needs no
+    credentials and never sees stale token expiry times.
+    The first line of the file holds the recording date. In REPLAY mode
+    today() returns it, so the builders put the same date bounds into their
+    queries as the recorded run and the cassette replays on any day.
+    exposed methods:
+        adapter(**kwargs) -> HTTPAdapter: Returns a transport adapter that
+            records or replays through the cassette.
+        record(request: PreparedRequest, response: Response, elapsed: float) ->
+            None: Appends an exchange to the file.
+        play(request: PreparedRequest) -> Response: Returns the recorded response.
+        today() -> date: Returns the recording date when replaying, else today.
+    """
+
+    RECORD = "RECORD"
+    REPLAY = "REPLAY"
+
+    def __init__(self, mode, path, replay_latency=False):
+        """
+        Initialize the Cassette class.
+        :param mode: RECORD or REPLAY.
+        :param path: The cassette file.
+        :param replay_latency: In REPLAY mode, wait as long as the recorded request took.
+        """
+        self.mode = str(mode).upper()
+        if self.mode not in (self.RECORD, self.REPLAY):
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.path = path
+        self.replay_latency = bool(replay_latency)
+        self.__lock = threading.Lock()
+        self.__responses = {}
+        self.recorded_on = None
+        if self.mode == self.REPLAY:
+            self.__load()
+        else:
+            self.recorded_on = date.today().isoformat()
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with gzip.open(path, 'wt', encoding='utf-8') as file:
+                file.write(json.dumps({"recorded_on": self.recorded_on}) + "\n")
+        logger.info("Cassette %s mode using %s", self.mode, self.path)
+
+    def adapter(self, **kwargs):
+        """
+        This function returns a transport adapter for a requests.Session.
+        :param kwargs: The HTTPAdapter pool settings.
+        :return: The CassetteAdapter.
+        """
+        return CassetteAdapter(self, **kwargs)
+
+    @staticmethod
+    def __key(request):
+        """
+        This function builds the lookup key of a request. The scheme and host
+        are left out so a cassette can be replayed against any base URL.
+        :param request: The requests.PreparedRequest.
+        :return: A tuple of the method, path with query and scrubbed body.
+        """
+        parts = urlsplit(request.url)
+        path = parts.path + (f"?{parts.query}" if parts.query else "")
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', errors='replace')
+        if path.startswith('/authn/'):
+            body = None
+        return request.method, path, body
+
+    def record(self, request, response, elapsed=0.0):
+        """
+        This function appends one exchange to the cassette file.
+        :param request: The requests.PreparedRequest.
+        :param response: The requests.Response. Its body is read.
+        :param elapsed: The seconds the request took.
+        """
+        method, path, body = self.__key(request)
+        content = response.content or b''
+        if path.startswith('/authn/'):
+            content = b'{}'
+        try:
+            encoded, encoding = content.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            encoded, encoding = base64.b64encode(content).decode('ascii'), 'base64'
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in ('set-cookie', 'content-encoding',
+                                           'content-length', 'transfer-encoding')}
+        entry = {
+            "method": method,
+            "url": path,
+            "body": body,
+            "status": response.status_code,
+            "headers": headers,
+            "cookies": {cookie.name: REDACTED for cookie in response.cookies},
+            "content": encoded,
+            "encoding": encoding,
+            "elapsed_ms": round(elapsed * 1000, 1),
+        }
+        line = json.dumps(entry) + "\n"
+        with self.__lock:
+            # Every line is its own gzip member, so a crashed run still
+            # leaves a readable cassette.
+            with gzip.open(self.path, 'at', encoding='utf-8') as file:
+                file.write(line)
+
+    def __load(self):
+        """
+        This function loads the recorded responses.
+        """
+        count = 0
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "recorded_on" in entry:
+                    self.recorded_on = entry["recorded_on"]
+                    continue
+                key = (entry['method'], entry['url'], entry['body'])
+                self.__responses.setdefault(key, deque()).append(entry)
+                count += 1
+        logger.info("Loaded %d recorded FOLIO responses from %s", count, self.path)
+
+    def today(self):
+        """
+        This function returns the date the run should treat as today. When
+        replaying it is the recording date, so date-bounded queries match the
+        recorded ones. Cassettes recorded before the date was saved use today.
+        :return: A datetime.date.
+        """
+        if self.mode == self.REPLAY and self.recorded_on:
+            return date.fromisoformat(self.recorded_on)
+        return date.today()
+
+    def play(self, request):
+        """
+        This function returns the recorded response for a request.
+        :param request: The requests.PreparedRequest.
+        :return: A requests.Response built from the cassette.
+        :raises CassetteMissError: If the request was not recorded.
+        """
+        key = self.__key(request)
+        with self.__lock:
+            entries = self.__responses.get(key)
+            if not entries:
+                raise CassetteMissError(f"No recorded response for {key[0]} {key[1]}")
+            entry = entries.popleft() if len(entries) > 1 else entries[0]
+        if self.replay_latency:
+            time.sleep(entry['elapsed_ms'] / 1000)
+        content = entry['content'].encode('utf-8') if entry['encoding'] == 'utf-8' \
+            else base64.b64decode(entry['content'])
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers['Content-Length'] = str(len(content))
+        response.cookies = cookiejar_from_dict(entry['cookies'])
+        response.url = request.url
+        response.request = request
+        response.reason = ''
+        response.encoding = 'utf-8'
+        response.raw = _ReplayBody(content)
+        return response
+
+
+class _ReplayBody:
+    """
+    A stand-in for the urllib3 response body of a replayed response.
+    """
+
+    def __init__(self, content):
+        self.__content = content
+        self.__offset = 0
+        self.decode_content = True
+
+    def read(self, amt=None, **_kwargs):
+        """
+        This function reads up to amt bytes of the body.
+        """
+        end = len(self.__content) if amt is None else self.__offset + amt
+        chunk = self.__content[self.__offset:end]
+        self.__offset += len(chunk)
+        return chunk
+
+    def stream(self, amt=65536, **_kwargs):
+        """
+        This function yields the body in chunks for Response.iter_content.
+        """
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self):
+        """
+        This function closes the body.
+        """
+
+    def release_conn(self):
+        """
+        This function releases the connection the body came from.
+        """
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    A transport adapter that records responses to a cassette or answers
+    requests from it without touching the network.
+    """
+
+    def __init__(self, cassette, **kwargs):
+        self.cassette = cassette
+        super().__init__(**kwargs)
+
+    # pylint: disable-next=too-many-arguments
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None):
+        """
+        This function records or replays one request.
+        """
+        if self.cassette.mode == Cassette.REPLAY:
+            return self.cassette.play(request)
+        started = time.monotonic()
+        response = super().send(request, stream=stream, timeout=timeout,
+                                verify=verify, cert=cert, proxies=proxies)
+        self.cassette.record(request, response, time.monotonic() - started)
+        if stream:
+            # Recording read the body, so hand the caller a fresh stream of it.
+            response.raw = _ReplayBody(response.content)
+        return response
+
+# End of cassette.py
@@ -0,0 +1,138 @@
+"""
+circuit_breaker.py - per-endpoint circuit breakers that fail fast while a
+FOLIO module is down.
+"""
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of sending a request to an endpoint whose circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    A thread-safe set of circuit breakers, one per endpoint template such as
+    "/users/{id}" or "/accounts/{id}/check-transfer".
+    A circuit opens after "threshold" failures in a row. While it is open,
+    requests to the endpoint raise CircuitOpenError without being sent. After
+    "reset_timeout" seconds one probe request is let through (half-open). The
+    circuit closes when the probe succeeds and opens again when it fails.
+    A threshold of 0 turns the breakers off.
+    exposed methods:
+        endpoint(url_part: str) -> str: Returns the endpoint template of a url part.
+        before(endpoint: str) -> None: Raises CircuitOpenError if the request
+            must not be sent.
+        success(endpoint: str) -> None: Records a successful request.
+        failure(endpoint: str) -> None: Records a failed request.
+        stats() -> dict: Returns the endpoints that are not closed and the
+            number of times circuits opened.
+    """
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    __ID_SEGMENT = re.compile(
+        r'^([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)$')
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        """
+        Initialize the CircuitBreaker class.
+        :param threshold: The failures in a row that open a circuit. 0 disables it.
+        :param reset_timeout: The seconds a circuit stays open before a probe.
+        """
+        self.threshold = int(threshold or 0)
+        self.reset_timeout = float(reset_timeout)
+        self.__circuits = {}
+        self.__opened = 0
+        self.__lock = threading.Lock()
+        logger.info("CircuitBreaker initialized: threshold %d, reset after %.0f seconds.",
+                    self.threshold, self.reset_timeout)
+
+    @classmethod
+    def endpoint(cls, url_part):
+        """
+        This function turns a url part into its endpoint template by dropping
+        the query and replacing id segments with "{id}".
+        :param url_part: The url part, e.g. "/users/1b2c...?limit=1".
+        :return: The endpoint template, e.g. "/users/{id}".
+        """
+        path = url_part.split('?')[0]
+        return '/'.join('{id}' if cls.__ID_SEGMENT.match(segment) else segment
+                        for segment in path.split('/'))
+
+    def before(self, endpoint):
+        """
+        This function checks whether a request to an endpoint may be sent.
+        :param endpoint: The endpoint template.
+        :raises CircuitOpenError: If the circuit is open or a probe is already running.
+        """
+        if self.threshold <= 0:
+            return
+        with self.__lock:
+            circuit = self.__circuits.get(endpoint)
+            if circuit is None or circuit['state'] == self.CLOSED:
+                return
+            if circuit['state'] == self.OPEN and \
+                    time.monotonic() - circuit['opened_at'] >= self.reset_timeout:
+                circuit['state'] = self.HALF_OPEN
+                logger.info("Circuit for %s is half-open. Sending a probe request.", endpoint)
+                return
+        raise CircuitOpenError(f"Circuit for {endpoint} is open; not calling FOLIO.")
+
+    def success(self, endpoint):
+        """
+        This function records a successful request and closes the circuit.
+        :param endpoint: The endpoint template.
+        """
+        if self.threshold <= 0:
+            return
+        with self.__lock:
+            circuit = self.__circuits.get(endpoint)
+            if circuit is None:
+                return
+            if circuit['state'] != self.CLOSED:
+                logger.info("Circuit for %s closed.", endpoint)
+            del self.__circuits[endpoint]
+
+    def failure(self, endpoint):
+        """
+        This function records a failed request and opens the circuit once the
+        threshold is reached or a probe fails.
+        :param endpoint: The endpoint template.
+        """
+        if self.threshold <= 0:
+            return
+        with self.__lock:
+            circuit = self.__circuits.setdefault(
+                endpoint, {'state': self.CLOSED, 'failures': 0, 'opened_at': 0.0})
+            circuit['failures'] += 1
+            if circuit['state'] == self.HALF_OPEN or (
+                    circuit['state'] == self.CLOSED and circuit['failures'] >= self.threshold):
+                circuit['state'] = self.OPEN
+                circuit['opened_at'] = time.monotonic()
+                self.__opened += 1
+                logger.error("Circuit for %s opened after %d failures in a row.",
+                             endpoint, circuit['failures'])
+
+    def stats(self):
+        """
+        This function returns the state of the breakers.
+        :return: A dict with the open or half-open endpoints and the open count.
+        """
+        with self.__lock:
+            return {
+                "opened": self.__opened,
+                "endpoints": {endpoint: circuit['state']
+                              for endpoint, circuit in self.__circuits.items()
+                              if circuit['state'] != self.CLOSED},
+            }
+
+# End of circuit_breaker.py
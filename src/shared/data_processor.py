@@ -17,7 +17,9 @@ class DataProcessor:
     This class processes the data from the data sets.
     It is used to filter, update, and merge data from the data sets.
     init:
-        script_dir : str - The directory of the script that is calling the data processor.
+        connector : FolioConnector - The connector used for the API merges.
+        entity_cache : EntityCache - Optional run-scoped cache the API merges read
+            through, shared with the other builders of the job.
     exposed methods:
         general_filter_function(fines : list, settings : dict) -> list: Runs the filters
             based on the YAML configuration files
@@ -32,13 +34,21 @@ class DataProcessor:
         __filter_get_field_value(data : dict, settings : dict) -> any : Gets the field
             value from the data set.
         __flatten_array(ary : list) -> list: Flattens an array of dictionaries.
+        __cache_kind(raw_url : str) -> str: Returns the entity cache kind of an api_call.
+        __get_cached_data(raw_url : str, filter_id : str) -> dict: Reads a per-fine
+            API merge record through the entity cache.
+        __get_batch_data(settings : dict, ids : list) -> dict: Looks up the records
+            for a BATCH merge with chunked CQL queries.
+        __get_paged_data(settings : dict) -> list: Pages through a FOLIO collection
+            for a FLATTEN merge.
     """
 
-    def __init__(self, connector):
+    def __init__(self, connector, entity_cache=None):
         logger.info("Initializing DataProcessor.")
         self.__filter_data = {}
         self.__error_data = []
         self.__connector = connector
+        self.__entity_cache = entity_cache
         env = EnvLoader()
         conf = {
             "type": env.get(
@@ -219,20 +229,46 @@ class DataProcessor:
                 id_value = get_nested_value(f, settings['filter_field'])
                 logger.debug("Extracted ID value: %s", id_value)
                 ids.append(id_value)
-            for i in ids:
+            kind = self.__cache_kind(settings['api_call'])
+            if self.__entity_cache is not None:
+                batch = self.__entity_cache.get_many(kind, ids)
+            found = self.__get_batch_data(settings, [i for i in ids if i not in batch])
+            fetched = {}
+            for i in dict.fromkeys(ids):
+                if i in batch:
+                    continue
+                if i in found:
+                    fetched[i] = found[i]
+                    continue
                 logger.debug("Fetching data for ID: %s", i)
                 data = self.__get_data(settings['api_call'], i)
                 if "api_root" in settings and settings['api_root'] is not False:
-                    batch[i] = data[settings['api_root']]
+                    fetched[i] = data[settings['api_root']]
                 else:
-                    batch[i] = data
+                    fetched[i] = data
+            if self.__entity_cache is not None:
+                self.__entity_cache.put_many(kind, fetched)
+            batch.update(fetched)
         if "api_action" in settings and settings['api_action'].upper() == "FLATTEN":
             logger.debug("Flattening API data with settings: %s", settings)
-            batch = self.__get_data(settings['api_call'], settings['filter_field'])
-            logger.debug("Raw batch data: %s", batch)
-            if "api_root" in settings and settings['api_root'] is not False:
-                batch = batch[settings['api_root']]
-            batch = self.__flatten_array_dict(batch)
+            kind = self.__cache_kind(settings['api_call'])
+            cache_key = f"{settings['api_call']}|{settings.get('api_query', '')}"
+            cached = None
+            if self.__entity_cache is not None:
+                cached = self.__entity_cache.get(kind, cache_key)
+            if cached is not None:
+                batch = cached
+            else:
+                if settings.get('api_paging_mode'):
+                    batch = self.__get_paged_data(settings)
+                else:
+                    batch = self.__get_data(settings['api_call'], settings['filter_field'])
+                    logger.debug("Raw batch data: %s", batch)
+                    if "api_root" in settings and settings['api_root'] is not False:
+                        batch = batch[settings['api_root']]
+                batch = self.__flatten_array_dict(batch)
+                if self.__entity_cache is not None:
+                    self.__entity_cache.put(kind, cache_key, batch)
             logger.debug("Flattened batch data: %s", batch)
 
         if settings['merge_type'].upper() == "FIELD":
@@ -287,7 +323,7 @@ class DataProcessor:
                     logger.debug("Extracted ID value: %s", working_id)
                     data = batch[working_id]
                 else:
-                    data = self.__get_data(
+                    data = self.__get_cached_data(
                         settings['api_call'], f[settings['filter_field']])
                 set_nested_value(f, data, settings['new_field'])
         logger.info("Merge complete.")
@@ -399,6 +435,90 @@ class DataProcessor:
                 new_data[new_key] = x
         return new_data
 
+    @staticmethod
+    def __cache_kind(raw_url):
+        """
+        This function returns the entity cache kind of an api_call: the path
+        without the host, query string or trailing "/{{ID}}", so
+        "{{FOLIO}}/users/{{ID}}" and "{{FOLIO}}/users" share the kind "/users".
+        :param raw_url : str - The api_call from the merge settings.
+        :returns: str - The cache kind.
+        """
+        kind = raw_url.replace("{{FOLIO}}", '').split('?')[0]
+        if kind.endswith("/{{ID}}"):
+            kind = kind[:-len("/{{ID}}")]
+        return kind
+
+    def __get_cached_data(self, raw_url, filter_id):
+        """
+        This function reads one record of a per-fine API merge through the
+        entity cache, so each id is fetched once per run.
+        :param raw_url : str - The api_call from the merge settings.
+        :param filter_id : str - The id of the record.
+        :returns: dict - The record.
+        """
+        if self.__entity_cache is None:
+            return self.__get_data(raw_url, filter_id)
+        kind = self.__cache_kind(raw_url)
+        data = self.__entity_cache.get(kind, filter_id)
+        if data is None:
+            data = self.__get_data(raw_url, filter_id)
+            self.__entity_cache.put(kind, filter_id, data)
+        return data
+
+    def __get_batch_data(self, settings, ids):
+        """
+        This function looks up the records for a BATCH merge with chunked CQL
+        "id==(a or b ...)" queries. Only FOLIO calls shaped like
+        "{{FOLIO}}/users/{{ID}}" are batched, only when api_batch_key names
+        the collection's record key, and never with an api_root, since the
+        collection records are not shaped like the per-id responses. Any id
+        not returned, or every id when the batched lookup fails, is fetched
+        one at a time by the caller.
+        api_batch_key : The key holding the records in the response, e.g.
+            "users" or "holdingsRecords". Batching is off without it.
+        api_batch_field : The field the ids are matched against (default "id").
+        api_batch_workers : The number of chunks fetched at the same time.
+        :param settings : dict - The merge settings.
+        :param ids : list - The ids to look up.
+        :returns: dict - The records keyed by id.
+        """
+        raw_url = settings['api_call']
+        if not settings.get('api_batch_key') or settings.get('api_root') \
+                or not raw_url.startswith("{{FOLIO}}") or not raw_url.endswith("/{{ID}}"):
+            return {}
+        path = raw_url.replace("{{FOLIO}}", '')[:-len("/{{ID}}")]
+        try:
+            return self.__connector.get_many(
+                path,
+                ids,
+                id_field=settings.get('api_batch_field', 'id'),
+                record_key=settings['api_batch_key'],
+                workers=int(settings.get('api_batch_workers', 1)))
+        except requests.exceptions.HTTPError as e:
+            logger.warning("Batched lookup of %s failed, fetching one id at a time: %s",
+                           path, e)
+            return {}
+
+    def __get_paged_data(self, settings):
+        """
+        This function pages through a FOLIO collection for a FLATTEN merge.
+        The api_call is the collection path (e.g. "{{FOLIO}}/users"), api_query
+        is the CQL to run and api_paging_mode selects OFFSET or KEYSET paging.
+        :param settings : dict - The merge settings.
+        :returns: list - The records in the collection.
+        """
+        path = settings['api_call'].replace("{{FOLIO}}", '').split('?')[0]
+        record_key = settings['api_root'] if settings.get('api_root') else None
+        logger.debug("Paging %s for merge using %s paging.",
+                     path, settings['api_paging_mode'])
+        return list(self.__connector.iter_records(
+            path,
+            settings.get('api_query', 'cql.allRecords=1'),
+            page_size=int(settings.get('api_page_size', 1000)),
+            record_key=record_key,
+            paging_mode=settings['api_paging_mode']))
+
     def __get_data(self, raw_url, filter_id):
         """
         This function is used to get the data from the API.
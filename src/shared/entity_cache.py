@@ -0,0 +1,119 @@
+"""
+entity_cache.py - a run-scoped cache of FOLIO records (users, material
+types, accounts, owners) shared by every builder in a job.
+"""
+import copy
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class EntityCache:
+    """
+    A thread-safe LRU cache of FOLIO records, grouped by kind (the collection
+    path, e.g. "/users") and keyed by id. JobProcessor creates one per job and
+    hands it to BuildCharges, BuildCredits and BuildActions, so a patron that
+    has fines and credits is fetched from FOLIO once per run.
+    Each kind keeps at most "capacity" records; the least recently used one is
+    dropped first. Records are copied in and out, so a builder that changes a
+    record it was given does not change what the other builders see.
+    exposed methods:
+        get(kind: str, key: str) -> any: Returns a copy of a record or None.
+        put(kind: str, key: str, record: any) -> None: Caches a record.
+        get_many(kind: str, keys: list) -> dict: Returns copies of the cached
+            records for the keys.
+        put_many(kind: str, records: dict) -> None: Caches records by key.
+        stats() -> dict: Returns the hit, miss, entry and eviction counts of
+            every kind.
+    """
+
+    def __init__(self, capacity=50000):
+        """
+        Initialize the EntityCache class.
+        :param capacity: The records kept per kind. 0 disables the cache.
+        """
+        self.capacity = int(capacity)
+        self.__kinds = {}
+        self.__stats = {}
+        self.__lock = threading.Lock()
+        logger.info("EntityCache initialized with %d records per kind.", self.capacity)
+
+    def __kind(self, kind):
+        """
+        This function returns the records and counters of a kind, creating them
+        on first use. The caller must hold the lock.
+        :param kind: The record kind.
+        :return: A tuple of the records OrderedDict and the counters dict.
+        """
+        if kind not in self.__kinds:
+            self.__kinds[kind] = OrderedDict()
+            self.__stats[kind] = {"hits": 0, "misses": 0, "evictions": 0}
+        return self.__kinds[kind], self.__stats[kind]
+
+    def get(self, kind, key):
+        """
+        This function returns a cached record.
+        :param kind: The record kind, e.g. "/users".
+        :param key: The record id.
+        :return: A copy of the record, or None when it is not cached.
+        """
+        return self.get_many(kind, [key]).get(key)
+
+    def get_many(self, kind, keys):
+        """
+        This function returns the cached records for many keys.
+        :param kind: The record kind.
+        :param keys: The record ids.
+        :return: A dict of key -> copy of the record for the keys that are cached.
+        """
+        found = {}
+        with self.__lock:
+            records, counters = self.__kind(kind)
+            for key in dict.fromkeys(keys):
+                if key in records:
+                    records.move_to_end(key)
+                    found[key] = records[key]
+                    counters["hits"] += 1
+                else:
+                    counters["misses"] += 1
+        return copy.deepcopy(found)
+
+    def put(self, kind, key, record):
+        """
+        This function caches a record.
+        :param kind: The record kind.
+        :param key: The record id.
+        :param record: The record.
+        """
+        self.put_many(kind, {key: record})
+
+    def put_many(self, kind, records):
+        """
+        This function caches many records.
+        :param kind: The record kind.
+        :param records: A dict of key -> record.
+        """
+        if self.capacity <= 0 or not records:
+            return
+        records = copy.deepcopy(records)
+        with self.__lock:
+            cached, counters = self.__kind(kind)
+            for key, record in records.items():
+                cached[key] = record
+                cached.move_to_end(key)
+            while len(cached) > self.capacity:
+                cached.popitem(last=False)
+                counters["evictions"] += 1
+
+    def stats(self):
+        """
+        This function returns the cache counters.
+        :return: A dict of kind -> hits, misses, entries and evictions.
+        """
+        with self.__lock:
+            return {kind: dict(counters, entries=len(self.__kinds[kind]))
+                    for kind, counters in self.__stats.items()}
+
+# End of entity_cache.py
@@ -71,6 +71,21 @@ class EnvLoader:  # pylint: disable=too-few-public-methods
             default)
         return default
 
+    def get_number(self, name, default, cast=int):
+        """
+        Get a numeric environment variable.
+        A blank value, such as an empty key copied from .env.example, is
+        treated as unset.
+        :param name: The name of the environment variable.
+        :param default: The value to use when the variable is unset or blank.
+        :param cast: The type to convert the value to (default is int).
+        :return: The value of the environment variable or the default value.
+        """
+        value = self.get(name=name, default=default)
+        if value is None or not str(value).strip():
+            value = default
+        return cast(value)
+
     def _get_docker_env(self, name):
         """
         Get the value of a Docker environment variable from /proc/1/environ.
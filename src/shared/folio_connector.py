@@ -3,10 +3,38 @@
     This script is used to call the FOLIO API. It is used to get
     the auth token and to make requests to the FOLIO API.
 """
+import json
 import logging
+import threading
 import time
+from collections import deque
+from datetime import date
+from http.cookiejar import DefaultCookiePolicy
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from hashlib import sha1
+from urllib.parse import quote
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+try:
+    import ijson
+except ImportError:  # Streaming decode is optional
+    ijson = None
+try:
+    import orjson
+except ImportError:  # Falls back to the standard json decoder
+    orjson = None
+from src.shared.adaptive_limiter import AdaptiveLimiter
+from src.shared.cassette import Cassette
+from src.shared.circuit_breaker import CircuitBreaker
 from src.shared.env_loader import EnvLoader
+from src.shared.rate_limiter import RateLimiter
+from src.shared.request_metrics import RequestMetrics
+from src.shared.response_cache import ResponseCache
+from src.shared.retry_policy import RetryPolicy
+from src.shared.single_flight import SingleFlight
+from src.shared.state_store import StateStore
+from src.shared.token_expiry import TokenExpiry
 
 logger = logging.getLogger(__name__)
 
@@ -15,35 +43,188 @@ class FolioConnector:
     """
     This class is used to get the auth token and to make requests to the FOLIO API.
 
+    Every thread shares one pooled requests.Session (urllib3 pools are thread
+    safe), so connections are kept alive between calls and reused by the short
+    lived worker threads of get_many, paging and sharding. The session carries
+    the tenant headers and the current auth cookie. Pool settings are read from
+    the environment:
+        {RUN_ENV}_FOLIO_POOL_SIZE: Connections kept per host (default 10).
+        {RUN_ENV}_FOLIO_KEEP_ALIVE: Set to false to close connections after
+            every request (default true).
+        {RUN_ENV}_FOLIO_MAX_URL_LENGTH: Longest URL get_many() will build
+            (default 4000).
+        {RUN_ENV}_FOLIO_RATE_LIMIT: Requests per second sent by the run_env's
+            connector (default 0, no limit).
+        {RUN_ENV}_FOLIO_RATE_BURST: Requests that can be sent back to back
+            (default 1).
+        {RUN_ENV}_FOLIO_TOKEN_REFRESH_SKEW: Seconds before the access token
+            expires that it is renewed (default 60).
+        {RUN_ENV}_FOLIO_CACHE_SIZE: GET responses kept in the run_env response
+            cache (default 256).
+        {RUN_ENV}_FOLIO_ADAPTIVE_CONCURRENCY: Set to false to stop limiting the
+            requests in flight (default true).
+        {RUN_ENV}_FOLIO_MIN_CONCURRENCY / _MAX_CONCURRENCY / _START_CONCURRENCY:
+            Bounds and starting point of the adaptive limit (default 1, the
+            pool size and 2).
+        {RUN_ENV}_FOLIO_TARGET_P95_MS / _TARGET_ERROR_RATE: The latency and
+            error rate the limit is raised under (default 2000 and 0.05).
+        {RUN_ENV}_FOLIO_BREAKER_THRESHOLD: Timeouts, connection errors or 5xx
+            in a row that open an endpoint's circuit (default 5, 0 disables).
+        {RUN_ENV}_FOLIO_BREAKER_RESET: Seconds an open circuit waits before a
+            probe request (default 30).
+        {RUN_ENV}_FOLIO_RETRY_POLICY: JSON per-method retry settings merged over
+            RetryPolicy.DEFAULT_POLICIES.
+        {RUN_ENV}_FOLIO_RETRY_BUDGET: Retries allowed per request sent in the
+            run (default 0.1).
+        {RUN_ENV}_FOLIO_CASSETTE_MODE: RECORD writes every request and response
+            to a compressed cassette with the auth data removed; REPLAY answers
+            every request from it without the network, and today() returns the
+            recording date (default off).
+        {RUN_ENV}_FOLIO_CASSETTE_PATH: The cassette file (default
+            cassettes/{run_env}.jsonl.gz).
+        {RUN_ENV}_FOLIO_CASSETTE_LATENCY: Set to true to replay the recorded
+            request times (default false).
+        {RUN_ENV}_FOLIO_IDLE_RESET: Seconds a shared connector can sit unused
+            before its pooled connections are dropped when it is handed out
+            again (default 300).
+    The paths that are cached, and for how long, come from the job's
+    "cache_rules" in jobs.yaml; reference endpoints are cached by default.
+    A shared connector switches to the rules of the job it is handed to.
+    When REFERENCE_CACHE_LOCATION is set, cached paths are also kept between
+    runs in that directory (or S3 env key when REFERENCE_CACHE_STORAGE_TYPE
+    is S3) and revalidated with ETag / Last-Modified.
+    Identical GETs that are in flight at the same time are coalesced, so only
+    the first one reaches FOLIO and the others share its result.
+    for_env() hands every job in the process, and every warm Lambda
+    invocation, the same logged in connector for a run_env so sessions,
+    tokens and caches outlive a single job.
+
     init:
         job: The job object that is passed to the script. This is used to get the run_env.
     exposed methods:
+        for_env(job: dict) -> FolioConnector: Returns the shared connector for
+            the job's run_env, logging in the first time.
         get_requests(url_part: str) -> dict: This function is used to perform a get
             action against the FOLIO API.
         post_requests(url_part: str, body: dict) -> dict: This function is used to
             perform a post action against the FOLIO API.
+        delete_request(url_part: str) -> dict: This function is used to perform
+            a delete action against the FOLIO API.
+        iter_records(path: str, cql: str, page_size: int, paging_mode: str) ->
+            generator: Pages through a collection with offset or keyset paging
+            and yields the records one at a time.
+        get_many(path: str, ids: list, id_field: str) -> dict: Looks up many
+            records with chunked "id==(a or b)" queries.
+        count_records(path: str, cql: str) -> int: Returns the number of
+            records a query matches without fetching them.
+        today() -> date: Returns the date the builders treat as today.
+        cache_stats() -> dict: Returns the response cache hit and miss counts.
+        coalesce_stats() -> dict: Returns the GETs made and the GETs saved by
+            coalescing.
+        run_summary() -> dict: Returns the cache, coalescing, concurrency,
+            circuit breaker, retry and per-endpoint stats for the job summary.
+        request_metrics() -> dict: Returns the call count, bytes, latency,
+            retries and token refreshes of every endpoint template.
+        close() -> None: Closes the pooled session and its connections.
     Internal methods:
         __login() -> dict: This function is used to get the auth token.
-        __renew_token() -> None: This function is used to renew the auth token.
+        __renew_token(used_version: int) -> None: This function is used to renew
+            the auth token. Only one renewal runs at a time.
+        __ensure_token() -> None: Renews the auth token shortly before it expires.
+        _resume(job: dict) -> None: Readies a shared connector for the next job.
+        __get_session() -> requests.Session: Returns the shared pooled session.
+        __send(method: str, url_part: str, body: dict, allow_errors: bool) -> dict:
+            Sends a request and decodes the JSON response.
+        __request(method: str, url_part: str, ...) -> requests.Response: Sends a
+            request with rate limiting, retries and token renewal.
+        __failure_reason(error: Exception) -> str: Names a timeout or connection
+            failure for the retry policy.
+        __send_once(method: str, url: str, endpoint: str, ...) -> requests.Response:
+            Sends one request inside the adaptive concurrency limit and records it.
+        __fetch(url_part: str) -> dict: Performs a GET that missed the response cache.
+        __get_revalidated(url_part: str) -> dict: Answers a GET from the
+            persistent reference cache.
     """
 
+    __registry = {}
+    __registry_lock = threading.Lock()
+
     def __init__(self, job):
         self.run_env = job['run_env'].upper()
         logger.info("Initializing CallFunctions for environment: %s",
                     self.run_env)
-        self.__baseurl = EnvLoader().get(name=f'{self.run_env}_BASE_URL')
+        env = EnvLoader()
+        self.__baseurl = env.get(name=f'{self.run_env}_BASE_URL')
         self.__headers = {
-            "x-okapi-tenant": EnvLoader().get(name=f'{self.run_env}_FOLIO_TENANT'),
+            "x-okapi-tenant": env.get(name=f'{self.run_env}_FOLIO_TENANT'),
             "Content-Type": "application/json"
         }
+        self.__pool_size = env.get_number(name=f'{self.run_env}_FOLIO_POOL_SIZE', default=10)
+        self.__keep_alive = str(env.get(
+            name=f'{self.run_env}_FOLIO_KEEP_ALIVE', default="true")).lower() != "false"
+        if not self.__keep_alive:
+            self.__headers["Connection"] = "close"
+        self.__max_url_length = env.get_number(
+            name=f'{self.run_env}_FOLIO_MAX_URL_LENGTH', default=4000)
+        self.__rate_limiter = RateLimiter(
+            rate=env.get_number(name=f'{self.run_env}_FOLIO_RATE_LIMIT', default=0, cast=float),
+            burst=env.get_number(name=f'{self.run_env}_FOLIO_RATE_BURST', default=1))
+        self.__cache = ResponseCache(
+            max_entries=env.get_number(name=f'{self.run_env}_FOLIO_CACHE_SIZE', default=256))
+        self.__cache_rules = job.get('cache_rules')
+        cache_location = env.get(name='REFERENCE_CACHE_LOCATION')
+        self.__disk_cache = StateStore({
+            "type": env.get(name='REFERENCE_CACHE_STORAGE_TYPE', default='local'),
+            "location": cache_location}) if cache_location else None
+        self.__in_flight = SingleFlight()
+        cassette_mode = env.get(name=f'{self.run_env}_FOLIO_CASSETTE_MODE')
+        self.__cassette = Cassette(
+            mode=cassette_mode,
+            path=env.get(name=f'{self.run_env}_FOLIO_CASSETTE_PATH')
+            or f'cassettes/{self.run_env.lower()}.jsonl.gz',
+            replay_latency=str(env.get(name=f'{self.run_env}_FOLIO_CASSETTE_LATENCY',
+                                       default="false")).lower() == "true"
+        ) if cassette_mode else None
+        self.__metrics = RequestMetrics()
+        retry_policy = env.get(name=f'{self.run_env}_FOLIO_RETRY_POLICY')
+        self.__retry = RetryPolicy(
+            policies=json.loads(retry_policy) if retry_policy else None,
+            budget_ratio=env.get_number(
+                name=f'{self.run_env}_FOLIO_RETRY_BUDGET', default=0.1, cast=float))
+        self.__breaker = CircuitBreaker(
+            threshold=env.get_number(name=f'{self.run_env}_FOLIO_BREAKER_THRESHOLD', default=5),
+            reset_timeout=env.get_number(
+                name=f'{self.run_env}_FOLIO_BREAKER_RESET', default=30, cast=float))
+        max_concurrency = env.get_number(
+            name=f'{self.run_env}_FOLIO_MAX_CONCURRENCY', default=self.__pool_size)
+        self.__concurrency = AdaptiveLimiter(
+            enabled=str(env.get(name=f'{self.run_env}_FOLIO_ADAPTIVE_CONCURRENCY',
+                                default="true")).lower() != "false",
+            min_limit=env.get_number(name=f'{self.run_env}_FOLIO_MIN_CONCURRENCY', default=1),
+            max_limit=max_concurrency,
+            initial=env.get_number(name=f'{self.run_env}_FOLIO_START_CONCURRENCY', default=2),
+            target_latency=env.get_number(
+                name=f'{self.run_env}_FOLIO_TARGET_P95_MS', default=2000, cast=float) / 1000,
+            target_error_rate=env.get_number(
+                name=f'{self.run_env}_FOLIO_TARGET_ERROR_RATE', default=0.05, cast=float))
+        self.__session = None
+        self.__session_version = -1
+        self.__session_lock = threading.Lock()
+        self.__cookie_version = 0
+        self.__auth_cookie = {}
+        self.__renew_cookie = {}
+        self.__token_lock = threading.Lock()
+        self.__expiry = TokenExpiry(env.get_number(
+            name=f'{self.run_env}_FOLIO_TOKEN_REFRESH_SKEW', default=60))
+        self.__idle_reset = env.get_number(
+            name=f'{self.run_env}_FOLIO_IDLE_RESET', default=300, cast=float)
+        self.__last_used = time.monotonic()
         logger.info("Base URL: %s", self.__baseurl)
         logger.info("Headers: %s", self.__headers)
+        logger.info("Connection pool size: %s, keep-alive: %s",
+                    self.__pool_size, self.__keep_alive)
         try:
-            cookies = self.__login()
-            self.__auth_cookie = {
-                'folioAccessToken': cookies['folioAccessToken']}
-            self.__renew_cookie = {
-                'folioRefreshToken': cookies['folioRefreshToken']}
+            self.__set_tokens(self.__login())
             logger.info("Auth cookie: %s", self.__auth_cookie)
             logger.info("Renew cookie: %s", self.__renew_cookie)
         except Exception as e:
@@ -51,6 +232,104 @@ class FolioConnector:
             raise
         logger.info("CallFunctions initialized successfully.")
 
+    @classmethod
+    def for_env(cls, job):
+        """
+        This function returns the connector shared by every job for the job's
+        run_env. The first call logs in; later calls, including warm Lambda
+        invocations, reuse its sessions, tokens and caches. The connection
+        settings come from the environment; the cache rules follow each job.
+        :param job: The job object, used to get the run_env.
+        :return: The shared FolioConnector.
+        """
+        run_env = job['run_env'].upper()
+        with cls.__registry_lock:
+            connector = cls.__registry.get(run_env)
+            if connector is None:
+                connector = cls.__registry[run_env] = cls(job)
+                return connector
+        logger.info("Reusing the FOLIO connector for environment: %s", run_env)
+        connector._resume(job)
+        return connector
+
+    def _resume(self, job):
+        """
+        This function readies a shared connector for the next job. Pooled
+        connections left idle longer than the idle reset are dropped, since
+        FOLIO or a NAT gateway has likely closed them while the process (or
+        Lambda) was frozen. The token is renewed, or the connector logs in
+        again, if it expired in the meantime. The request metrics start over
+        so each job's summary covers its own requests, and the job's
+        cache_rules replace the previous job's.
+        :param job: The job object the connector is handed to.
+        """
+        idle = time.monotonic() - self.__last_used
+        if idle > self.__idle_reset:
+            logger.info("FOLIO connector idle for %.0f seconds. Dropping pooled connections.",
+                        idle)
+            self.close()
+        self.__cache_rules = job.get('cache_rules')
+        self.__ensure_token()
+        self.__metrics.reset()
+
+    def __get_session(self):
+        """
+        This function returns the pooled session shared by every thread.
+        The session is created on first use. Cookies set by FOLIO responses are
+        not stored on it, so the only cookie it sends is the current auth
+        cookie, which is swapped in place whenever the token is renewed.
+        :return: The shared requests.Session.
+        """
+        with self.__session_lock:
+            if self.__session is None:
+                logger.debug("Creating pooled FOLIO session.")
+                session = requests.Session()
+                adapter_class = HTTPAdapter if self.__cassette is None else self.__cassette.adapter
+                adapter = adapter_class(
+                    pool_connections=self.__pool_size,
+                    pool_maxsize=self.__pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update(self.__headers)
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                self.__session = session
+                self.__session_version = -1
+            if self.__session_version != self.__cookie_version:
+                for name, value in self.__auth_cookie.items():
+                    self.__session.cookies.set(name, value)
+                self.__session_version = self.__cookie_version
+            return self.__session
+
+    def close(self):
+        """
+        This function closes the pooled session and its connections. The next
+        request opens a new one.
+        """
+        logger.info("Closing the pooled FOLIO session.")
+        with self.__session_lock:
+            if self.__session is not None:
+                self.__session.close()
+            self.__session = None
+
+    def __set_tokens(self, cookies):
+        """
+        This function stores the tokens returned by login or refresh. Every
+        pooled session picks up the new access token on its next request.
+        :param cookies: The cookies returned by FOLIO.
+        """
+        self.__auth_cookie = {'folioAccessToken': cookies['folioAccessToken']}
+        self.__renew_cookie = {'folioRefreshToken': cookies['folioRefreshToken']}
+        self.__cookie_version += 1
+
+    def __ensure_token(self):
+        """
+        This function renews the auth token shortly before it expires so no
+        request is sent with an expired token.
+        """
+        if self.__expiry.access_expiring():
+            logger.info("Auth token is about to expire. Renewing before the request.")
+            self.__renew_token(self.__cookie_version)
+
     def __login(self):
         """
         This function is used to get the auth token.
@@ -62,16 +341,16 @@ class FolioConnector:
             "password": EnvLoader().get(name=f'{self.run_env}_USER_PASSWORD'),
         }
         try:
-            r = requests.post(
+            r = self.__get_session().post(
                 url,
                 json=data,
-                headers=self.__headers,
                 timeout=30)
             r.raise_for_status()
             if r.status_code == 201:
                 cookie_data = {}
                 for cookie in r.cookies:
                     cookie_data[cookie.name] = cookie.value
+                self.__expiry.update(r)
                 logger.info("Login successful. Auth token retrieved.")
                 return cookie_data
             logger.warning("Unexpected status code during login: %s",
@@ -81,154 +360,674 @@ class FolioConnector:
             raise
         return None
 
-    def __renew_token(self):
+    def __renew_token(self, used_version):
         """
         This function is used to renew the auth token using the folioRefreshToken.
+        Only one renewal runs at a time. Callers that waited while another
+        thread renewed the token return without calling FOLIO again. When the
+        refresh token has expired the connector logs in again.
+        :param used_version: The token version the caller last used.
         """
-        logger.info("Attempting to renew auth token using refresh token.")
-        url = f"{self.__baseurl}/authn/refresh"
-        try:
-            r = requests.post(
-                url,
-                cookies=self.__renew_cookie,
-                headers=self.__headers,
-                timeout=30
-            )
-            r.raise_for_status()
-            if r.status_code == 200:
-                cookie_data = {}
-                for cookie in r.cookies:
-                    cookie_data[cookie.name] = cookie.value
-                self.__auth_cookie = {'folioAccessToken': cookie_data['folioAccessToken']}
-                self.__renew_cookie = {'folioRefreshToken': cookie_data['folioRefreshToken']}
-                logger.info("Auth token successfully renewed.")
-            else:
-                logger.warning("Unexpected status code during token renewal: %s", r.status_code)
-                raise RuntimeError("Failed to renew auth token.")
-        except requests.exceptions.RequestException as e:
-            logger.error("Error during token renewal: %s", e, exc_info=True)
-            raise
-
-    def get_request(self, url_part):
-        """
-        This function is used to perform a GET action against the FOLIO API.
-        Retries up to 4 times if a timeout occurs.
-        :param url_part: The part of the URL that is specific to the API being called.
-        :return: The data returned from the API.
-        """
-        url = f'{self.__baseurl}{url_part}'
-        logger.info("Performing GET request to URL: %s", url)
-        retries = 5
-        for attempt in range(retries):
+        with self.__token_lock:
+            if used_version != self.__cookie_version:
+                logger.debug("Auth token already renewed by another request.")
+                return
+            if self.__expiry.refresh_expiring():
+                logger.info("Refresh token has expired. Logging in again.")
+                self.__set_tokens(self.__login())
+                return
+            logger.info("Attempting to renew auth token using refresh token.")
+            url = f"{self.__baseurl}/authn/refresh"
             try:
-                r = requests.get(url, cookies=self.__auth_cookie, timeout=30)
+                r = self.__get_session().post(
+                    url,
+                    cookies=self.__renew_cookie,
+                    timeout=30
+                )
+                if r.status_code in (400, 401, 403, 422):
+                    # The refresh token expired or was revoked while the
+                    # connector sat idle, e.g. between Lambda invocations.
+                    logger.info("Refresh token was rejected (%s). Logging in again.",
+                                r.status_code)
+                    self.__set_tokens(self.__login())
+                    return
                 r.raise_for_status()
-                data = r.json()
-                logger.info("GET request successful. Data retrieved: %s", data)
-                return data
-            except requests.exceptions.Timeout as e:
-                logger.warning("GET request timed out. Attempt %d of %d.", attempt + 1, retries)
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    continue
-                logger.error("GET request failed after %d attempts. Error: %s",
-                             retries, e, exc_info=True)
-                raise
-            except requests.exceptions.HTTPError as e:
-                if r.status_code == 401:  # Unauthorized, likely due to token expiration
-                    logger.warning("Auth token expired. Attempting to renew token.")
-                    self.__renew_token()
-                    return self.get_request(url_part)  # Retry the request after renewing the token
-                logger.error("Error during GET request to %s: %s", url, e, exc_info=True)
-                raise
+                if r.status_code == 200:
+                    cookie_data = {}
+                    for cookie in r.cookies:
+                        cookie_data[cookie.name] = cookie.value
+                    self.__expiry.update(r)
+                    self.__set_tokens(cookie_data)
+                    logger.info("Auth token successfully renewed.")
+                else:
+                    logger.warning("Unexpected status code during token renewal: %s",
+                                   r.status_code)
+                    raise RuntimeError("Failed to renew auth token.")
             except requests.exceptions.RequestException as e:
-                logger.error("Error during GET request to %s: %s", url, e, exc_info=True)
+                logger.error("Error during token renewal: %s", e, exc_info=True)
                 raise
 
-    def post_request(self, url_part, body, allow_errors=False):
+    def __send(self, method, url_part, body=None, allow_errors=False):
         """
-        This function is used to perform a POST action against the FOLIO API.
-        Retries up to 4 times if a timeout occurs.
+        This function sends a request to the FOLIO API and decodes the response.
+        :param method: The HTTP method to use.
         :param url_part: The part of the URL that is specific to the API being called.
         :param body: The body of the request.
+        :param allow_errors: Return the body of 422 and 404 responses instead of raising.
         :return: The data returned from the API.
         """
+        r = self.__request(method, url_part, body, allow_errors)
+        data = self.__decode(r)
+        logger.info("%s request successful. Data retrieved: %s", method, data)
+        return data
+
+    @staticmethod
+    def __decode(response):
+        """
+        This function decodes a JSON response, using orjson when it is installed.
+        :param response: The requests.Response.
+        :return: The decoded data.
+        """
+        if orjson is not None:
+            # orjson is a C extension, so pylint cannot see its members.
+            return orjson.loads(response.content)  # pylint: disable=no-member
+        return response.json()
+
+    # pylint: disable-next=too-many-arguments
+    def __request(self, method, url_part, body=None, allow_errors=False, headers=None,
+                  stream=False):
+        """
+        This function sends a request to the FOLIO API through the rate limiter.
+        Timeouts, connection errors and the status codes in the method's retry
+        policy are retried with jittered backoff while the run's retry budget
+        lasts. A 429 or 503 holds every request for the Retry-After time when
+        one is given. The auth token is renewed before it expires, and a 401
+        renews it and retries once.
+        :param method: The HTTP method to use.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :param body: The body of the request.
+        :param allow_errors: Return 422 and 404 responses instead of raising.
+        :param headers: Extra headers for this request.
+        :param stream: Leave the body unread so it can be parsed incrementally.
+        :return: The requests.Response.
+        """
         url = f'{self.__baseurl}{url_part}'
-        logger.info("Performing POST request to URL: %s with body: %s", url, body)
-        retries = 5
-        for attempt in range(retries):
+        endpoint = CircuitBreaker.endpoint(url_part)
+        attempt = 0
+        delay = None
+        renewed = False
+        self.__retry.record_request()
+        self.__last_used = time.monotonic()
+        while True:
+            self.__ensure_token()
+            used_version = self.__cookie_version
+            self.__rate_limiter.acquire()
+            try:
+                r = self.__send_once(method, url, endpoint, body, headers, stream)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                reason = self.__failure_reason(e)
+                delay = self.__retry.next_delay(method, attempt, delay, reason)
+                if delay is None:
+                    logger.error("%s request failed after %d attempts. Error: %s",
+                                 method, attempt + 1, e, exc_info=True)
+                    raise
+                attempt += 1
+                self.__metrics.retry(endpoint)
+                logger.warning("%s request failed with %s. Retry %d in %.2f seconds.",
+                               method, reason, attempt, delay)
+                time.sleep(delay)
+                continue
+            except requests.exceptions.RequestException as e:
+                logger.error("Error during %s request to %s: %s", method, url, e, exc_info=True)
+                raise
+            if r.status_code == 401 and not renewed:  # Unauthorized, likely due to token expiration
+                logger.warning("Auth token expired. Attempting to renew token.")
+                r.close()
+                self.__metrics.refresh(endpoint)
+                self.__renew_token(used_version)
+                renewed = True
+                continue
+            if r.status_code >= 400:
+                delay = self.__retry.next_delay(method, attempt, delay, r.status_code)
+                if delay is not None:
+                    attempt += 1
+                    self.__metrics.retry(endpoint)
+                    logger.warning("%s request failed with status %s. Retry %d in %.2f seconds.",
+                                   method, r.status_code, attempt, delay)
+                    r.close()
+                    if r.status_code in (429, 503):
+                        self.__rate_limiter.pause(RateLimiter.retry_after(r.headers, delay))
+                    else:
+                        time.sleep(delay)
+                    continue
             try:
-                r = requests.post(
-                    url,
-                    json=body,
-                    cookies=self.__auth_cookie,
-                    timeout=30
-                )
                 if not allow_errors or r.status_code not in [422, 404]:
                     r.raise_for_status()
                 else:
                     logger.warning("Ignoring error with status code: %s", r.status_code)
-                data = r.json()
-                logger.info("POST request successful. Data retrieved: %s", data)
-                return data
-            except requests.exceptions.Timeout as e:
-                logger.warning("POST request timed out. Attempt %d of %d.", attempt + 1, retries)
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    continue
-                logger.error("POST request failed after %d attempts. Error: %s",
-                             retries, e, exc_info=True)
-                raise
             except requests.exceptions.HTTPError as e:
-                if r.status_code == 401:  # Unauthorized, likely due to token expiration
-                    logger.warning("Auth token expired. Attempting to renew token.")
-                    self.__renew_token()
-                    # Retry the request after renewing the token
-                    return self.post_request(url_part, body, allow_errors) 
-                logger.error("Error during POST request to %s: %s", url, e, exc_info=True)
-                raise
-            except requests.exceptions.RequestException as e:
-                logger.error("Error during POST request to %s: %s", url, e, exc_info=True)
+                logger.error("Error during %s request to %s: %s", method, url, e, exc_info=True)
                 raise
+            return r
+
+    @staticmethod
+    def __failure_reason(error):
+        """
+        This function names why a request failed for the retry policy.
+        "connect" means the request was never sent: the connection was
+        refused, the host did not resolve or connecting timed out. A read
+        timeout is a "timeout" and any other broken connection is a
+        "connection" failure; in both the request may have been applied.
+        :param error: The requests Timeout or ConnectionError.
+        :return: "connect", "timeout" or "connection".
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return "connect"
+        if isinstance(error, requests.exceptions.Timeout):
+            return "timeout"
+        cause = error.args[0] if error.args else None
+        if isinstance(getattr(cause, 'reason', cause), NewConnectionError):
+            return "connect"
+        return "connection"
+
+    # pylint: disable-next=too-many-arguments
+    def __send_once(self, method, url, endpoint, body, headers, stream):
+        """
+        This function sends one request inside the adaptive concurrency limit
+        and reports its latency and outcome to the limiter, the circuit
+        breaker of its endpoint and the request metrics.
+        :param method: The HTTP method to use.
+        :param url: The full URL.
+        :param endpoint: The endpoint template of the URL.
+        :param body: The body of the request.
+        :param headers: Extra headers for this request.
+        :param stream: Leave the body unread so it can be parsed incrementally.
+        :return: The requests.Response.
+        :raises CircuitOpenError: If the endpoint's circuit is open.
+        """
+        self.__breaker.before(endpoint)
+        self.__concurrency.acquire()
+        started = time.monotonic()
+        overloaded = True
+        failed = True
+        received = 0
+        status = None
+        try:
+            r = self.__get_session().request(
+                method, url, json=body, headers=headers, timeout=30,
+                **({'stream': True} if stream else {}))
+            status = r.status_code
+            overloaded = status == 429 or status >= 500
+            failed = status >= 500
+            received = int(r.headers.get('Content-Length') or 0) if stream else len(r.content)
+            return r
+        except requests.exceptions.RequestException as e:
+            overloaded = isinstance(e, (requests.exceptions.Timeout,
+                                        requests.exceptions.ConnectionError))
+            failed = overloaded
+            raise
+        finally:
+            latency = time.monotonic() - started
+            self.__concurrency.release(latency, overloaded)
+            self.__metrics.record(endpoint, latency, received,
+                                  status is None or status >= 400)
+            if failed:
+                self.__breaker.failure(endpoint)
+            else:
+                self.__breaker.success(endpoint)
+
+    def get_request(self, url_part):
+        """
+        This function is used to perform a GET action against the FOLIO API.
+        Failed attempts are retried under the retry policy. Paths matching a
+        cache rule are answered from the response cache while the entry is
+        fresh. A GET for a URL that is already in flight waits for that request
+        instead of sending its own.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :return: The data returned from the API.
+        """
+        data = self.__cache.get(url_part, self.__cache_rules)
+        if data is not None:
+            logger.info("GET request to %s answered from cache.", url_part)
+            return data
+        return self.__in_flight.do(url_part, lambda: self.__fetch(url_part))
+
+    def __fetch(self, url_part):
+        """
+        This function performs a GET that missed the response cache and caches
+        the result when a rule matches.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :return: The data returned from the API.
+        """
+        logger.info("Performing GET request to URL: %s%s", self.__baseurl, url_part)
+        if self.__disk_cache is not None and self.__cache.rule_for(url_part, self.__cache_rules):
+            data = self.__get_revalidated(url_part)
+        else:
+            data = self.__send("GET", url_part)
+        self.__cache.set(url_part, data, self.__cache_rules)
+        return data
+
+    def __get_revalidated(self, url_part):
+        """
+        This function answers a GET from the persistent reference cache.
+        Entries saved with an ETag or Last-Modified header are revalidated with
+        If-None-Match / If-Modified-Since and reused on a 304. Entries without
+        them are reused until the rule's disk_ttl (or ttl) has passed.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :return: The data returned from the API or the cache.
+        """
+        rule = self.__cache.rule_for(url_part, self.__cache_rules)
+        disk_ttl = float(rule.get('disk_ttl', rule['ttl']))
+        name = f"folio_cache/{self.run_env}/{sha1(url_part.encode('utf-8')).hexdigest()}.json"
+        entry = self.__disk_cache.load_json(name)
+        if entry is not None and entry.get('url') != url_part:
+            entry = None
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            if not headers and time.time() - entry['stored_at'] < disk_ttl:
+                logger.info("GET request to %s answered from the persistent cache.", url_part)
+                return entry['data']
+        r = self.__request("GET", url_part, headers=headers or None)
+        if r.status_code == 304 and entry is not None:
+            logger.info("GET request to %s not modified. Using the persistent cache.", url_part)
+            data = entry['data']
+        else:
+            data = self.__decode(r)
+            entry = {
+                "url": url_part,
+                "etag": r.headers.get('ETag'),
+                "last_modified": r.headers.get('Last-Modified'),
+                "data": data,
+            }
+        entry['stored_at'] = time.time()
+        try:
+            self.__disk_cache.save_json(name, entry)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Unable to save %s to the persistent cache: %s", url_part, e)
+        return data
+
+    def today(self):
+        """
+        This function returns the date the builders use for their date windows.
+        It is the recording date when a cassette is replayed, so the queries
+        match the recorded ones, and the real date otherwise.
+        :return: A datetime.date.
+        """
+        return self.__cassette.today() if self.__cassette is not None else date.today()
+
+    def cache_stats(self):
+        """
+        This function returns the response cache counters.
+        :return: A dict with the hits, misses and entries.
+        """
+        return self.__cache.stats()
+
+    def coalesce_stats(self):
+        """
+        This function returns the request coalescing counters.
+        :return: A dict with the GETs made and the GETs saved.
+        """
+        return self.__in_flight.stats()
+
+    def run_summary(self):
+        """
+        This function returns the connector stats for the job summary.
+        :return: A dict with the cache, coalescing, concurrency, circuit,
+            retry and endpoint stats.
+        """
+        return {
+            "cache": self.cache_stats(),
+            "coalesced": self.coalesce_stats(),
+            "concurrency": self.__concurrency.stats(),
+            "circuits": self.__breaker.stats(),
+            "retries": self.__retry.stats(),
+            "endpoints": self.request_metrics(),
+        }
+
+    def request_metrics(self):
+        """
+        This function returns the request metrics of every endpoint template:
+        calls, errors, bytes received, p50/p95/max latency, a latency
+        histogram, retries and 401 token refreshes.
+        :return: A dict of endpoint template to metrics.
+        """
+        return self.__metrics.snapshot()
+
+    def post_request(self, url_part, body, allow_errors=False):
+        """
+        This function is used to perform a POST action against the FOLIO API.
+        Failed attempts are retried under the retry policy.
+        :param url_part: The part of the URL that is specific to the API being called.
+        :param body: The body of the request.
+        :return: The data returned from the API.
+        """
+        logger.info("Performing POST request to URL: %s%s with body: %s",
+                    self.__baseurl, url_part, body)
+        return self.__send("POST", url_part, body, allow_errors)
 
     def delete_request(self, url_part):
         """
         This function is used to perform a DELETE action against the FOLIO API.
-        Retries up to 4 times if a timeout occurs.
+        Failed attempts are retried under the retry policy.
         :param url_part: The part of the URL that is specific to the API being called.
         :return: The data returned from the API.
         """
-        url = f'{self.__baseurl}{url_part}'
-        logger.info("Performing DELETE request to URL: %s", url)
-        retries = 5
-        for attempt in range(retries):
-            try:
-                r = requests.delete(
-                    url,
-                    cookies=self.__auth_cookie,
-                    timeout=30
-                )
-                r.raise_for_status()
-                data = r.json()
-                logger.info("DELETE request successful. Data retrieved: %s", data)
-                return data
-            except requests.exceptions.Timeout as e:
-                logger.warning("DELETE request timed out. Attempt %d of %d.", attempt + 1, retries)
-                if attempt < retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                    continue
-                logger.error("DELETE request failed after %d attempts. Error: %s",
-                             retries, e, exc_info=True)
-                raise
-            except requests.exceptions.HTTPError as e:
-                if r.status_code == 401:
-                    logger.warning("Auth token expired. Attempting to renew token.")
-                    self.__renew_token()
-                    return self.delete_request(url_part)
-                logger.error("Error during DELETE request to %s: %s", url, e, exc_info=True)
-                raise
-            except requests.exceptions.RequestException as e:
-                logger.error("Error during DELETE request to %s: %s", url, e, exc_info=True)
-                raise
+        logger.info("Performing DELETE request to URL: %s%s", self.__baseurl, url_part)
+        return self.__send("DELETE", url_part)
+
+    # pylint: disable-next=too-many-arguments
+    def get_many(self, path, ids, id_field="id", record_key=None, workers=1):
+        """
+        This function looks up many records by id with CQL "id==(a or b ...)"
+        queries instead of one request per id. The ids are de-duplicated and
+        split into chunks that keep every URL under
+        {RUN_ENV}_FOLIO_MAX_URL_LENGTH characters.
+        :param path: The collection path, e.g. "/users".
+        :param ids: The ids to look up. Duplicates and empty values are ignored.
+        :param id_field: The field the ids are matched against.
+        :param record_key: The key holding the records in the response.
+            Defaults to the last segment of the path.
+        :param workers: The number of chunks to fetch at the same time.
+        :return: A dict of id -> record. Ids that were not found are left out.
+        """
+        record_key = record_key or path.rstrip('/').split('/')[-1]
+        unique_ids = list(dict.fromkeys(i for i in ids if i))
+        chunks = self.__chunk_ids(path, unique_ids, id_field)
+        logger.info("Looking up %d unique ids from %s in %d requests.",
+                    len(unique_ids), path, len(chunks))
+
+        def fetch(chunk):
+            data = self.get_request(self.__many_url(path, chunk, id_field))
+            return data.get(record_key, [])
+
+        if workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=workers,
+                                    thread_name_prefix="folio-many") as executor:
+                pages = list(executor.map(fetch, chunks))
+        else:
+            pages = [fetch(chunk) for chunk in chunks]
+
+        records = {}
+        for page in pages:
+            for record in page:
+                key = record
+                for part in id_field.split('.'):
+                    key = key.get(part) if isinstance(key, dict) else None
+                records[key] = record
+        logger.debug("Found %d of %d ids in %s.",
+                     len(records), len(unique_ids), path)
+        return records
+
+    def __chunk_ids(self, path, ids, id_field):
+        """
+        This function splits the ids into chunks whose query URL stays under
+        the configured maximum URL length.
+        :param path: The collection path.
+        :param ids: The unique ids to split.
+        :param id_field: The field the ids are matched against.
+        :return: A list of id lists.
+        """
+        base_length = len(f'{self.__baseurl}') + len(
+            self.__many_url(path, [], id_field, encoded=True)) + len(str(len(ids)))
+        chunks = []
+        chunk = []
+        length = base_length
+        for i in ids:
+            id_length = len(quote(f' or "{i}"'))
+            if chunk and length + id_length > self.__max_url_length:
+                chunks.append(chunk)
+                chunk = []
+                length = base_length
+            chunk.append(i)
+            length += id_length
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def __many_url(path, ids, id_field, encoded=False):
+        """
+        This function builds the lookup URL for one chunk of ids.
+        :param path: The collection path.
+        :param ids: The ids in the chunk.
+        :param id_field: The field the ids are matched against.
+        :param encoded: Percent-encode the query, used to measure the URL length.
+        :return: The url part for the chunk.
+        """
+        cql = f'{id_field}==({" or ".join(f'"{i}"' for i in ids)})'
+        if encoded:
+            cql = quote(cql)
+        return f'{path}?query={cql}&limit={len(ids)}'
+
+    def count_records(self, path, cql):
+        """
+        This function asks FOLIO how many records match a query with a
+        "limit=0" request, which returns the total without any records.
+        :param path: The collection path, e.g. "/accounts".
+        :param cql: The CQL query to run.
+        :return: The total record count.
+        """
+        data = self.get_request(f'{path}?query={cql}&limit=0')
+        return int(data.get('resultInfo', {}).get('totalRecords', data.get('totalRecords', 0)))
+
+    # pylint: disable-next=too-many-arguments, too-many-locals
+    def iter_records(self, path, cql, page_size=1000, record_key=None,
+                     max_records=None, on_total=None, paging_mode="OFFSET",
+                     workers=1, ordered=True, stream=False):
+        """
+        This function pages through a FOLIO collection and yields the records
+        one at a time, so only one page is held in memory.
+        Two paging modes are available:
+            OFFSET: Pages with offset/limit. The query is sorted by id so the
+                pages stay stable between requests.
+            KEYSET: Sorts by id and asks for the records after the last id seen
+                ("id > lastId"), so every page costs the same however deep it is.
+        In OFFSET mode with more than one worker, the remaining pages are
+        fetched concurrently once the first page reports the total count.
+        The total is only a hint: RMB modules such as mod-feesfines estimate
+        it for large result sets, so when the last prefetched page comes back
+        full the paging carries on sequentially until a short page arrives.
+        :param path: The collection path, e.g. "/accounts".
+        :param cql: The CQL query to run.
+        :param page_size: The number of records to request per page.
+        :param record_key: The key holding the records in the response.
+            Defaults to the last segment of the path.
+        :param max_records: Stop after this many records have been yielded.
+        :param on_total: Called with the total record count from the first page.
+        :param paging_mode: "OFFSET" or "KEYSET".
+        :param workers: The number of pages to fetch at the same time (OFFSET only).
+        :param ordered: Yield prefetched pages in query order. When False pages
+            are yielded as soon as they arrive.
+        :param stream: Parse each sequential page incrementally instead of
+            decoding the whole body at once (needs ijson).
+        :return: A generator of records.
+        """
+        record_key = record_key or path.rstrip('/').split('/')[-1]
+        paging_mode = (paging_mode or "OFFSET").upper()
+        if paging_mode not in ("OFFSET", "KEYSET"):
+            raise ValueError(f"Unsupported paging mode: {paging_mode}")
+        if paging_mode == "KEYSET" and 'sortby' in cql.lower():
+            raise ValueError("Keyset paging sorts by id and cannot use a custom sortby.")
+        if paging_mode == "KEYSET" and workers > 1:
+            logger.warning("Keyset paging is sequential; ignoring %d workers.", workers)
+            workers = 1
+        logger.info("Paging %s (%s) with page size %d and query: %s",
+                    path, paging_mode, page_size, cql)
+        offset = 0
+        yielded = 0
+        last_id = None
+        total = 0
+        while True:
+            limit = page_size
+            if max_records is not None:
+                limit = min(page_size, max_records - yielded)
+                if limit <= 0:
+                    break
+            info = {}
+            count = 0
+            first_page = yielded == 0
+            for record in self.__page_records(
+                    self.__page_url(path, cql, paging_mode, offset, last_id, limit),
+                    record_key, stream, info):
+                if count >= limit:
+                    break
+                count += 1
+                last_id = record.get('id')
+                yield record
+            yielded += count
+            if first_page:
+                total = info.get('total', count)
+                logger.info("%s reports %s total records.", path, total)
+                if on_total is not None:
+                    on_total(total)
+            if first_page and workers > 1 and count == limit:
+                end = total if max_records is None else min(total, max_records)
+                end = max(end, yielded)
+                prefetched, full = yield from self.__prefetch_pages(
+                    path, cql, record_key, (yielded, end, page_size, max_records),
+                    workers, ordered)
+                yielded += prefetched
+                offset = end
+                if not full or end == max_records:
+                    return
+                logger.warning("%s has more records than the %s it reported. "
+                               "Paging on from offset %d.", path, total, offset)
+                continue
+            offset += count
+            logger.debug("Fetched page of %d records from %s (offset %d).",
+                         count, path, offset)
+            if count < limit:
+                break
+
+    def __page_records(self, url_part, record_key, stream, info):
+        """
+        This function yields the records of one page. In stream mode the
+        response is parsed incrementally with ijson (when it is installed) so
+        the page is never held in memory as a whole.
+        :param url_part: The url part for the page.
+        :param record_key: The key holding the records in the response.
+        :param stream: Parse the response incrementally.
+        :param info: A dict that receives the page's "total" record count.
+        :return: A generator of records.
+        """
+        if not stream or ijson is None:
+            data = self.get_request(url_part)
+            total = data.get('resultInfo', {}).get('totalRecords', data.get('totalRecords'))
+            if total is not None:
+                info['total'] = total
+            yield from data.get(record_key, [])
+            return
+        logger.info("Streaming GET request to URL: %s%s", self.__baseurl, url_part)
+        r = self.__request("GET", url_part, stream=True)
+        try:
+            r.raw.decode_content = True
+            item_prefix = f'{record_key}.item'
+            builder = None
+            for prefix, event, value in ijson.parse(r.raw, use_float=True):
+                if builder is not None:
+                    builder.event(event, value)
+                    if prefix == item_prefix and event == 'end_map':
+                        yield builder.value
+                        builder = None
+                elif prefix == item_prefix and event == 'start_map':
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                elif prefix in ('resultInfo.totalRecords', 'totalRecords') \
+                        and event == 'number':
+                    info['total'] = int(value)
+        finally:
+            r.close()
+
+    # pylint: disable-next=too-many-arguments
+    def __prefetch_pages(self, path, cql, record_key, page_range, workers, ordered):
+        """
+        This function fetches the remaining offset pages of a collection
+        concurrently. No more than two pages per worker are held at once.
+        Every page asks for a full page_size (unless max_records stops it
+        sooner), so a full last page shows the reported total was too low.
+        :param path: The collection path.
+        :param cql: The CQL query to run.
+        :param record_key: The key holding the records in the response.
+        :param page_range: A (start, end, page_size, max_records) tuple of
+            record offsets; max_records is None when there is no limit.
+        :param workers: The number of pages to fetch at the same time.
+        :param ordered: Yield pages in query order instead of arrival order.
+        :return: A generator of records. Its return value is a tuple of the
+            number of records yielded and whether the last page was full.
+        """
+        start, end, page_size, max_records = page_range
+        logger.info("Prefetching %s records %d-%d with %d workers.",
+                    path, start, end, workers)
+
+        def fetch(offset):
+            limit = page_size if max_records is None else min(page_size, max_records - offset)
+            data = self.get_request(
+                self.__page_url(path, cql, "OFFSET", offset, None, limit))
+            return offset, data.get(record_key, [])[:limit], limit
+
+        # The first page was full, so with nothing left to prefetch it is the last page.
+        last = (start - page_size, True)
+        yielded = 0
+
+        def take(page):
+            nonlocal last, yielded
+            offset, records, limit = page
+            if offset > last[0]:
+                last = (offset, len(records) == limit)
+            yielded += len(records)
+            return records
+
+        offsets = iter(range(start, end, page_size))
+        window = workers * 2
+        executor = ThreadPoolExecutor(max_workers=workers,
+                                      thread_name_prefix="folio-page")
+        try:
+            if ordered:
+                pending = deque()
+                for offset in offsets:
+                    pending.append(executor.submit(fetch, offset))
+                    if len(pending) >= window:
+                        yield from take(pending.popleft().result())
+                while pending:
+                    yield from take(pending.popleft().result())
+            else:
+                pending = set()
+                for offset in offsets:
+                    pending.add(executor.submit(fetch, offset))
+                    if len(pending) >= window:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield from take(future.result())
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from take(future.result())
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return yielded, last[1]
+
+    @staticmethod
+    def __page_url(path, cql, paging_mode, offset, last_id, limit):
+        """
+        This function builds the URL for one page of a collection.
+        :param path: The collection path.
+        :param cql: The CQL query to run.
+        :param paging_mode: "OFFSET" or "KEYSET".
+        :param offset: The number of records already read (OFFSET mode).
+        :param last_id: The id of the last record read (KEYSET mode).
+        :param limit: The number of records to request.
+        :return: The url part for the page.
+        """
+        if paging_mode == "KEYSET":
+            if last_id is not None:
+                cql = f'({cql}) and id > "{last_id}"'
+            return f'{path}?query={cql} sortby id&limit={limit}'
+        if 'sortby' not in cql.lower():
+            cql = f'{cql} sortby id'
+        return f'{path}?query={cql}&offset={offset}&limit={limit}'
 
 # End of the FolioConnector class
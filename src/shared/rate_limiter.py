@@ -0,0 +1,105 @@
+"""
+rate_limiter.py - a token bucket used to keep FOLIO requests under the
+rate the hosting provider allows.
+"""
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    A thread-safe token bucket. Tokens refill at "rate" per second up to
+    "burst". Every request takes one token and waits when the bucket is empty.
+    A rate of 0 turns the limiter off, but pauses from Retry-After are still
+    honoured.
+    exposed methods:
+        reserve() -> float: Takes a token and returns how long to wait before
+            using it.
+        acquire() -> None: Takes a token, sleeping until it is available.
+        pause(seconds: float) -> None: Holds every request for the given time.
+        retry_after(response_headers: dict, default: float) -> float: Parses a
+            Retry-After header.
+    """
+
+    def __init__(self, rate=0, burst=1):
+        """
+        Initialize the RateLimiter class.
+        :param rate: The number of requests allowed per second. 0 disables the limit.
+        :param burst: The number of requests that can be sent back to back.
+        """
+        self.rate = float(rate or 0)
+        self.burst = max(int(burst or 1), 1)
+        self.__tokens = float(self.burst)
+        self.__updated = time.monotonic()
+        self.__paused_until = 0.0
+        self.__lock = threading.Lock()
+        logger.info("RateLimiter initialized: %s requests/second, burst %d.",
+                    self.rate or "unlimited", self.burst)
+
+    def reserve(self):
+        """
+        This function takes a token and returns how long the caller must wait
+        before sending its request.
+        :return: The number of seconds to wait.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            wait = max(self.__paused_until - now, 0.0)
+            if self.rate <= 0:
+                return wait
+            self.__tokens = min(
+                self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            if self.__tokens < 0:
+                wait = max(wait, -self.__tokens / self.rate)
+            return wait
+
+    def acquire(self):
+        """
+        This function takes a token, sleeping until it is available.
+        """
+        wait = self.reserve()
+        if wait > 0:
+            logger.debug("Rate limited. Waiting %.2f seconds.", wait)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        This function holds every request using the limiter for the given time.
+        :param seconds: The number of seconds to hold requests.
+        """
+        with self.__lock:
+            self.__paused_until = max(
+                self.__paused_until, time.monotonic() + seconds)
+        logger.warning("FOLIO asked us to slow down. Pausing requests for %.2f seconds.",
+                       seconds)
+
+    @staticmethod
+    def retry_after(response_headers, default):
+        """
+        This function parses a Retry-After header given in seconds or as an HTTP date.
+        :param response_headers: The response headers.
+        :param default: The value to use when the header is missing or invalid.
+        :return: The number of seconds to wait.
+        """
+        value = response_headers.get("Retry-After")
+        if not value:
+            return default
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(value)
+            return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+        except (TypeError, ValueError):
+            logger.warning("Invalid Retry-After header: %s", value)
+            return default
+
+# End of rate_limiter.py
@@ -0,0 +1,143 @@
+"""
+request_metrics.py - per-endpoint counters and latency histograms for the
+requests a connector sends to FOLIO.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetrics:
+    """
+    A thread-safe collection of request metrics keyed by endpoint template,
+    e.g. "/users/{id}". Each endpoint keeps its call, error, retry and token
+    refresh counts, the bytes received and a latency histogram. The p50 and
+    p95 are interpolated within the bucket the percentile falls in, between
+    the bucket bounds narrowed to the fastest and slowest latency seen.
+    exposed methods:
+        record(endpoint: str, latency: float, received: int, failed: bool) ->
+            None: Records one request.
+        retry(endpoint: str) -> None: Counts a retry.
+        refresh(endpoint: str) -> None: Counts a 401 token refresh.
+        snapshot() -> dict: Returns the metrics of every endpoint.
+        reset() -> None: Clears the metrics.
+    """
+
+    BUCKETS_MS = [1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+    def __init__(self):
+        """
+        Initialize the RequestMetrics class.
+        """
+        self.__endpoints = {}
+        self.__lock = threading.Lock()
+
+    def __endpoint(self, endpoint):
+        """
+        This function returns the counters of an endpoint, creating them on
+        first use. The caller must hold the lock.
+        :param endpoint: The endpoint template.
+        :return: The counters dict.
+        """
+        if endpoint not in self.__endpoints:
+            self.__endpoints[endpoint] = {
+                "calls": 0, "errors": 0, "retries": 0, "refreshes": 0,
+                "bytes": 0, "total_ms": 0.0, "min_ms": None, "max_ms": 0.0,
+                "buckets": [0] * (len(self.BUCKETS_MS) + 1),
+            }
+        return self.__endpoints[endpoint]
+
+    def record(self, endpoint, latency, received=0, failed=False):
+        """
+        This function records one request.
+        :param endpoint: The endpoint template.
+        :param latency: The request latency in seconds.
+        :param received: The number of bytes received.
+        :param failed: True when the request timed out, could not connect or
+            FOLIO answered with an error status.
+        """
+        latency_ms = latency * 1000
+        bucket = next((i for i, limit in enumerate(self.BUCKETS_MS) if latency_ms <= limit),
+                      len(self.BUCKETS_MS))
+        with self.__lock:
+            metrics = self.__endpoint(endpoint)
+            metrics["calls"] += 1
+            metrics["errors"] += int(failed)
+            metrics["bytes"] += int(received or 0)
+            metrics["total_ms"] += latency_ms
+            metrics["min_ms"] = latency_ms if metrics["min_ms"] is None \
+                else min(metrics["min_ms"], latency_ms)
+            metrics["max_ms"] = max(metrics["max_ms"], latency_ms)
+            metrics["buckets"][bucket] += 1
+
+    def retry(self, endpoint):
+        """
+        This function counts a retry.
+        :param endpoint: The endpoint template.
+        """
+        with self.__lock:
+            self.__endpoint(endpoint)["retries"] += 1
+
+    def refresh(self, endpoint):
+        """
+        This function counts a token refresh caused by a 401.
+        :param endpoint: The endpoint template.
+        """
+        with self.__lock:
+            self.__endpoint(endpoint)["refreshes"] += 1
+
+    def __percentile(self, buckets, pct, min_ms, max_ms):
+        """
+        This function estimates a percentile from the histogram. The requests
+        in the bucket it falls in are taken to be spread evenly between the
+        bucket bounds, narrowed to the fastest and slowest latency seen.
+        :param buckets: The histogram counts.
+        :param pct: The percentile from 0 to 100.
+        :param min_ms: The fastest latency.
+        :param max_ms: The slowest latency, used above the last bucket.
+        :return: The latency in milliseconds, or 0 for an empty histogram.
+        """
+        target = sum(buckets) * pct / 100
+        seen = 0
+        for i, bucket_count in enumerate(buckets):
+            if bucket_count and seen + bucket_count >= target:
+                lower = max(self.BUCKETS_MS[i - 1] if i else 0, min_ms)
+                upper = min(self.BUCKETS_MS[i] if i < len(self.BUCKETS_MS) else max_ms, max_ms)
+                return round(lower + (upper - lower) * (target - seen) / bucket_count, 1)
+            seen += bucket_count
+        return 0
+
+    def snapshot(self):
+        """
+        This function returns the metrics of every endpoint, slowest total first.
+        :return: A dict of endpoint template to metrics.
+        """
+        with self.__lock:
+            endpoints = {endpoint: dict(metrics, buckets=list(metrics["buckets"]))
+                         for endpoint, metrics in self.__endpoints.items()}
+        result = {}
+        for endpoint, metrics in sorted(endpoints.items(),
+                                        key=lambda item: item[1]["total_ms"], reverse=True):
+            buckets = metrics.pop("buckets")
+            labels = [f"<={limit}ms" for limit in self.BUCKETS_MS] + \
+                [f">{self.BUCKETS_MS[-1]}ms"]
+            result[endpoint] = {
+                **metrics,
+                "total_ms": round(metrics["total_ms"], 1),
+                "min_ms": round(metrics["min_ms"] or 0, 1),
+                "max_ms": round(metrics["max_ms"], 1),
+                "p50_ms": self.__percentile(buckets, 50, metrics["min_ms"], metrics["max_ms"]),
+                "p95_ms": self.__percentile(buckets, 95, metrics["min_ms"], metrics["max_ms"]),
+                "histogram": {label: n for label, n in zip(labels, buckets) if n},
+            }
+        return result
+
+    def reset(self):
+        """
+        This function clears the metrics.
+        """
+        with self.__lock:
+            self.__endpoints.clear()
+
+# End of request_metrics.py
@@ -0,0 +1,144 @@
+"""
+response_cache.py - an in-memory LRU cache for FOLIO GET responses.
+"""
+import copy
+import fnmatch
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    A thread-safe LRU cache for FOLIO GET responses. Only paths matching one
+    of the TTL rules are cached. Rules are checked in order and the first
+    match wins, e.g.
+        [{"path": "/material-types", "ttl": 3600}, {"path": "/owners*", "ttl": 600}]
+    FolioConnector keeps one cache, and its for_env() hands the same connector
+    to every job of a run_env, so reference data is fetched once per process. Jobs sharing it can bring their own
+    rules: get(), set() and rule_for() take the caller's rules, and an entry
+    is fresh while it is younger than the TTL of the rule the caller passed.
+    A rule may also set "disk_ttl", the number of seconds a response is kept
+    in the persistent cache.
+    exposed methods:
+        rule_for(url_part: str, rules: list) -> dict: Returns the rule matching
+            a url part.
+        get(url_part: str, rules: list) -> any: Returns a copy of the cached
+            response or None.
+        set(url_part: str, data: any, rules: list) -> None: Caches a response if
+            a rule matches.
+        clear() -> None: Empties the cache.
+        stats() -> dict: Returns the hit, miss and entry counts.
+    """
+
+    DEFAULT_RULES = [
+        {"path": "/material-types", "ttl": 3600, "disk_ttl": 86400},
+        {"path": "/owners", "ttl": 3600, "disk_ttl": 86400},
+        {"path": "/service-points", "ttl": 3600, "disk_ttl": 86400},
+        {"path": "/groups", "ttl": 3600, "disk_ttl": 86400},
+        {"path": "/feefines", "ttl": 3600, "disk_ttl": 86400},
+        {"path": "/payments", "ttl": 3600, "disk_ttl": 86400},
+    ]
+
+    def __init__(self, max_entries=256, rules=None):
+        """
+        Initialize the ResponseCache class.
+        :param max_entries: The number of responses kept before the least
+            recently used one is dropped.
+        :param rules: The {"path": glob, "ttl": seconds} rules used when a
+            caller passes none. Defaults to DEFAULT_RULES.
+        """
+        self.max_entries = int(max_entries)
+        self.rules = self.DEFAULT_RULES if rules is None else rules
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        logger.info("ResponseCache initialized with %d entries and rules: %s",
+                    self.max_entries, self.rules)
+
+    def rule_for(self, url_part, rules=None):
+        """
+        This function finds the first rule matching a url part.
+        :param url_part: The url part being requested.
+        :param rules: The caller's rules, or None for the cache's own rules.
+        :return: The rule, or None if the path is not cached.
+        """
+        path = url_part.split('?')[0]
+        for rule in self.rules if rules is None else rules:
+            if fnmatch.fnmatch(path, rule['path']):
+                return rule
+        return None
+
+    def __ttl(self, url_part, rules):
+        """
+        This function finds the TTL for a url part.
+        :param url_part: The url part being requested.
+        :param rules: The caller's rules, or None for the cache's own rules.
+        :return: The TTL in seconds, or None if the path is not cached.
+        """
+        rule = self.rule_for(url_part, rules)
+        return float(rule['ttl']) if rule else None
+
+    def get(self, url_part, rules=None):
+        """
+        This function returns a copy of the cached response for a url part.
+        :param url_part: The url part being requested.
+        :param rules: The caller's rules, or None for the cache's own rules.
+        :return: The cached response, or None on a miss.
+        """
+        ttl = self.__ttl(url_part, rules)
+        if ttl is None:
+            return None
+        with self.__lock:
+            entry = self.__entries.get(url_part)
+            if entry is not None and entry[0] + ttl > time.monotonic():
+                self.__entries.move_to_end(url_part)
+                self.__hits += 1
+                logger.debug("Cache hit for %s", url_part)
+                return copy.deepcopy(entry[1])
+            if entry is not None:
+                del self.__entries[url_part]
+            self.__misses += 1
+            logger.debug("Cache miss for %s", url_part)
+            return None
+
+    def set(self, url_part, data, rules=None):
+        """
+        This function caches a response if a rule matches its path.
+        :param url_part: The url part that was requested.
+        :param data: The response data.
+        :param rules: The caller's rules, or None for the cache's own rules.
+        """
+        ttl = self.__ttl(url_part, rules)
+        if ttl is None or ttl <= 0:
+            return
+        with self.__lock:
+            self.__entries[url_part] = (time.monotonic(), copy.deepcopy(data))
+            self.__entries.move_to_end(url_part)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def clear(self):
+        """
+        This function empties the cache.
+        """
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        """
+        This function returns the cache counters.
+        :return: A dict with the hits, misses and entries.
+        """
+        with self.__lock:
+            return {
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "entries": len(self.__entries),
+            }
+
+# End of response_cache.py
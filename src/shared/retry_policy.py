@@ -0,0 +1,125 @@
+"""
+retry_policy.py - decides which failed FOLIO requests are retried, how long
+to wait between attempts and how many retries a run may spend.
+"""
+import logging
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """
+    A thread-safe retry policy with a per-method configuration, decorrelated
+    jitter backoff and a retry budget.
+    Each method has the number of retries allowed, the failure reasons and
+    the status codes it retries, e.g.
+        {"POST": {"retries": 2, "reasons": ["connect"], "statuses": [429, 503]}}
+    The reasons are "connect" (the connection could not be made or timed out
+    while connecting, so the request was never sent), "timeout" (no answer in
+    time after the request was sent) and "connection" (the connection broke,
+    possibly after the request was sent).
+    Methods that are not listed use the "DEFAULT" entry. The wait before a
+    retry is a random time between "base" and three times the previous wait,
+    capped at "cap", so clients that failed together do not retry together.
+    The budget allows "min_retries" retries plus "budget_ratio" retries per
+    request sent, so retries cannot multiply the load during an incident.
+    exposed methods:
+        record_request() -> None: Counts a new request against the budget.
+        next_delay(method: str, attempt: int, previous: float, reason: str) ->
+            float: Returns the wait before the next attempt, or None when the
+            request must not be retried.
+        stats() -> dict: Returns the request, retry and denied retry counts.
+    """
+
+    DEFAULT_POLICIES = {
+        "DEFAULT": {"retries": 4, "reasons": ["connect", "timeout", "connection"],
+                    "statuses": [429, 502, 503, 504]},
+        # A POST that reached FOLIO may have been applied, so only retry the
+        # failures that mean it was not processed.
+        "POST": {"retries": 4, "reasons": ["connect"],
+                 "statuses": [429, 503]},
+    }
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, policies=None, budget_ratio=0.1, min_retries=10, base=0.5, cap=30):
+        """
+        Initialize the RetryPolicy class.
+        :param policies: Per-method settings merged over DEFAULT_POLICIES.
+        :param budget_ratio: The retries allowed per request sent.
+        :param min_retries: The retries allowed before any request is counted.
+        :param base: The shortest wait in seconds.
+        :param cap: The longest wait in seconds.
+        """
+        self.policies = {method: dict(policy) for method, policy in self.DEFAULT_POLICIES.items()}
+        for method, policy in (policies or {}).items():
+            self.policies.setdefault(method.upper(), dict(self.policies["DEFAULT"])).update(policy)
+        self.budget_ratio = float(budget_ratio)
+        self.min_retries = int(min_retries)
+        self.base = float(base)
+        self.cap = float(cap)
+        self.__lock = threading.Lock()
+        self.__requests = 0
+        self.__retries = 0
+        self.__denied = 0
+        self.__reasons = {}
+        logger.info("RetryPolicy initialized: budget %.0f%% of requests, policies %s",
+                    self.budget_ratio * 100, self.policies)
+
+    def policy(self, method):
+        """
+        This function returns the settings used for a method.
+        :param method: The HTTP method.
+        :return: The policy dict.
+        """
+        return self.policies.get(method.upper(), self.policies["DEFAULT"])
+
+    def record_request(self):
+        """
+        This function counts a new request, which adds to the retry budget.
+        """
+        with self.__lock:
+            self.__requests += 1
+
+    def next_delay(self, method, attempt, previous, reason):
+        """
+        This function decides whether a failed attempt is retried and takes a
+        retry from the budget when it is.
+        :param method: The HTTP method.
+        :param attempt: The number of retries already made for this request.
+        :param previous: The previous wait, or None for the first retry.
+        :param reason: "connect", "timeout", "connection" or the status code.
+        :return: The number of seconds to wait, or None to give up.
+        """
+        policy = self.policy(method)
+        if attempt >= int(policy["retries"]):
+            return None
+        if isinstance(reason, int):
+            if reason not in policy["statuses"]:
+                return None
+        elif reason not in policy["reasons"]:
+            return None
+        with self.__lock:
+            if self.__retries >= self.min_retries + self.__requests * self.budget_ratio:
+                self.__denied += 1
+                logger.warning("Retry budget spent. Not retrying %s after %s.", method, reason)
+                return None
+            self.__retries += 1
+            self.__reasons[str(reason)] = self.__reasons.get(str(reason), 0) + 1
+        return min(self.cap, random.uniform(self.base, (previous or self.base) * 3))
+
+    def stats(self):
+        """
+        This function returns the retry counters.
+        :return: A dict with the requests, retries, denied retries and retry reasons.
+        """
+        with self.__lock:
+            return {
+                "requests": self.__requests,
+                "retries": self.__retries,
+                "denied": self.__denied,
+                "reasons": dict(self.__reasons),
+            }
+
+# End of retry_policy.py
@@ -0,0 +1,81 @@
+"""
+single_flight.py - coalesces identical calls that are in flight at the same
+time so only one of them reaches FOLIO.
+"""
+import copy
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    A thread-safe call coalescer. The first caller for a key runs the call and
+    every caller that asks for the same key while it is running waits for, and
+    shares, its result. A failed call raises the same error in every waiter.
+    Waiters get a copy of the result so callers can change what they are given.
+    exposed methods:
+        do(key: str, func: callable) -> any: Runs func once for every caller
+            waiting on key.
+        stats() -> dict: Returns the call and saved call counts.
+    """
+
+    def __init__(self):
+        """
+        Initialize the SingleFlight class.
+        """
+        self.__calls = {}
+        self.__lock = threading.Lock()
+        self.__executed = 0
+        self.__saved = 0
+
+    def do(self, key, func):
+        """
+        This function runs func for key, or waits for the call already running.
+        :param key: The key identifying identical calls.
+        :param func: A callable taking no arguments.
+        :return: The result of the call.
+        """
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None,
+                        "waiters": 0}
+                self.__calls[key] = call
+                self.__executed += 1
+            else:
+                call["waiters"] += 1
+                self.__saved += 1
+        if not leader:
+            logger.debug("Waiting for in-flight call to %s", key)
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return copy.deepcopy(call["result"])
+        result = None
+        try:
+            result = func()
+            return result
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+                waiters = call["waiters"]
+            if waiters and call["error"] is None:
+                # Keep a private copy so the leader can change its result.
+                call["result"] = copy.deepcopy(result)
+            call["done"].set()
+
+    def stats(self):
+        """
+        This function returns the coalescing counters.
+        :return: A dict with the calls made and the calls saved.
+        """
+        with self.__lock:
+            return {"calls": self.__executed, "saved": self.__saved}
+
+# End of single_flight.py
@@ -0,0 +1,86 @@
+"""
+state_store.py - saves and loads small JSON documents that need to survive
+between runs, in a local directory or in an S3 bucket depending on the conf
+settings.
+"""
+import os
+import json
+import logging
+import threading
+from src.uploaders.aws_bucket import S3Uploader
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    This class saves and loads JSON documents in a local directory or an S3 bucket.
+    init:
+        conf: {"type": "LOCAL" | "S3", "location": directory or S3 env key}
+    exposed methods:
+        load_json(name: str) -> any: Loads a document, or returns None if it
+            does not exist.
+        save_json(name: str, data: any) -> None: Saves a document.
+    """
+
+    def __init__(self, conf):
+        """
+        Initialize the StateStore class.
+        :param conf: The storage settings.
+        """
+        self.__type = str(conf.get('type') or 'LOCAL').upper()
+        self.__location = conf.get('location') or '.'
+        self.__s3 = None
+        if self.__type not in ('LOCAL', 'S3'):
+            raise ValueError(f"Unsupported state storage type: {self.__type}")
+        logger.info("StateStore initialized with configuration: %s", conf)
+
+    def __s3_client(self):
+        """
+        This function returns the S3 uploader, creating it on first use.
+        :return: The S3Uploader.
+        """
+        if self.__s3 is None:
+            self.__s3 = S3Uploader(env_key=self.__location)
+        return self.__s3
+
+    def load_json(self, name):
+        """
+        This function loads a JSON document.
+        :param name: The document name.
+        :return: The document, or None if it does not exist or cannot be read.
+        """
+        try:
+            if self.__type == 'S3':
+                content = self.__s3_client().download_file_as_variable(name)
+            else:
+                path = os.path.join(self.__location, name)
+                if not os.path.exists(path):
+                    logger.debug("State file not found: %s", path)
+                    return None
+                with open(path, 'r', encoding='utf-8') as file:
+                    content = file.read()
+            return json.loads(content)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning("Unable to load state '%s': %s", name, e)
+            return None
+
+    def save_json(self, name, data):
+        """
+        This function saves a JSON document.
+        :param name: The document name.
+        :param data: The document to save.
+        """
+        content = json.dumps(data)
+        if self.__type == 'S3':
+            self.__s3_client().upload_file_from_string(content, name)
+        else:
+            path = os.path.join(self.__location, name)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        logger.debug("Saved state '%s'.", name)
+
+# End of state_store.py
@@ -120,6 +120,10 @@ class TemplateProcessor:
                 case _:
                     logger.error("Invalid export type: %s", level)
                     raise ValueError("Invalid export type")
+            if isinstance(template_data, dict) and "folio_summary" in self.__working_data:
+                # Let every template report the FOLIO request metrics.
+                template_data = {**template_data,
+                                 "folio_summary": self.__working_data["folio_summary"]}
             logger.debug(
                 "Processed data for level %s: %s",
                 level,
@@ -0,0 +1,90 @@
+"""
+token_expiry.py - tracks when the FOLIO access and refresh tokens expire so
+the connectors can renew them before a request is rejected.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class TokenExpiry:
+    """
+    The expiry times returned by /authn/login-with-expiry and /authn/refresh.
+    FolioConnector and AsyncFolioConnector each keep one and renew a token
+    once it is within "skew" seconds of expiring. An unknown expiry time never
+    counts as expiring, so the connectors fall back to renewing on a 401.
+    attributes:
+        access_expires: The access token expiry time, or None.
+        refresh_expires: The refresh token expiry time, or None.
+    exposed methods:
+        update(response: Response) -> None: Stores the expiry times of a login
+            or refresh response.
+        access_expiring() -> bool: Checks if the access token should be renewed.
+        refresh_expiring() -> bool: Checks if the refresh token should be replaced
+            by a new login.
+    """
+
+    def __init__(self, skew=60):
+        """
+        Initialize the TokenExpiry class.
+        :param skew: The seconds before expiry at which a token is renewed.
+        """
+        self.skew = timedelta(seconds=skew)
+        self.access_expires = None
+        self.refresh_expires = None
+
+    def update(self, response):
+        """
+        This function stores the token expiry times of a login or refresh response.
+        :param response: The requests or httpx response.
+        """
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        self.access_expires = self.__parse(body.get('accessTokenExpiration'))
+        self.refresh_expires = self.__parse(body.get('refreshTokenExpiration'))
+        logger.info("Access token expires at %s, refresh token expires at %s.",
+                    self.access_expires, self.refresh_expires)
+
+    def access_expiring(self):
+        """
+        This function checks if the access token expires within the skew.
+        :return: True if the access token should be renewed now.
+        """
+        return self.__expiring(self.access_expires)
+
+    def refresh_expiring(self):
+        """
+        This function checks if the refresh token expires within the skew.
+        :return: True if the connector should log in again instead of refreshing.
+        """
+        return self.__expiring(self.refresh_expires)
+
+    def __expiring(self, expires):
+        """
+        This function checks if a token expires within the skew.
+        :param expires: The expiry time, or None when it is unknown.
+        :return: True if the token should be replaced now.
+        """
+        return expires is not None and \
+            datetime.now(timezone.utc) >= expires - self.skew
+
+    @staticmethod
+    def __parse(value):
+        """
+        This function parses an ISO 8601 expiry time.
+        :param value: The expiry time from FOLIO.
+        :return: A timezone aware datetime or None.
+        """
+        if not value:
+            return None
+        try:
+            expires = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            logger.warning("Invalid token expiry time: %s", value)
+            return None
+        return expires if expires.tzinfo else expires.replace(tzinfo=timezone.utc)
+
+# End of token_expiry.py
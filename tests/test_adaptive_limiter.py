@@ -0,0 +1,52 @@
+import threading
+from src.shared.adaptive_limiter import AdaptiveLimiter
+
+
+def finish(limiter, count, latency=0.1, overloaded=False):
+    for _ in range(count):
+        limiter.acquire()
+        limiter.release(latency, overloaded)
+
+
+def test_limit_grows_while_healthy_and_stops_at_max():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=4, initial=1, window=5)
+    finish(limiter, 5)
+    assert limiter.stats()["limit"] == 2
+    finish(limiter, 100)
+    assert limiter.stats()["limit"] == 4
+
+
+def test_overload_and_slow_windows_cut_the_limit():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=16, initial=16,
+                              target_latency=0.5, window=4)
+    finish(limiter, 1, overloaded=True)
+    assert limiter.stats()["limit"] == 8
+    finish(limiter, 8, latency=0.0)
+    assert limiter.stats()["limit"] == 9
+    finish(limiter, 9, latency=1.0)
+    stats = limiter.stats()
+    assert stats["limit"] == 4
+    assert stats["decreases"] == 2
+    assert stats["errors"] == 1
+    assert stats["max_ms"] == 1000.0
+
+
+def test_acquire_blocks_at_the_limit():
+    limiter = AdaptiveLimiter(min_limit=1, max_limit=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release(0.01)
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_disabled_limiter_never_blocks():
+    limiter = AdaptiveLimiter(enabled=False, min_limit=1, max_limit=1)
+    limiter.acquire()
+    limiter.acquire()
+    limiter.release(0.2)
+    limiter.release(0.2)
+    assert limiter.stats()["requests"] == 2
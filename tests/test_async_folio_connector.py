@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+import pytest
+from unittest.mock import patch
+from src.shared.async_folio_connector import AsyncFolioConnector
+
+
+@pytest.fixture(autouse=True)
+def folio_env(monkeypatch):
+    monkeypatch.setenv("TEST_BASE_URL", "https://folio.example.edu")
+    monkeypatch.setenv("TEST_FOLIO_TENANT", "diku")
+    monkeypatch.setenv("TEST_FOLIO_MAX_CONCURRENCY", "2")
+
+
+def run_with_transport(handler, coro_factory):
+    real_client = httpx.AsyncClient
+    transport = httpx.MockTransport(handler)
+
+    async def runner():
+        with patch("src.shared.async_folio_connector.httpx.AsyncClient",
+                   side_effect=lambda **kw: real_client(transport=transport, **kw)):
+            async with AsyncFolioConnector({"run_env": "test"}) as conn:
+                return await coro_factory(conn)
+
+    return asyncio.run(runner())
+
+
+def login_response(access="access-1"):
+    return httpx.Response(201, headers=[
+        ("set-cookie", f"folioAccessToken={access}"),
+        ("set-cookie", "folioRefreshToken=refresh-1"),
+    ])
+
+
+def test_gather_many_bounded_and_ordered():
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        if request.url.path == "/authn/login-with-expiry":
+            return login_response()
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return httpx.Response(200, json={"id": request.url.path.split("/")[-1]})
+
+    results = run_with_transport(
+        handler, lambda conn: conn.gather_many([f"/users/{i}" for i in range(6)]))
+    assert [r["id"] for r in results] == [str(i) for i in range(6)]
+    assert in_flight["max"] == 2
+
+
+def test_single_refresh_on_concurrent_401():
+    calls = {"refresh": 0}
+
+    def handler(request):
+        path = request.url.path
+        if path == "/authn/login-with-expiry":
+            return login_response()
+        if path == "/authn/refresh":
+            calls["refresh"] += 1
+            return httpx.Response(200, headers=[
+                ("set-cookie", "folioAccessToken=access-2"),
+                ("set-cookie", "folioRefreshToken=refresh-2"),
+            ])
+        if "access-2" not in request.headers.get("cookie", ""):
+            return httpx.Response(401)
+        return httpx.Response(200, json={"ok": True})
+
+    results = run_with_transport(
+        handler, lambda conn: conn.gather_many(["/users/a", "/users/b", "/users/c"]))
+    assert results == [{"ok": True}] * 3
+    assert calls["refresh"] == 1
+
+
+def test_post_only_retried_when_never_sent():
+    calls = {"/accounts/a/pay": 0, "/accounts/b/pay": 0}
+
+    def handler(request):
+        path = request.url.path
+        if path == "/authn/login-with-expiry":
+            return login_response()
+        calls[path] += 1
+        if path == "/accounts/a/pay":
+            raise httpx.ReadTimeout("timed out", request=request)
+        if calls[path] == 1:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(201, json={"ok": True})
+
+    async def pay(conn):
+        with pytest.raises(httpx.ReadTimeout):
+            await conn.post_request("/accounts/a/pay", {"amount": 1})
+        return await conn.post_request("/accounts/b/pay", {"amount": 1})
+
+    with patch("src.shared.async_folio_connector.asyncio.sleep"):
+        assert run_with_transport(handler, pay) == {"ok": True}
+    assert calls == {"/accounts/a/pay": 1, "/accounts/b/pay": 2}
@@ -0,0 +1,122 @@
+from datetime import date, timedelta
+from unittest.mock import MagicMock
+import pytest
+from src.builders.build_charges import BuildCharges
+
+SETTINGS = {
+    "charges_max_age": 365,
+    "charge_days_outstanding": 30,
+    "fines_incremental": True,
+}
+
+
+def fine(fine_id, days_old, updated="2025-01-01T00:00:00.000+00:00", status="Open"):
+    created = (date.today() - timedelta(days=days_old)).strftime("%Y-%m-%dT12:00:00.000+00:00")
+    return {"id": fine_id, "status": {"name": status},
+            "metadata": {"createdDate": created, "updatedDate": updated}}
+
+
+def folio(today=None):
+    return MagicMock(run_env="TEST", **{"today.return_value": today or date.today()})
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CHARGE_STATE_LOCATION", str(tmp_path))
+    return tmp_path
+
+
+def outstanding(connector, settings=SETTINGS):
+    return BuildCharges(connector, settings)._BuildCharges__get_outstanding_fines_all()
+
+
+def test_incremental_run_only_fetches_changes(state_dir):
+    connector = folio()
+    connector.iter_records.return_value = iter([fine("a", 100), fine("b", 60), fine("c", 40)])
+    assert [f["id"] for f in outstanding(connector)] == ["a", "b", "c"]
+    assert (state_dir / "charges_test.json").exists()
+
+    connector.iter_records.reset_mock()
+    connector.iter_records.side_effect = [
+        iter([fine("b", 60, "2025-02-01T00:00:00.000+00:00", status="Closed"),
+              fine("c", 40, "2025-02-01T00:00:00.000+00:00"),
+              fine("d", 5, "2025-02-01T00:00:00.000+00:00")]),
+    ]
+    assert [f["id"] for f in outstanding(connector)] == ["a", "c"]
+    assert connector.iter_records.call_count == 1
+    assert connector.iter_records.call_args.args[1] == \
+        'metadata.updatedDate >= "2024-12-31T23:50:00.000+00:00"'
+
+
+def test_changed_window_settings_pull_everything_again(state_dir):
+    connector = folio()
+    connector.iter_records.return_value = iter([fine("a", 100)])
+    outstanding(connector)
+    connector.iter_records.return_value = iter([fine("a", 100), fine("e", 20)])
+    fines = outstanding(connector, dict(SETTINGS, charge_days_outstanding=10))
+    assert [f["id"] for f in fines] == ["a", "e"]
+    assert 'status.name=="Open"' in connector.iter_records.call_args.args[1]
+
+
+def test_sharded_window_resumes_failed_shards(state_dir):
+    connector = folio()
+    calls = []
+
+    def fetch(path, cql, **kwargs):
+        calls.append(cql)
+        if len(calls) == 2:
+            raise RuntimeError("shard failed")
+        return iter([{"id": cql}])
+
+    connector.iter_records.side_effect = fetch
+    settings = {"charges_max_age": 90, "charge_days_outstanding": 30,
+                "fines_shards": 3, "fines_shard_workers": 1}
+    with pytest.raises(RuntimeError):
+        outstanding(connector, settings)
+    assert len(calls) == 3
+    assert 'metadata.createdDate > ' in calls[0]
+    assert 'metadata.createdDate >= ' in calls[2]
+
+    fines = outstanding(connector, settings)
+    assert len(calls) == 4
+    assert calls[3] == calls[1]
+    assert [f["id"] for f in fines] == calls[:3]
+
+
+def test_failed_shard_error_survives_an_unwritable_state_store(state_dir, monkeypatch):
+    connector = folio()
+    connector.iter_records.side_effect = RuntimeError("shard failed")
+    monkeypatch.setattr("src.builders.build_charges.StateStore.save_json",
+                        MagicMock(side_effect=OSError("Read-only file system")))
+    settings = {"charges_max_age": 90, "charge_days_outstanding": 30,
+                "fines_shards": 2, "fines_shard_workers": 1}
+    with pytest.raises(RuntimeError, match="shard failed"):
+        outstanding(connector, settings)
+
+
+def test_count_shards_are_sized_by_probe(state_dir):
+    connector = folio()
+    connector.count_records.side_effect = [100, 0, 0, 0, 0, 0, 0, 100]
+    connector.iter_records.side_effect = lambda path, cql, **kwargs: iter([])
+    settings = {"charges_max_age": 38, "charge_days_outstanding": 30,
+                "fines_shards": 2, "fines_shard_mode": "COUNT"}
+    outstanding(connector, settings)
+    assert connector.count_records.call_count == 8
+    start = (date.today() - timedelta(days=38)).isoformat()
+    split = (date.today() - timedelta(days=37)).isoformat()
+    queries = sorted(call.args[1] for call in connector.iter_records.call_args_list)
+    assert queries == sorted([
+        f'(status.name=="Open" and metadata.createdDate < {split} and '
+        f'metadata.createdDate > {start})',
+        f'(status.name=="Open" and metadata.createdDate < '
+        f'{(date.today() - timedelta(days=30)).isoformat()} and metadata.createdDate >= {split})',
+    ])
+
+
+def test_window_follows_the_connector_date(state_dir):
+    connector = folio(date(2025, 3, 31))
+    connector.iter_records.return_value = iter([])
+    outstanding(connector, {"charges_max_age": 90, "charge_days_outstanding": 30})
+    assert connector.iter_records.call_args.args[1] == (
+        '(status.name=="Open" and metadata.createdDate < 2025-03-01 and '
+        'metadata.createdDate > 2024-12-31)')
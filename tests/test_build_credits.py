@@ -0,0 +1,24 @@
+from unittest.mock import MagicMock
+from src.builders.build_credits import BuildCredits
+
+
+def test_fee_fine_data_is_looked_up_in_batches():
+    connector = MagicMock()
+    connector.get_many.return_value = {"f1": {"id": "f1", "amount": 5.0,
+                                              "metadata": {"createdDate": "2025-01-01"}},
+                                       "f2": {"id": "f2", "amount": 2.0}}
+    connector.get_request.return_value = {"id": "f3", "amount": 1.0}
+    rows = [{"feeFineId": "f1", "refundAmount": "5.00"},
+            {"feeFineId": "f2", "refundAmount": "2.00"},
+            {"feeFineId": "f1", "refundAmount": "1.00"},
+            {"feeFineId": "f3", "refundAmount": "1.00"}]
+    builder = BuildCredits(connector, {"credit_lookup_workers": 4})
+    credits = builder._BuildCredits__get_fee_fine_data(rows)
+
+    connector.get_many.assert_called_once_with(
+        '/accounts', ["f1", "f2", "f1", "f3"], workers=4)
+    connector.get_request.assert_called_once_with('/accounts/f3')
+    assert [c["id"] for c in credits] == ["f1", "f2", "f1", "f3"]
+    assert [c["report_data"] for c in credits] == rows
+    assert credits[0] is not credits[2]
+    assert credits[0]["metadata"] is not credits[2]["metadata"]
@@ -0,0 +1,113 @@
+from unittest.mock import MagicMock, patch
+import requests
+from src.actions.transfer_fine_action import TransferFineAction
+from src.builders.build_actions import BuildActions
+from src.shared.folio_connector import FolioConnector
+
+CONF = {
+    "name": "Transfer",
+    "action_type": "TransferFineAction",
+    "action_on": "FINES",
+    "execution_mode": "BULK",
+    "bulk_size": 2,
+    "comments": "automated",
+    "user_name": "app",
+    "service_point_id": "sp-1",
+    "payment_method": "Bursar",
+}
+
+
+def fines():
+    return [
+        {"id": "a1", "userId": "u1", "amount": 5.0, "remaining": 5.0},
+        {"id": "a2", "userId": "u1", "amount": 2.5, "remaining": 2.5},
+        {"id": "a3", "userId": "u1", "amount": 1.0, "remaining": 1.0},
+        {"id": "a4", "userId": "u2", "amount": 4.0, "remaining": 4.0},
+        {"id": "a5", "userId": "u2", "amount": 0, "remaining": 0},
+    ]
+
+
+def test_bulk_checks_by_patron_and_splits_results():
+    connector = MagicMock()
+    connector.post_request.return_value = {"allowed": True, "amount": "7.50"}
+    action = TransferFineAction(CONF, connector, False)
+    checked = action.check_many(fines())
+
+    calls = [(call.args[0], call.args[1]) for call in connector.post_request.call_args_list]
+    assert calls == [
+        ("/accounts-bulk/check-transfer", {"accountIds": ["a1", "a2"], "amount": 7.5}),
+        ("/accounts-bulk/check-transfer", {"accountIds": ["a3"], "amount": 1.0}),
+        ("/accounts-bulk/check-transfer", {"accountIds": ["a4"], "amount": 4.0}),
+    ]
+    assert checked[1]["Transfer"]["check"] == {
+        "allowed": True, "amount": "2.50", "remainingAmount": "0.00", "bulk": True}
+    assert checked[4]["Transfer"]["check"]["allowed"] is False
+
+    processed = action.execute_many(checked[:4])
+    assert processed[0]["Transfer"]["process"]["status"] == "NOT PROCESSED"
+    assert processed[0]["Transfer"]["process"]["body"]["accountIds"] == ["a1", "a2"]
+    assert processed[3]["Transfer"]["process"]["url"] == "/accounts-bulk/transfer"
+
+
+def test_refused_group_and_missing_endpoint_fall_back_to_single_checks():
+    connector = MagicMock()
+    connector.post_request.side_effect = [
+        {"allowed": False, "errorMessage": "Invalid amount entered"},
+        {"allowed": True}, {"allowed": False},
+        {"errors": [{"message": "Not found"}]},
+        {"allowed": True}, {"allowed": True},
+    ]
+    action = TransferFineAction(dict(CONF, bulk_group_by="CONFIG"), connector, True)
+    checked = action.check_many(fines())
+
+    urls = [call.args[0] for call in connector.post_request.call_args_list]
+    assert urls == [
+        "/accounts-bulk/check-transfer",
+        "/accounts/a1/check-transfer", "/accounts/a2/check-transfer",
+        "/accounts-bulk/check-transfer",
+        "/accounts/a3/check-transfer", "/accounts/a4/check-transfer",
+    ]
+    assert [f["Transfer"]["check"]["allowed"] for f in checked] == [True, False, True, True, False]
+
+    processed = action.execute_many([f for f in checked if f["Transfer"]["check"]["allowed"]])
+    assert all("bulk" not in f["Transfer"]["process"] for f in processed)
+
+
+def test_build_actions_runs_fine_actions_in_bulk():
+    connector = MagicMock()
+    connector.post_request.return_value = {"allowed": True}
+    working_data = {"charge_data": {"data": fines()}, "refund_data": {"data": []}}
+    result = BuildActions(connector, working_data, {"actions": [CONF]}, False).get_process_data()
+    transferred = result["process_data"]["Transfer"]
+    assert connector.post_request.call_count == 3
+    assert [f["Transfer"]["process"]["status"] for f in transferred[:4]] == ["NOT PROCESSED"] * 4
+    assert "process" not in transferred[4]["Transfer"]
+
+
+def text_response(status_code, text):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode()
+    response.headers["Content-Type"] = "text/plain"
+    return response
+
+
+def test_plain_text_404_from_okapi_falls_back_to_single_checks(monkeypatch):
+    monkeypatch.setenv("TEST_BASE_URL", "https://folio.example.edu")
+    with patch.object(FolioConnector, "_FolioConnector__login",
+                      return_value={"folioAccessToken": "access-1",
+                                    "folioRefreshToken": "refresh-1"}):
+        connector = FolioConnector({"run_env": "test"})
+
+    def answer(method, url, **kwargs):
+        if "/accounts-bulk/" in url:
+            return text_response(404, "No suitable module found for path /accounts-bulk")
+        return text_response(200, '{"allowed": true}')
+
+    with patch.object(requests.Session, "request", side_effect=answer) as mock_request:
+        checked = TransferFineAction(CONF, connector, False).check_many(fines())
+    urls = [call.args[1].split("example.edu")[1] for call in mock_request.call_args_list]
+    assert urls == ["/accounts-bulk/check-transfer", "/accounts/a1/check-transfer",
+                    "/accounts/a2/check-transfer", "/accounts/a3/check-transfer",
+                    "/accounts/a4/check-transfer"]
+    assert [f["Transfer"]["check"]["allowed"] for f in checked] == [True, True, True, True, False]
@@ -0,0 +1,82 @@
+import gzip
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from src.shared.cassette import Cassette, CassetteMissError
+
+
+class FolioHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def __reply(self, status, body, cookie=None):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        if cookie:
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.__reply(201, {"accessTokenExpiration": "2020-01-01T00:00:00Z"},
+                     "folioAccessToken=secret-token; Path=/")
+
+    def do_GET(self):
+        self.__reply(200, {"users": [{"id": "u1"}], "totalRecords": 1})
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FolioHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+
+
+def session_for(cassette):
+    session = requests.Session()
+    session.mount("http://", cassette.adapter())
+    return session
+
+
+def test_record_then_replay_without_network(server, tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    recorder = session_for(Cassette("RECORD", path))
+    login = recorder.post(f"{server}/authn/login-with-expiry",
+                          json={"username": "admin", "password": "hunter2"})
+    assert login.cookies["folioAccessToken"] == "secret-token"
+    assert recorder.get(f"{server}/users?limit=1").json()["totalRecords"] == 1
+
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        recorded = file.read()
+    assert "secret-token" not in recorded
+    assert "hunter2" not in recorded
+    assert "2020-01-01" not in recorded
+
+    player = session_for(Cassette("REPLAY", path))
+    login = player.post("http://folio.invalid/authn/login-with-expiry",
+                        json={"username": "other", "password": "other"})
+    assert login.status_code == 201
+    assert login.cookies["folioAccessToken"] == "REDACTED"
+    response = player.get("http://folio.invalid/users?limit=1", stream=True)
+    assert json.loads(response.raw.read()) == {"users": [{"id": "u1"}], "totalRecords": 1}
+    assert player.get("http://folio.invalid/users?limit=1").json()["users"] == [{"id": "u1"}]
+    with pytest.raises(CassetteMissError):
+        player.get("http://folio.invalid/users?limit=2")
+
+
+def test_replay_uses_the_recording_date(tmp_path):
+    path = str(tmp_path / "run.jsonl.gz")
+    with gzip.open(path, "wt", encoding="utf-8") as file:
+        file.write(json.dumps({"recorded_on": "2025-03-31"}) + "\n")
+    assert Cassette("REPLAY", path).today() == date(2025, 3, 31)
+    recorder = Cassette("RECORD", path)
+    assert recorder.today() == date.today()
+    assert Cassette("REPLAY", path).today() == date.today()
@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+from src.shared.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+USER = "/users/{id}"
+
+
+def test_endpoint_templates_replace_ids_and_drop_the_query():
+    assert CircuitBreaker.endpoint(
+        "/users/0b4a2c3e-5d6f-4a7b-8c9d-0e1f2a3b4c5d") == "/users/{id}"
+    assert CircuitBreaker.endpoint(
+        "/accounts/0b4a2c3e-5d6f-4a7b-8c9d-0e1f2a3b4c5d/check-transfer"
+    ) == "/accounts/{id}/check-transfer"
+    assert CircuitBreaker.endpoint('/accounts?query=id=="1"&limit=10') == "/accounts"
+
+
+def test_circuit_opens_after_threshold_and_probes_after_reset():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=10)
+    with patch("src.shared.circuit_breaker.time.monotonic", return_value=100.0):
+        for _ in range(3):
+            breaker.before(USER)
+            breaker.failure(USER)
+        with pytest.raises(CircuitOpenError):
+            breaker.before(USER)
+        breaker.before("/material-types")
+    assert breaker.stats() == {"opened": 1, "endpoints": {USER: "OPEN"}}
+
+    with patch("src.shared.circuit_breaker.time.monotonic", return_value=111.0):
+        breaker.before(USER)
+        with pytest.raises(CircuitOpenError):
+            breaker.before(USER)
+        breaker.failure(USER)
+        with pytest.raises(CircuitOpenError):
+            breaker.before(USER)
+    assert breaker.stats()["opened"] == 2
+
+    with patch("src.shared.circuit_breaker.time.monotonic", return_value=122.0):
+        breaker.before(USER)
+        breaker.success(USER)
+        breaker.before(USER)
+    assert breaker.stats()["endpoints"] == {}
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2)
+    breaker.failure(USER)
+    breaker.success(USER)
+    breaker.failure(USER)
+    breaker.before(USER)
+
+
+def test_threshold_zero_disables_the_breaker():
+    breaker = CircuitBreaker(threshold=0)
+    for _ in range(10):
+        breaker.failure(USER)
+    breaker.before(USER)
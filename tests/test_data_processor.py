@@ -0,0 +1,45 @@
+import pytest
+import requests
+from unittest.mock import MagicMock
+from src.shared.data_processor import DataProcessor
+
+HOLDINGS_SETTINGS = {
+    "merge_type": "API",
+    "api_call": "{{FOLIO}}/holdings-storage/holdings/{{ID}}",
+    "filter_field": "holdingsRecordId",
+    "new_field": "holding",
+    "api_action": "BATCH",
+    "api_root": False,
+}
+
+
+def per_id_connector():
+    connector = MagicMock()
+    connector.get_request.side_effect = lambda url_part: {"id": url_part.split("/")[-1]}
+    return connector
+
+
+@pytest.mark.parametrize("settings", [
+    HOLDINGS_SETTINGS,
+    dict(HOLDINGS_SETTINGS, api_batch_key="holdingsRecords", api_root="holding"),
+], ids=["no-batch-key", "api-root"])
+def test_batch_merge_without_a_batch_key_or_with_a_root_fetches_each_id(settings):
+    connector = per_id_connector()
+    if settings["api_root"]:
+        connector.get_request.side_effect = lambda url_part: {
+            "holding": {"id": url_part.split("/")[-1]}}
+    fines = [{"holdingsRecordId": "h1"}, {"holdingsRecordId": "h2"}]
+    DataProcessor(connector).merge_field_data(fines, settings)
+    connector.get_many.assert_not_called()
+    assert [f["holding"] for f in fines] == [{"id": "h1"}, {"id": "h2"}]
+
+
+def test_failed_batch_lookup_falls_back_to_each_id():
+    connector = per_id_connector()
+    connector.get_many.side_effect = requests.exceptions.HTTPError("414 URI Too Long")
+    fines = [{"holdingsRecordId": "h1"}, {"holdingsRecordId": "h2"}]
+    DataProcessor(connector).merge_field_data(
+        fines, dict(HOLDINGS_SETTINGS, api_batch_key="holdingsRecords"))
+    assert connector.get_many.call_args.kwargs["record_key"] == "holdingsRecords"
+    assert connector.get_request.call_count == 2
+    assert [f["holding"] for f in fines] == [{"id": "h1"}, {"id": "h2"}]
@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock
+from src.builders.build_charges import BuildCharges
+from src.builders.build_credits import BuildCredits
+from src.shared.data_processor import DataProcessor
+from src.shared.entity_cache import EntityCache
+
+
+def test_cache_copies_records_and_drops_least_recently_used():
+    cache = EntityCache(capacity=2)
+    cache.put("/users", "a", {"id": "a"})
+    cache.put("/users", "b", {"id": "b"})
+    record = cache.get("/users", "a")
+    record["id"] = "changed"
+    cache.put("/users", "c", {"id": "c"})
+    assert cache.get("/users", "b") is None
+    assert cache.get_many("/users", ["a", "c", "a"]) == {"a": {"id": "a"}, "c": {"id": "c"}}
+    assert cache.stats() == {"/users": {"hits": 3, "misses": 1, "evictions": 1, "entries": 2}}
+
+
+def test_disabled_cache_stores_nothing():
+    cache = EntityCache(capacity=0)
+    cache.put("/users", "a", {"id": "a"})
+    assert cache.get("/users", "a") is None
+
+
+def test_builders_share_patron_and_material_lookups():
+    connector = MagicMock()
+    connector.get_many.side_effect = lambda path, ids, **kwargs: {
+        i: {"id": i, "path": path} for i in ids}
+    connector.get_request.return_value = {"mtypes": [{"id": "m1", "name": "book"}]}
+    cache = EntityCache()
+
+    charges = [{"userId": "u1", "materialTypeId": "m1"},
+               {"userId": "u2", "materialTypeId": "m1"}]
+    credits = [{"userId": "u2", "materialTypeId": "m1"},
+               {"userId": "u3", "materialTypeId": "m1"}]
+    for fines in (charges, credits):
+        processor = DataProcessor(connector, cache)
+        processor.merge_field_data(fines, BuildCharges.PATRON_MERGE_SETTINGS)
+        processor.merge_field_data(fines, BuildCredits.MATERIAL_MERGE_SETTINGS)
+
+    assert [call.args[1] for call in connector.get_many.call_args_list] == [
+        ["u1", "u2"], ["u3"]]
+    connector.get_request.assert_called_once_with(url_part="/material-types?limit=1000")
+    assert credits[0]["patron"] == {"id": "u2", "path": "/users"}
+    assert credits[1]["material"] == {"id": "m1", "name": "book"}
+    assert cache.stats()["/users"]["hits"] == 1
+    assert cache.stats()["/material-types"] == {
+        "hits": 1, "misses": 1, "evictions": 0, "entries": 1}
@@ -0,0 +1,346 @@
+import io
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from http.client import HTTPMessage
+from urllib.parse import quote
+import pytest
+import requests
+import urllib3
+from requests.cookies import MockRequest, MockResponse
+from unittest.mock import patch, MagicMock
+from src.shared.circuit_breaker import CircuitOpenError
+from src.shared.folio_connector import FolioConnector
+from src.shared.state_store import StateStore
+
+LOGIN_COOKIES = {
+    "folioAccessToken": "access-1",
+    "folioRefreshToken": "refresh-1",
+}
+
+
+@pytest.fixture
+def connector(monkeypatch):
+    monkeypatch.setenv("TEST_BASE_URL", "https://folio.example.edu")
+    monkeypatch.setenv("TEST_FOLIO_TENANT", "diku")
+    monkeypatch.setenv("TEST_FOLIO_POOL_SIZE", "4")
+    with patch.object(FolioConnector, "_FolioConnector__login",
+                      return_value=dict(LOGIN_COOKIES)):
+        yield FolioConnector({"run_env": "test"})
+
+
+def mock_response(data, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = data
+    response.content = json.dumps(data).encode()
+    return response
+
+
+def test_blank_numeric_settings_use_the_defaults(monkeypatch):
+    monkeypatch.setenv("TEST_BASE_URL", "https://folio.example.edu")
+    for name in ("POOL_SIZE", "MAX_URL_LENGTH", "RATE_LIMIT", "TOKEN_REFRESH_SKEW",
+                 "RETRY_BUDGET", "BREAKER_RESET", "TARGET_P95_MS", "IDLE_RESET"):
+        monkeypatch.setenv(f"TEST_FOLIO_{name}", "")
+    with patch.object(FolioConnector, "_FolioConnector__login",
+                      return_value=dict(LOGIN_COOKIES)):
+        connector = FolioConnector({"run_env": "test"})
+    assert connector._FolioConnector__pool_size == 10
+    assert connector._FolioConnector__max_url_length == 4000
+    assert connector._FolioConnector__idle_reset == 300
+
+
+def test_session_is_shared_by_every_thread(connector):
+    session = connector._FolioConnector__get_session()
+    assert connector._FolioConnector__get_session() is session
+    assert session.headers["x-okapi-tenant"] == "diku"
+    assert session.cookies.get("folioAccessToken") == "access-1"
+    assert session.get_adapter("https://folio.example.edu")._pool_maxsize == 4
+
+    other = []
+    threads = [threading.Thread(
+        target=lambda: other.append(connector._FolioConnector__get_session()))
+        for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(s is session for s in other)
+
+    headers = HTTPMessage()
+    headers["Set-Cookie"] = "folioRefreshToken=leaked; Path=/"
+    request = requests.Request("POST", "https://folio.example.edu/authn/refresh").prepare()
+    session.cookies.extract_cookies(MockResponse(headers), MockRequest(request))
+    assert session.cookies.get("folioRefreshToken") is None
+
+
+def test_get_request_uses_pooled_session(connector):
+    session = connector._FolioConnector__get_session()
+    with patch.object(session, "request",
+                      return_value=mock_response({"id": "1"})) as mock_request:
+        assert connector.get_request("/users/1") == {"id": "1"}
+        assert connector.get_request("/users/1") == {"id": "1"}
+    assert mock_request.call_count == 2
+    mock_request.assert_called_with(
+        "GET", "https://folio.example.edu/users/1", json=None, headers=None, timeout=30)
+
+
+def test_iter_records_pages_with_offset(connector):
+    pages = [
+        {"accounts": [{"id": "a"}, {"id": "b"}], "resultInfo": {"totalRecords": 5}},
+        {"accounts": [{"id": "c"}, {"id": "d"}], "resultInfo": {"totalRecords": 5}},
+        {"accounts": [{"id": "e"}], "resultInfo": {"totalRecords": 5}},
+    ]
+    totals = []
+    with patch.object(connector, "get_request", side_effect=pages) as mock_get:
+        records = list(connector.iter_records(
+            "/accounts", 'status.name=="Open"', page_size=2,
+            on_total=totals.append))
+    assert [r["id"] for r in records] == ["a", "b", "c", "d", "e"]
+    assert totals == [5]
+    urls = [c.args[0] for c in mock_get.call_args_list]
+    assert urls[0] == '/accounts?query=status.name=="Open" sortby id&offset=0&limit=2'
+    assert urls[2].endswith("&offset=4&limit=2")
+
+
+def test_iter_records_streams_pages(connector):
+    body = {"accounts": [{"id": "a", "amount": 1.5}, {"id": "b", "amount": 2}],
+            "totalRecords": 2}
+    response = mock_response(None)
+    response.raw = io.BytesIO(json.dumps(body).encode())
+    totals = []
+    session = connector._FolioConnector__get_session()
+    with patch.object(session, "request", return_value=response) as mock_request:
+        records = list(connector.iter_records(
+            "/accounts", "status.name==Open", page_size=5,
+            on_total=totals.append, stream=True))
+    assert records == body["accounts"]
+    assert totals == [2]
+    assert mock_request.call_args.kwargs["stream"] is True
+    response.close.assert_called_once()
+
+
+def test_iter_records_respects_max_records(connector):
+    page = {"accounts": [{"id": "a"}, {"id": "b"}], "resultInfo": {"totalRecords": 9}}
+    with patch.object(connector, "get_request", return_value=page) as mock_get:
+        records = list(connector.iter_records(
+            "/accounts", "id=*", page_size=2, max_records=3))
+    assert len(records) == 3
+    assert mock_get.call_args_list[1].args[0].endswith("&offset=2&limit=1")
+
+
+def test_iter_records_keyset_pages_by_last_id(connector):
+    pages = [
+        {"users": [{"id": "a"}, {"id": "b"}], "resultInfo": {"totalRecords": 3}},
+        {"users": [{"id": "c"}], "resultInfo": {"totalRecords": 3}},
+    ]
+    with patch.object(connector, "get_request", side_effect=pages) as mock_get:
+        records = list(connector.iter_records(
+            "/users", "active==true", page_size=2, paging_mode="keyset"))
+    assert [r["id"] for r in records] == ["a", "b", "c"]
+    urls = [c.args[0] for c in mock_get.call_args_list]
+    assert urls == [
+        "/users?query=active==true sortby id&limit=2",
+        '/users?query=(active==true) and id > "b" sortby id&limit=2',
+    ]
+    with pytest.raises(ValueError):
+        list(connector.iter_records("/users", "id=* sortby username",
+                                    paging_mode="KEYSET"))
+
+
+def test_iter_records_prefetches_remaining_pages(connector):
+    def fake_get(url):
+        offset = int(url.split("offset=")[1].split("&")[0])
+        limit = int(url.split("limit=")[1])
+        ids = [str(i) for i in range(offset, min(offset + limit, 7))]
+        return {"accounts": [{"id": i} for i in ids],
+                "resultInfo": {"totalRecords": 7}}
+
+    with patch.object(connector, "get_request", side_effect=fake_get) as mock_get:
+        ordered = list(connector.iter_records(
+            "/accounts", "id=*", page_size=2, workers=3))
+        unordered = list(connector.iter_records(
+            "/accounts", "id=*", page_size=2, workers=3, ordered=False))
+    assert [r["id"] for r in ordered] == [str(i) for i in range(7)]
+    assert sorted(r["id"] for r in unordered) == [str(i) for i in range(7)]
+    assert mock_get.call_count == 8
+
+
+def test_iter_records_pages_past_an_estimated_total(connector):
+    def fake_get(url):
+        offset = int(url.split("offset=")[1].split("&")[0])
+        limit = int(url.split("limit=")[1])
+        ids = [str(i) for i in range(offset, min(offset + limit, 11))]
+        return {"accounts": [{"id": i} for i in ids],
+                "resultInfo": {"totalRecords": 4}}
+
+    with patch.object(connector, "get_request", side_effect=fake_get):
+        ordered = list(connector.iter_records(
+            "/accounts", "id=*", page_size=2, workers=3))
+        unordered = list(connector.iter_records(
+            "/accounts", "id=*", page_size=2, workers=3, ordered=False))
+        capped = list(connector.iter_records(
+            "/accounts", "id=*", page_size=2, workers=3, max_records=9))
+    assert [r["id"] for r in ordered] == [str(i) for i in range(11)]
+    assert sorted(r["id"] for r in unordered) == sorted(str(i) for i in range(11))
+    assert [r["id"] for r in capped] == [str(i) for i in range(9)]
+
+
+def test_get_many_dedupes_and_chunks_by_url_length(connector, monkeypatch):
+    connector._FolioConnector__max_url_length = 200
+    ids = [f"{i:08d}-0000-0000-0000-000000000000" for i in range(10)]
+
+    def fake_get(url):
+        found = [i for i in ids if f'"{i}"' in url]
+        return {"users": [{"id": i, "username": f"user{i[:8]}"} for i in found]}
+
+    with patch.object(connector, "get_request", side_effect=fake_get) as mock_get:
+        records = connector.get_many("/users", ids + ids[:3] + [None])
+    assert set(records) == set(ids)
+    assert records[ids[0]]["username"] == "user00000000"
+    assert mock_get.call_count > 1
+    for call in mock_get.call_args_list:
+        url = call.args[0]
+        assert url.startswith('/users?query=id==("')
+        assert len("https://folio.example.edu") + len(quote(url)) <= 200
+
+
+def test_throttled_request_honours_retry_after(connector):
+    session = connector._FolioConnector__get_session()
+    limiter = connector._FolioConnector__rate_limiter
+    responses = [mock_response({}, 429, {"Retry-After": "3"}),
+                 mock_response({"ok": True})]
+    with patch.object(session, "request", side_effect=responses), \
+            patch.object(limiter, "pause") as mock_pause:
+        assert connector.get_request("/users/1") == {"ok": True}
+    mock_pause.assert_called_once_with(3.0)
+
+
+def test_token_renewed_once_before_expiry(connector):
+    connector._FolioConnector__expiry.access_expires = datetime.now(timezone.utc) + timedelta(seconds=5)
+    session = connector._FolioConnector__get_session()
+    renew = mock_response({
+        "accessTokenExpiration": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+        "refreshTokenExpiration": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
+    })
+    renew.cookies = [MagicMock(value="access-2"), MagicMock(value="refresh-2")]
+    renew.cookies[0].name = "folioAccessToken"
+    renew.cookies[1].name = "folioRefreshToken"
+
+    def fake_request(*args, **kwargs):
+        return mock_response({"ok": True})
+
+    with patch.object(requests.Session, "post", return_value=renew) as mock_post, \
+            patch.object(requests.Session, "request", side_effect=fake_request):
+        threads = [threading.Thread(target=connector.get_request, args=("/users/1",))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert mock_post.call_count == 1
+    assert connector._FolioConnector__auth_cookie == {"folioAccessToken": "access-2"}
+    assert connector._FolioConnector__get_session().cookies.get("folioAccessToken") == "access-2"
+
+
+def test_reference_data_revalidated_with_etag(connector, tmp_path):
+    connector._FolioConnector__disk_cache = StateStore(
+        {"type": "LOCAL", "location": str(tmp_path)})
+    connector._FolioConnector__cache.clear()
+    session = connector._FolioConnector__get_session()
+    fresh = mock_response({"mtypes": [{"id": "1"}]}, headers={"ETag": '"v1"'})
+    not_modified = mock_response(None, 304)
+    with patch.object(session, "request", side_effect=[fresh, not_modified]) as mock_request:
+        first = connector.get_request("/material-types?limit=1000")
+        connector._FolioConnector__cache.clear()
+        second = connector.get_request("/material-types?limit=1000")
+    assert first == second == {"mtypes": [{"id": "1"}]}
+    assert mock_request.call_args_list[1].kwargs["headers"] == {"If-None-Match": '"v1"'}
+    connector._FolioConnector__cache.clear()
+
+
+def test_open_circuit_fails_fast(connector):
+    failed = mock_response({}, status_code=500)
+    failed.raise_for_status.side_effect = requests.exceptions.HTTPError("500")
+    session = connector._FolioConnector__get_session()
+    with patch.object(session, "request", return_value=failed) as mock_request:
+        for _ in range(5):
+            with pytest.raises(requests.exceptions.HTTPError):
+                connector.post_request("/accounts/1/check-pay", {})
+        with pytest.raises(CircuitOpenError):
+            connector.post_request("/accounts/2/check-pay", {})
+    assert mock_request.call_count == 5
+    assert connector.run_summary()["circuits"]["endpoints"] == {
+        "/accounts/{id}/check-pay": "OPEN"}
+
+
+def test_gateway_errors_and_connection_errors_are_retried(connector):
+    session = connector._FolioConnector__get_session()
+    responses = [mock_response({}, 502), requests.exceptions.ConnectionError("reset"),
+                 mock_response({"id": "1"})]
+    with patch.object(session, "request", side_effect=responses) as mock_request, \
+            patch("src.shared.folio_connector.time.sleep") as mock_sleep:
+        assert connector.get_request("/users/1") == {"id": "1"}
+    assert mock_request.call_count == 3
+    assert mock_sleep.call_count == 2
+    assert connector.run_summary()["retries"]["reasons"] == {"502": 1, "connection": 1}
+    metrics = connector.request_metrics()["/users/{id}"]
+    assert (metrics["calls"], metrics["errors"], metrics["retries"]) == (3, 2, 2)
+    assert metrics["bytes"] == len(b'{"id": "1"}') + len(b'{}')
+
+
+def test_post_retries_only_failures_before_the_request_was_sent(connector):
+    session = connector._FolioConnector__get_session()
+    refused = requests.exceptions.ConnectionError(
+        urllib3.exceptions.MaxRetryError(None, "/accounts", urllib3.exceptions.NewConnectionError(
+            None, "Connection refused")))
+    responses = [refused, requests.exceptions.ConnectTimeout("connect"),
+                 mock_response({"allowed": True})]
+    with patch.object(session, "request", side_effect=responses) as mock_request, \
+            patch("src.shared.folio_connector.time.sleep"):
+        assert connector.post_request("/accounts/1/check-pay", {}) == {"allowed": True}
+    assert mock_request.call_count == 3
+    assert connector.run_summary()["retries"]["reasons"] == {"connect": 2}
+
+    for error in (requests.exceptions.ReadTimeout("read"),
+                  requests.exceptions.ConnectionError("Connection aborted")):
+        with patch.object(session, "request", side_effect=[error]) as mock_request, \
+                pytest.raises(type(error)):
+            connector.post_request("/accounts/1/pay", {})
+        assert mock_request.call_count == 1
+
+
+def test_for_env_shares_one_logged_in_connector(monkeypatch):
+    monkeypatch.setenv("SHARED_BASE_URL", "https://folio.example.edu")
+    monkeypatch.setattr(FolioConnector, "_FolioConnector__registry", {})
+    with patch.object(FolioConnector, "_FolioConnector__login",
+                      return_value=dict(LOGIN_COOKIES)) as mock_login:
+        first = FolioConnector.for_env({"run_env": "shared"})
+        first._FolioConnector__metrics.record("/users/{id}", 0.01)
+        session = first._FolioConnector__get_session()
+        rules = [{"path": "/users/*", "ttl": 60}]
+        second = FolioConnector.for_env({"run_env": "SHARED", "cache_rules": rules})
+        assert second is first
+        assert second._FolioConnector__cache_rules == rules
+        assert second._FolioConnector__get_session() is session
+        assert second.request_metrics() == {}
+
+        first._FolioConnector__last_used -= 3600
+        FolioConnector.for_env({"run_env": "shared"})
+        assert first._FolioConnector__get_session() is not session
+    assert mock_login.call_count == 1
+
+
+def test_rejected_refresh_token_logs_in_again(connector):
+    connector._FolioConnector__expiry.access_expires = datetime.now(timezone.utc) - timedelta(hours=1)
+    rejected = mock_response({}, status_code=401)
+    fresh = {"folioAccessToken": "access-2", "folioRefreshToken": "refresh-2"}
+    with patch.object(requests.Session, "post", return_value=rejected), \
+            patch.object(FolioConnector, "_FolioConnector__login",
+                         return_value=fresh) as mock_login, \
+            patch.object(requests.Session, "request",
+                         return_value=mock_response({"ok": True})):
+        assert connector.get_request("/users/1") == {"ok": True}
+    assert mock_login.call_count == 1
+    assert connector._FolioConnector__auth_cookie == {"folioAccessToken": "access-2"}
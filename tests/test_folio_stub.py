@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import requests
+from src.shared.folio_connector import FolioConnector
+from utilities.folio_stub import FolioStubServer
+from utilities.synthetic_folio import SyntheticFolio
+
+NOW = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def dataset():
+    return SyntheticFolio(fines=250, patrons=40, refunds=5, blocks=3, now=NOW)
+
+
+@pytest.fixture
+def connector(dataset, monkeypatch):
+    server = FolioStubServer(("127.0.0.1", 0), dataset).start()
+    monkeypatch.setenv("STUB_BASE_URL", server.base_url)
+    monkeypatch.setenv("STUB_FOLIO_TENANT", "diku")
+    monkeypatch.setenv("STUB_USER_NAME", "stub")
+    monkeypatch.setenv("STUB_USER_PASSWORD", "stub")
+    yield FolioConnector({"run_env": "stub"})
+    server.shutdown()
+    server.server_close()
+
+
+def test_dataset_is_ordered_and_repeatable(dataset):
+    ids = [dataset.account(i)["id"] for i in range(dataset.fines)]
+    assert ids == sorted(ids)
+    assert dataset.account_index(ids[17]) == 17
+    assert dataset.user_index(dataset.account(17)["userId"]) is not None
+    assert SyntheticFolio(fines=250, patrons=40, now=NOW).account(99) == dataset.account(99)
+    middle = dataset.created_at(100)
+    assert dataset.created_index(middle) == 101
+    assert dataset.created_index(middle, inclusive=True) == 100
+
+
+@pytest.mark.parametrize("paging_mode", ["OFFSET", "KEYSET"])
+def test_connector_pages_fines_by_created_date(connector, dataset, paging_mode):
+    cutoff = (NOW - timedelta(days=100)).strftime("%Y-%m-%d")
+    expected = [dataset.account(i)["id"] for i in range(dataset.fines)
+                if dataset.account(i)["metadata"]["createdDate"] < cutoff]
+    totals = []
+    fines = list(connector.iter_records(
+        "/accounts", f'(status.name=="Open" and metadata.createdDate < {cutoff})',
+        page_size=40, on_total=totals.append, paging_mode=paging_mode))
+    assert [fine["id"] for fine in fines] == expected
+    assert totals == [len(expected)]
+
+
+def test_connector_lookups_checks_and_reports(connector, dataset):
+    user_ids = [dataset.user_id(i) for i in (0, 5, 39)] + ["missing"]
+    found = connector.get_many("/users", user_ids)
+    assert sorted(found) == sorted(user_ids[:3])
+
+    fine = connector.get_request(f"/accounts/{dataset.account_id(7)}")
+    check = connector.post_request(f"/accounts/{fine['id']}/check-transfer",
+                                   {"amount": fine["remaining"]}, allow_errors=True)
+    assert check["allowed"] is True
+    refused = connector.post_request(f"/accounts/{fine['id']}/check-pay",
+                                     {"amount": fine["remaining"] + 1}, allow_errors=True)
+    assert refused["allowed"] is False
+
+    report = connector.post_request("/feefine-reports/refund", {"feeFineOwners": []})
+    assert len(report["reportData"]) == 5
+    assert connector.get_request("/material-types?limit=1000")["mtypes"][0]["name"] == "book"
+    assert connector.run_summary()["endpoints"]["/accounts/{id}/check-transfer"]["calls"] == 1
+
+
+def test_injected_errors_use_the_chosen_status(dataset):
+    server = FolioStubServer(("127.0.0.1", 0), dataset, error_rate=1,
+                             error_status=504).start()
+    try:
+        session = requests.Session()
+        session.post(f"{server.base_url}/authn/login-with-expiry", json={}, timeout=5)
+        response = session.get(f"{server.base_url}/users", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert response.status_code == 504
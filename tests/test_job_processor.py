@@ -1,5 +1,6 @@
+import threading
 import pytest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from datetime import date
 from src.job_processor import JobProcessor
 
@@ -121,3 +122,40 @@ def test_check_day(mock_date, processor):
     # Test with run_on_day as "WEEKEND"
     job = {"run_on_day": "WEEKEND"}
     assert processor._JobProcessor__check_day(job) is False
+
+
+@patch("src.job_processor.BuildCredits")
+@patch("src.job_processor.BuildCharges")
+def test_build_datasets_concurrently(mock_charges, mock_credits, processor):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def build(result):
+        barrier.wait()
+        return result
+
+    mock_charges.return_value.get_charges.side_effect = lambda: build({"summary": "charges"})
+    mock_credits.return_value.get_credits.side_effect = lambda: build({"summary": "credits"})
+    result = processor._JobProcessor__build_datasets(
+        MagicMock(), {"concurrent_builds": True}, None)
+    assert result == ({"summary": "charges"}, {"summary": "credits"})
+
+
+@patch("src.job_processor.BuildCredits")
+@patch("src.job_processor.BuildCharges")
+def test_concurrent_build_failure_waits_for_the_other_build(mock_charges, mock_credits, processor):
+    finished = []
+    mock_charges.return_value.get_charges.side_effect = lambda: finished.append("charges")
+    mock_credits.return_value.get_credits.side_effect = RuntimeError("report failed")
+    with pytest.raises(RuntimeError, match="report failed"):
+        processor._JobProcessor__build_datasets(
+            MagicMock(), {"concurrent_builds": True}, None)
+    assert finished == ["charges"]
+
+
+@patch("src.job_processor.YamlLoader")
+def test_run_active_jobs_raises_what_process_active_jobs_swallows(mock_loader, processor):
+    mock_loader.return_value.load_config.side_effect = FileNotFoundError("fines.yaml")
+    processor.active_jobs = [{"name": "Fines", "job_config": "fines.yaml"}]
+    with pytest.raises(FileNotFoundError):
+        processor.run_active_jobs()
+    assert processor.process_active_jobs() is None
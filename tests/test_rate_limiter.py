@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import patch
+from src.shared.rate_limiter import RateLimiter
+
+
+@patch("src.shared.rate_limiter.time.monotonic")
+def test_token_bucket_allows_burst_then_waits(mock_monotonic):
+    mock_monotonic.return_value = 100.0
+    limiter = RateLimiter(rate=2, burst=3)
+    assert [limiter.reserve() for _ in range(3)] == [0, 0, 0]
+    assert limiter.reserve() == 0.5
+    assert limiter.reserve() == 1.0
+
+    mock_monotonic.return_value = 110.0
+    assert limiter.reserve() == 0
+
+
+@patch("src.shared.rate_limiter.time.monotonic")
+def test_pause_holds_requests_when_unlimited(mock_monotonic):
+    mock_monotonic.return_value = 50.0
+    limiter = RateLimiter()
+    assert limiter.reserve() == 0
+    limiter.pause(4)
+    assert limiter.reserve() == 4
+
+
+def test_retry_after_parsing():
+    assert RateLimiter.retry_after({"Retry-After": "7"}, 1) == 7.0
+    assert RateLimiter.retry_after({}, 1) == 1
+    assert RateLimiter.retry_after({"Retry-After": "soon"}, 2) == 2
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    wait = RateLimiter.retry_after({"Retry-After": format_datetime(later, usegmt=True)}, 1)
+    assert 25 < wait <= 30
+
@@ -0,0 +1,43 @@
+from src.shared.request_metrics import RequestMetrics
+
+
+def test_snapshot_reports_counts_bytes_and_latency():
+    metrics = RequestMetrics()
+    for latency in [0.02] * 18 + [0.4, 42.0]:
+        metrics.record("/users/{id}", latency, received=100)
+    metrics.record("/users/{id}", 0.2, failed=True)
+    metrics.retry("/users/{id}")
+    metrics.refresh("/users/{id}")
+    metrics.record("/material-types", 0.005, received=50)
+
+    snapshot = metrics.snapshot()
+    assert list(snapshot) == ["/users/{id}", "/material-types"]
+    users = snapshot["/users/{id}"]
+    assert users["calls"] == 21
+    assert users["errors"] == 1
+    assert users["retries"] == 1
+    assert users["refreshes"] == 1
+    assert users["bytes"] == 2000
+    assert users["p50_ms"] == 22.9
+    assert users["p95_ms"] == 487.5
+    assert users["max_ms"] == 42000.0
+    assert users["histogram"] == {"<=25ms": 18, "<=250ms": 1, "<=500ms": 1, ">30000ms": 1}
+    assert snapshot["/material-types"]["p95_ms"] == 5.0
+
+
+def test_percentiles_are_interpolated_below_ten_ms():
+    metrics = RequestMetrics()
+    for latency in [0.001] * 99 + [0.009]:
+        metrics.record("/accounts-bulk/check-transfer", latency)
+    bulk = metrics.snapshot()["/accounts-bulk/check-transfer"]
+    assert bulk["p50_ms"] == 1.0
+    assert bulk["p95_ms"] == 1.0
+    assert bulk["max_ms"] == 9.0
+    assert bulk["histogram"] == {"<=1ms": 99, "<=10ms": 1}
+
+
+def test_reset_clears_every_endpoint():
+    metrics = RequestMetrics()
+    metrics.record("/accounts", 0.1)
+    metrics.reset()
+    assert metrics.snapshot() == {}
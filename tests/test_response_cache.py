@@ -0,0 +1,47 @@
+from unittest.mock import patch
+from src.shared.response_cache import ResponseCache
+
+
+@patch("src.shared.response_cache.time.monotonic")
+def test_cache_follows_rules_and_ttl(mock_monotonic):
+    mock_monotonic.return_value = 0
+    cache = ResponseCache(rules=[{"path": "/material-types", "ttl": 60}])
+    cache.set("/material-types?limit=1000", {"mtypes": [{"id": "1"}]})
+    cache.set("/users/1", {"id": "1"})
+
+    result = cache.get("/material-types?limit=1000")
+    assert result == {"mtypes": [{"id": "1"}]}
+    result["mtypes"].append({"id": "2"})
+    assert cache.get("/material-types?limit=1000") == {"mtypes": [{"id": "1"}]}
+    assert cache.get("/users/1") is None
+
+    mock_monotonic.return_value = 61
+    assert cache.get("/material-types?limit=1000") is None
+    assert cache.stats() == {"hits": 2, "misses": 1, "entries": 0}
+
+
+def test_cache_drops_least_recently_used():
+    cache = ResponseCache(max_entries=2, rules=[{"path": "/owners*", "ttl": 60}])
+    cache.set("/owners/a", "a")
+    cache.set("/owners/b", "b")
+    cache.get("/owners/a")
+    cache.set("/owners/c", "c")
+    assert cache.get("/owners/b") is None
+    assert cache.get("/owners/a") == "a"
+    assert cache.get("/owners/c") == "c"
+
+
+@patch("src.shared.response_cache.time.monotonic")
+def test_callers_rules_decide_what_is_cached_and_fresh(mock_monotonic):
+    mock_monotonic.return_value = 0
+    cache = ResponseCache()
+    short = [{"path": "/owners", "ttl": 10}]
+    cache.set("/owners", {"owners": []})
+    assert cache.get("/owners", short) == {"owners": []}
+    assert cache.get("/owners", []) is None
+    cache.set("/users/1", {"id": "1"}, [{"path": "/users/*", "ttl": 60}])
+    assert cache.get("/users/1", [{"path": "/users/*", "ttl": 60}]) == {"id": "1"}
+
+    mock_monotonic.return_value = 11
+    assert cache.get("/owners") == {"owners": []}
+    assert cache.get("/owners", short) is None
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+from src.shared.retry_policy import RetryPolicy
+
+
+def test_methods_retry_only_their_reasons_and_statuses():
+    policy = RetryPolicy()
+    policy.record_request()
+    assert policy.next_delay("GET", 0, None, 504) is not None
+    assert policy.next_delay("POST", 0, None, 504) is None
+    assert policy.next_delay("POST", 0, None, "connect") is not None
+    assert policy.next_delay("POST", 0, None, "connection") is None
+    assert policy.next_delay("POST", 0, None, "timeout") is None
+    assert policy.next_delay("GET", 0, None, 404) is None
+    assert policy.next_delay("GET", 4, None, "timeout") is None
+
+
+def test_configured_policies_override_the_defaults():
+    policy = RetryPolicy(policies={"post": {"retries": 0}, "PUT": {"statuses": [409]}})
+    assert policy.next_delay("POST", 0, None, "timeout") is None
+    assert policy.next_delay("PUT", 0, None, 409) is not None
+    assert policy.next_delay("PUT", 0, None, "timeout") is not None
+
+
+def test_delays_use_decorrelated_jitter():
+    policy = RetryPolicy(base=1, cap=5)
+    with patch("src.shared.retry_policy.random.uniform", return_value=9.0) as mock_uniform:
+        assert policy.next_delay("GET", 1, 4.0, "timeout") == 5
+    mock_uniform.assert_called_once_with(1.0, 12.0)
+
+
+def test_budget_limits_retries_to_a_share_of_requests():
+    policy = RetryPolicy(budget_ratio=0.1, min_retries=1)
+    for _ in range(20):
+        policy.record_request()
+    allowed = [policy.next_delay("GET", 0, None, 503) for _ in range(5)]
+    assert sum(delay is not None for delay in allowed) == 3
+    assert policy.stats() == {"requests": 20, "retries": 3, "denied": 2,
+                              "reasons": {"503": 3}}
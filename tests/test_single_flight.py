@@ -0,0 +1,70 @@
+import threading
+import time
+from src.shared.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_call():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return {"id": "u1", "blocks": []}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("/users/u1", slow_call)))
+    leader.start()
+    started.wait()
+    waiters = [threading.Thread(target=lambda: results.append(flight.do("/users/u1", slow_call)))
+               for _ in range(3)]
+    for thread in waiters:
+        thread.start()
+    while flight.stats()["saved"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"id": "u1", "blocks": []}] * 4
+    results[0]["blocks"].append("changed")
+    assert results[1]["blocks"] == []
+    assert flight.stats() == {"calls": 1, "saved": 3}
+
+
+def test_errors_reach_waiters_and_key_is_released():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def failing_call():
+        started.set()
+        release.wait()
+        raise RuntimeError("boom")
+
+    errors = []
+
+    def run():
+        try:
+            flight.do("/manualblocks", failing_call)
+        except RuntimeError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait()
+    waiter = threading.Thread(target=run)
+    waiter.start()
+    while flight.stats()["saved"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert len(errors) == 2
+    assert flight.do("/manualblocks", lambda: "ok") == "ok"
+    assert flight.stats() == {"calls": 2, "saved": 1}
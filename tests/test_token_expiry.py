@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from src.shared.token_expiry import TokenExpiry
+
+
+def expiry_response(body):
+    response = MagicMock()
+    response.json.return_value = body
+    return response
+
+
+def test_tokens_expiring_within_the_skew_are_renewed():
+    expiry = TokenExpiry(skew=60)
+    now = datetime.now(timezone.utc)
+    expiry.update(expiry_response({
+        "accessTokenExpiration": (now + timedelta(seconds=30)).isoformat(),
+        "refreshTokenExpiration": (now + timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }))
+    assert expiry.access_expiring()
+    assert not expiry.refresh_expiring()
+    assert expiry.refresh_expires.tzinfo is not None
+
+
+def test_unknown_expiry_never_counts_as_expiring():
+    expiry = TokenExpiry()
+    response = expiry_response(None)
+    response.json.side_effect = ValueError("not JSON")
+    expiry.update(response)
+    expiry.update(expiry_response({"accessTokenExpiration": "soon"}))
+    assert expiry.access_expires is None
+    assert not expiry.access_expiring()
+    assert not expiry.refresh_expiring()
@@ -0,0 +1,510 @@
+"""
+folio_stub.py - a local stand-in for the FOLIO endpoints this project calls,
+backed by a SyntheticFolio dataset, for load testing without a live tenant.
+
+Start a stub with 100k fines across 20k patrons:
+    python -m utilities.folio_stub --fines 100000 --patrons 20000
+then point a run_env at it, e.g. STUB_BASE_URL=http://127.0.0.1:9130.
+With --run-job the stub runs in the background while JobProcessor processes
+the jobs in config/stub/jobs.yaml against it, and the wall time is printed.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from utilities.synthetic_folio import SyntheticFolio
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("pay", "waive", "transfer", "refund", "cancel")
+
+
+class FolioStubServer(ThreadingHTTPServer):
+    """
+    A threaded HTTP server that answers FOLIO API calls from a SyntheticFolio.
+    init:
+        address: The (host, port) to listen on.
+        dataset: The SyntheticFolio to serve.
+        latency: The average added latency in seconds.
+        error_rate: The share of requests answered with an injected error.
+        throttle_rate: The share of requests answered with a 429.
+        token_ttl: The seconds an access token is valid.
+        error_status: The status of the injected errors. The default 503 is
+            retried by the GET and POST retry policies; a 500 is never retried.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, address, dataset, latency=0.0, error_rate=0.0,
+                 throttle_rate=0.0, token_ttl=600, error_status=503):
+        super().__init__(address, FolioStubHandler)
+        self.dataset = dataset
+        self.latency = float(latency)
+        self.error_rate = float(error_rate)
+        self.throttle_rate = float(throttle_rate)
+        self.token_ttl = int(token_ttl)
+        self.error_status = int(error_status)
+        self.random = random.Random(dataset.seed)
+        self.lock = threading.Lock()
+        self.blocks = [dataset.block(i) for i in range(dataset.blocks)]
+        self.requests = 0
+
+    @property
+    def base_url(self):
+        """
+        This function returns the URL the stub answers on.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """
+        This function serves requests on a background thread.
+        :return: The server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        logger.info("FOLIO stub listening on %s", self.base_url)
+        return self
+
+
+class FolioStubHandler(BaseHTTPRequestHandler):
+    """
+    Answers one FOLIO API call. The CQL understood is the subset this
+    project sends: id==(...), id > "x", metadata.createdDate or updatedDate
+    comparisons, cql.allRecords=1 and sortby id. Other clauses match everything.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, delayed ACKs
+    # add 40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    server: FolioStubServer
+
+    __DATE_CLAUSE = re.compile(
+        r'metadata\.(?:createdDate|updatedDate)\s*(<=|>=|<|>)\s*"?([0-9][0-9T:.+\-Z]*)"?')
+    __AFTER_ID = re.compile(r'\bid\s*>\s*"([^"]+)"')
+    __ID_LIST = re.compile(r'\bid==\(([^)]*)\)|\bid=="([^"]+)"')
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def __reply(self, status, body=None, headers=None):
+        """
+        This function sends a JSON response.
+        """
+        content = b'' if body is None else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or []):
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def __body(self):
+        """
+        This function reads the JSON request body.
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def __tokens(self):
+        """
+        This function builds a new pair of token cookies.
+        """
+        now = time.time()
+        access = now + self.server.token_ttl
+        refresh = now + self.server.token_ttl * 6
+        cookies = [("Set-Cookie", f"folioAccessToken=stub-access-{access:.0f}; Path=/"),
+                   ("Set-Cookie", f"folioRefreshToken=stub-refresh-{refresh:.0f}; Path=/")]
+        body = {
+            "accessTokenExpiration": datetime.fromtimestamp(access, timezone.utc).isoformat(),
+            "refreshTokenExpiration": datetime.fromtimestamp(refresh, timezone.utc).isoformat(),
+        }
+        return cookies, body
+
+    def __token_valid(self, name, prefix):
+        """
+        This function checks a token cookie sent with the request.
+        """
+        for part in (self.headers.get("Cookie") or "").split(';'):
+            key, _, value = part.strip().partition('=')
+            if key == name and value.startswith(prefix):
+                try:
+                    return float(value[len(prefix):]) > time.time()
+                except ValueError:
+                    return False
+        return False
+
+    def __inject_faults(self):
+        """
+        This function adds latency and answers with injected errors.
+        :return: True when an error response was sent.
+        """
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            roll = server.random.random()
+            jitter = server.random.uniform(0.5, 1.5)
+        if server.latency:
+            time.sleep(server.latency * jitter)
+        if roll < server.throttle_rate:
+            self.__reply(429, {"errors": [{"message": "Too many requests"}]},
+                         [("Retry-After", "1")])
+            return True
+        if roll < server.throttle_rate + server.error_rate:
+            self.__reply(server.error_status,
+                         {"errors": [{"message": "Injected stub error"}]})
+            return True
+        return False
+
+    def __route(self, method):
+        """
+        This function authenticates, injects faults and dispatches a request.
+        """
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip('/')
+        query = {key: values[0] for key, values in parse_qs(parts.query).items()}
+        body = self.__body() if method in ("POST", "PUT") else {}
+        if path == "/authn/login-with-expiry" and method == "POST":
+            cookies, tokens = self.__tokens()
+            self.__reply(201, tokens, cookies)
+            return
+        if path == "/authn/refresh" and method == "POST":
+            if not self.__token_valid("folioRefreshToken", "stub-refresh-"):
+                self.__reply(401, {"errors": [{"message": "Invalid refresh token"}]})
+                return
+            cookies, tokens = self.__tokens()
+            self.__reply(200, tokens, cookies)
+            return
+        if not self.__token_valid("folioAccessToken", "stub-access-"):
+            self.__reply(401, {"errors": [{"message": "Token missing or expired"}]})
+            return
+        if self.__inject_faults():
+            return
+        segments = path.strip('/').split('/')
+        handler = {
+            "accounts": self.__accounts,
+            "accounts-bulk": self.__accounts_bulk,
+            "users": self.__users,
+            "material-types": self.__material_types,
+            "manualblocks": self.__manual_blocks,
+            "feefine-reports": self.__refund_report,
+        }.get(segments[0])
+        if handler is None:
+            self.__reply(404, {"errors": [{"message": f"No stub for {path}"}]})
+            return
+        handler(method, segments[1:], query, body)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """
+        This function answers a GET.
+        """
+        self.__route("GET")
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """
+        This function answers a POST.
+        """
+        self.__route("POST")
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """
+        This function answers a DELETE.
+        """
+        self.__route("DELETE")
+
+    def __select(self, query, count, index_of, created_index=None):
+        """
+        This function turns a CQL query into the ids or index range it selects.
+        :param query: The request query parameters.
+        :param count: The number of records in the collection.
+        :param index_of: Turns an id into an index.
+        :param created_index: Finds the first record created after a time.
+        :return: A list of indexes, or a (start, end) range.
+        """
+        cql = query.get("query", "cql.allRecords=1")
+        id_list = self.__ID_LIST.search(cql)
+        if id_list:
+            ids = re.findall(r'"([^"]+)"', id_list.group(1)) if id_list.group(1) \
+                else [id_list.group(2)]
+            return sorted({i for i in map(index_of, ids) if i is not None})
+        start, end = 0, count
+        after = self.__AFTER_ID.search(cql)
+        if after:
+            after_index = index_of(after.group(1))
+            start = count if after_index is None else after_index + 1
+        if created_index is not None:
+            for operator, value in self.__DATE_CLAUSE.findall(cql):
+                when = datetime.fromisoformat(value.replace('Z', '+00:00'))
+                if when.tzinfo is None:
+                    when = when.replace(tzinfo=timezone.utc)
+                if operator == '>':
+                    start = max(start, created_index(when, False))
+                elif operator == '>=':
+                    start = max(start, created_index(when, True))
+                elif operator == '<':
+                    end = min(end, created_index(when, True))
+                else:
+                    end = min(end, created_index(when, False))
+        return start, max(start, end)
+
+    def __page(self, key, selection, build, query):
+        """
+        This function sends one page of a collection.
+        :param key: The record key, e.g. "accounts".
+        :param selection: The result of __select.
+        :param build: Builds a record from its index.
+        :param query: The request query parameters.
+        """
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 10))
+        if isinstance(selection, list):
+            total = len(selection)
+            indexes = selection[offset:offset + limit]
+        else:
+            start, end = selection
+            total = end - start
+            indexes = range(start + offset, min(start + offset + limit, end))
+        self.__reply(200, {key: [build(i) for i in indexes], "totalRecords": total,
+                           "resultInfo": {"totalRecords": total}})
+
+    def __accounts(self, method, segments, query, body):
+        """
+        This function answers /accounts, /accounts/{id} and the account actions.
+        """
+        dataset = self.server.dataset
+        if not segments:
+            selection = self.__select(query, dataset.fines, dataset.account_index,
+                                      dataset.created_index)
+            self.__page("accounts", selection, dataset.account, query)
+            return
+        index = dataset.account_index(segments[0])
+        if index is None:
+            self.__reply(404, {"errors": [{"message": f"Account {segments[0]} not found"}]})
+            return
+        account = dataset.account(index)
+        if len(segments) == 1 and method == "GET":
+            self.__reply(200, account)
+            return
+        action = segments[1] if len(segments) == 2 else ""
+        amount = float(body.get("amount", account["remaining"]))
+        if action.startswith("check-") and action[len("check-"):] in ACTIONS:
+            allowed = 0 < amount <= account["remaining"]
+            self.__reply(200 if allowed else 422, {
+                "amount": f"{amount:.2f}",
+                "allowed": allowed,
+                "remainingAmount": f"{account['remaining'] - amount:.2f}",
+                **({} if allowed else {"errorMessage": "Invalid amount entered"}),
+            })
+            return
+        if action in ACTIONS and method == "POST":
+            self.__reply(201, {
+                "accountId": account["id"],
+                "amount": f"{amount:.2f}",
+                "remainingAmount": f"{account['remaining'] - amount:.2f}",
+                "feefineactions": [{"id": dataset.account_id(index), "typeAction": action}],
+            })
+            return
+        self.__reply(404, {"errors": [{"message": f"No stub for {self.path}"}]})
+
+    def __accounts_bulk(self, method, segments, _query, body):
+        """
+        This function answers the /accounts-bulk check and action endpoints.
+        The amount is checked against the total remaining on the accounts.
+        """
+        dataset = self.server.dataset
+        action = segments[0] if method == "POST" and len(segments) == 1 else ""
+        name = action[len("check-"):] if action.startswith("check-") else action
+        if name not in ACTIONS:
+            self.__reply(404, {"errors": [{"message": f"No stub for {self.path}"}]})
+            return
+        ids = body.get("accountIds") or []
+        indexes = [dataset.account_index(account_id) for account_id in ids]
+        if not ids or None in indexes:
+            self.__reply(404, {"errors": [{"message": "Account not found"}]})
+            return
+        remaining = sum(dataset.account(i)["remaining"] for i in indexes)
+        amount = float(body.get("amount", remaining))
+        if action.startswith("check-"):
+            allowed = 0 < amount <= remaining + 0.005
+            self.__reply(200 if allowed else 422, {
+                "accountIds": ids,
+                "amount": f"{amount:.2f}",
+                "allowed": allowed,
+                "remainingAmount": f"{remaining - amount:.2f}",
+                **({} if allowed else {"errorMessage": "Invalid amount entered"}),
+            })
+            return
+        self.__reply(201, {
+            "accountIds": ids,
+            "amount": f"{amount:.2f}",
+            "remainingAmount": f"{remaining - amount:.2f}",
+            "feefineactions": [{"accountId": dataset.account_id(i), "typeAction": name}
+                               for i in indexes],
+        })
+
+    def __users(self, method, segments, query, _body):
+        """
+        This function answers /users and /users/{id}.
+        """
+        dataset = self.server.dataset
+        if method != "GET":
+            self.__reply(405)
+            return
+        if not segments:
+            selection = self.__select(query, dataset.patrons, dataset.user_index)
+            self.__page("users", selection, dataset.user, query)
+            return
+        index = dataset.user_index(segments[0])
+        if index is None:
+            self.__reply(404, {"errors": [{"message": f"User {segments[0]} not found"}]})
+            return
+        self.__reply(200, dataset.user(index))
+
+    def __material_types(self, _method, _segments, query, _body):
+        """
+        This function answers /material-types.
+        """
+        mtypes = self.server.dataset.material_types()
+        limit = int(query.get("limit", 10))
+        self.__reply(200, {"mtypes": mtypes[:limit], "totalRecords": len(mtypes)})
+
+    def __manual_blocks(self, method, segments, query, body):
+        """
+        This function answers /manualblocks and /manualblocks/{id}.
+        """
+        server = self.server
+        with server.lock:
+            blocks = list(server.blocks)
+        if method == "GET" and not segments:
+            ids = [block["id"] for block in blocks]
+            selection = self.__select(
+                query, len(blocks), lambda block_id: ids.index(block_id) if block_id in ids else None)
+            self.__page("manualblocks", selection, lambda i: blocks[i], query)
+        elif method == "POST" and not segments:
+            block = dict(body, id=server.dataset.block(len(blocks) + 1_000_000)["id"])
+            with server.lock:
+                server.blocks.append(block)
+            self.__reply(201, block)
+        elif method == "DELETE" and segments:
+            with server.lock:
+                before = len(server.blocks)
+                server.blocks = [b for b in server.blocks if b["id"] != segments[0]]
+                deleted = len(server.blocks) < before
+            self.__reply(204 if deleted else 404)
+        else:
+            self.__reply(405)
+
+    def __refund_report(self, method, segments, _query, _body):
+        """
+        This function answers /feefine-reports/refund.
+        """
+        if method != "POST" or segments != ["refund"]:
+            self.__reply(404, {"errors": [{"message": f"No stub for {self.path}"}]})
+            return
+        self.__reply(200, {"reportData": self.server.dataset.refund_report()})
+
+
+def run_job(server):
+    """
+    This function runs the jobs in config/stub/jobs.yaml against a stub and
+    prints how long they took, or why they failed. STUB_* settings already in
+    the environment win.
+    :param server: The running FolioStubServer.
+    :return: True when every job succeeded.
+    """
+    # pylint: disable-next=import-outside-toplevel
+    from src.job_processor import JobProcessor
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.makedirs(os.path.join(root, "stub_output"), exist_ok=True)
+    for name, value in {
+            "STUB_BASE_URL": server.base_url,
+            "STUB_FOLIO_TENANT": "diku",
+            "STUB_USER_NAME": "stub",
+            "STUB_USER_PASSWORD": "stub",
+            "CONFIG_FILE_LOCATION": os.path.join(root, "config", "stub"),
+            "DATA_SETS_FILE_LOCATION": os.path.join(root, "config", "stub", "data_sets"),
+            "TEMPLATE_FILE_LOCATION": os.path.join(root, "templates"),
+    }.items():
+        os.environ.setdefault(name, value)
+    started = time.monotonic()
+    processor = JobProcessor()
+    try:
+        processor.run_active_jobs()
+    except Exception as e:  # pylint: disable=broad-except
+        elapsed = time.monotonic() - started
+        print(f"Job failed after {elapsed:.1f}s ({server.requests} FOLIO requests): {e}")
+        return False
+    elapsed = time.monotonic() - started
+    fines = server.dataset.fines
+    print(f"Processed {fines} fines in {elapsed:.1f}s "
+          f"({fines / elapsed:.0f} fines/s, {server.requests} FOLIO requests).")
+    return True
+
+
+def main():
+    """
+    This function starts the stub from the command line.
+    """
+    parser = argparse.ArgumentParser(description="Run a local FOLIO stub for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9130)
+    parser.add_argument("--fines", type=int, default=10000)
+    parser.add_argument("--patrons", type=int, default=2000)
+    parser.add_argument("--refunds", type=int, default=100)
+    parser.add_argument("--blocks", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0,
+                        help="Average latency added to every request.")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="Share of requests answered with an injected error.")
+    parser.add_argument("--error-status", type=int, default=503,
+                        help="Status of the injected errors, e.g. 502, 503 or 504.")
+    parser.add_argument("--throttle-rate", type=float, default=0,
+                        help="Share of requests answered with a 429.")
+    parser.add_argument("--token-ttl", type=int, default=600,
+                        help="Seconds an access token is valid.")
+    parser.add_argument("--run-job", action="store_true",
+                        help="Run config/stub/jobs.yaml against the stub and exit.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    dataset = SyntheticFolio(fines=args.fines, patrons=args.patrons, refunds=args.refunds,
+                             blocks=args.blocks, seed=args.seed)
+    server = FolioStubServer((args.host, args.port), dataset,
+                             latency=args.latency_ms / 1000, error_rate=args.error_rate,
+                             throttle_rate=args.throttle_rate, token_ttl=args.token_ttl,
+                             error_status=args.error_status)
+    if args.run_job:
+        server.start()
+        try:
+            succeeded = run_job(server)
+        finally:
+            server.shutdown()
+        if not succeeded:
+            sys.exit(1)
+        return
+    logger.info("FOLIO stub serving %d fines across %d patrons on %s",
+                args.fines, args.patrons, server.base_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
+
+# End of folio_stub.py
@@ -0,0 +1,238 @@
+"""
+synthetic_folio.py - generates a repeatable FOLIO dataset of fines, patrons,
+material types, refunds and manual blocks for the local FOLIO stub.
+"""
+from datetime import datetime, timedelta, timezone
+
+
+class SyntheticFolio:
+    """
+    A synthetic FOLIO tenant. Records are built from their index when they
+    are asked for, so a million fines take no memory until they are served.
+    Fines are ordered oldest first and their ids sort in the same order, so
+    date ranges and keyset paging map to index ranges.
+    init:
+        fines: The number of fines (accounts).
+        patrons: The number of patrons the fines are spread across.
+        refunds: The number of rows in the refund report.
+        blocks: The number of manual blocks.
+        max_age_days / min_age_days: The age range of the fines.
+        seed: Changes every id, so two datasets never share records.
+    exposed methods:
+        account_id(index: int) -> str, account(index: int) -> dict,
+        account_index(account_id: str) -> int: Fines.
+        user_id(index: int) -> str, user(index: int) -> dict,
+        user_index(user_id: str) -> int: Patrons.
+        block(index: int) -> dict: Manual blocks.
+        material_types() -> list: The material types.
+        created_index(when: datetime, inclusive: bool) -> int: The first fine
+            created after (or at) a time.
+        refund_report() -> list: The rows of the refund report.
+    """
+
+    MATERIAL_TYPES = ["book", "dvd", "laptop", "periodical", "sound recording",
+                      "video recording", "microform", "map", "score", "electronic resource"]
+    FEE_FINE_TYPES = ["Overdue fine", "Lost item fee", "Lost item processing fee",
+                      "Replacement processing fee"]
+    FIRST_NAMES = ["Ada", "Grace", "Alan", "Edsger", "Barbara", "Donald", "Frances", "Ken"]
+    LAST_NAMES = ["Lovelace", "Hopper", "Turing", "Dijkstra", "Liskov", "Knuth", "Allen", "Thompson"]
+
+    # pylint: disable-next=too-many-arguments
+    def __init__(self, fines=1000, patrons=200, refunds=0, blocks=0,
+                 max_age_days=365, min_age_days=31, seed=1, now=None):
+        self.fines = int(fines)
+        self.patrons = max(int(patrons), 1)
+        self.refunds = int(refunds)
+        self.blocks = int(blocks)
+        self.seed = int(seed)
+        now = now or datetime.now(timezone.utc)
+        self.__newest = now - timedelta(days=int(min_age_days))
+        self.__oldest = now - timedelta(days=int(max_age_days) - 1)
+        self.__span = (self.__newest - self.__oldest).total_seconds()
+
+    def __id(self, index, kind):
+        """
+        This function builds a UUID shaped id that sorts in index order.
+        :param index: The record index.
+        :param kind: A hex digit that tells the record types apart.
+        :return: The id.
+        """
+        return f"{index:08x}-{kind}000-4000-8000-{self.seed:012x}"
+
+    def __index(self, record_id, kind):
+        """
+        This function turns an id back into its index.
+        :param record_id: The id.
+        :param kind: The hex digit of the record type.
+        :return: The index, or None if the id is not one of ours.
+        """
+        parts = str(record_id).split('-')
+        if len(parts) != 5 or parts[1] != f"{kind}000" or parts[4] != f"{self.seed:012x}":
+            return None
+        try:
+            return int(parts[0], 16)
+        except ValueError:
+            return None
+
+    def created_at(self, index):
+        """
+        This function returns the creation time of a fine.
+        :param index: The fine index.
+        :return: A timezone aware datetime.
+        """
+        fraction = index / max(self.fines - 1, 1)
+        return self.__oldest + timedelta(seconds=self.__span * fraction)
+
+    def created_index(self, when, inclusive=False):
+        """
+        This function finds the first fine created after a time.
+        :param when: The time.
+        :param inclusive: Include fines created exactly at the time.
+        :return: The fine index, which is self.fines when there is none.
+        """
+        low, high = 0, self.fines
+        while low < high:
+            middle = (low + high) // 2
+            created = self.created_at(middle)
+            if created > when or (inclusive and created == when):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def account_id(self, index):
+        """
+        This function returns the id of a fine.
+        """
+        return self.__id(index, 'a')
+
+    def account_index(self, account_id):
+        """
+        This function returns the index of a fine id, or None.
+        """
+        index = self.__index(account_id, 'a')
+        return index if index is not None and index < self.fines else None
+
+    def user_id(self, index):
+        """
+        This function returns the id of a patron.
+        """
+        return self.__id(index, 'b')
+
+    def user_index(self, user_id):
+        """
+        This function returns the index of a patron id, or None.
+        """
+        index = self.__index(user_id, 'b')
+        return index if index is not None and index < self.patrons else None
+
+    def material_type_id(self, index):
+        """
+        This function returns the id of a material type.
+        """
+        return self.__id(index, 'd')
+
+    def material_types(self):
+        """
+        This function returns the material types.
+        """
+        return [{"id": self.material_type_id(i), "name": name, "source": "local"}
+                for i, name in enumerate(self.MATERIAL_TYPES)]
+
+    def account(self, index):
+        """
+        This function builds a fine.
+        :param index: The fine index.
+        :return: The account record.
+        """
+        created = self.created_at(index).strftime('%Y-%m-%dT%H:%M:%S.000+00:00')
+        amount = round(1 + (index * 37 % 5000) / 100, 2)
+        material = index % len(self.MATERIAL_TYPES)
+        fee_fine = index % len(self.FEE_FINE_TYPES)
+        return {
+            "id": self.account_id(index),
+            "amount": amount,
+            "remaining": amount,
+            "status": {"name": "Open"},
+            "paymentStatus": {"name": "Outstanding"},
+            "feeFineType": self.FEE_FINE_TYPES[fee_fine],
+            "feeFineId": self.__id(fee_fine, 'e'),
+            "feeFineOwner": "Main Library",
+            "ownerId": self.__id(0, 'f'),
+            "title": f"Synthetic title {index}",
+            "barcode": f"3{index:012d}",
+            "callNumber": f"QA76.{index % 1000} .S9",
+            "materialType": self.MATERIAL_TYPES[material],
+            "materialTypeId": self.material_type_id(material),
+            "itemId": self.__id(index, 'c'),
+            "loanId": self.__id(index, '9'),
+            "userId": self.user_id(index * 2654435761 % self.patrons),
+            "metadata": {"createdDate": created, "updatedDate": created},
+        }
+
+    def user(self, index):
+        """
+        This function builds a patron.
+        :param index: The patron index.
+        :return: The user record.
+        """
+        first = self.FIRST_NAMES[index % len(self.FIRST_NAMES)]
+        last = self.LAST_NAMES[index // len(self.FIRST_NAMES) % len(self.LAST_NAMES)]
+        return {
+            "id": self.user_id(index),
+            "username": f"{first.lower()}.{last.lower()}{index}",
+            "barcode": f"2{index:012d}",
+            "externalSystemId": f"{index:012d}",
+            "active": True,
+            "patronGroup": self.__id(index % 3, '8'),
+            "personal": {"firstName": first, "lastName": last,
+                         "email": f"{first.lower()}.{last.lower()}{index}@example.edu"},
+            "customFields": {"bursar": "opt_0"},
+        }
+
+    def block(self, index):
+        """
+        This function builds a manual block for one of the fines.
+        :param index: The block index.
+        :return: The manual block record.
+        """
+        account = index * max(self.fines // max(self.blocks, 1), 1) % max(self.fines, 1)
+        return {
+            "id": self.__id(index, '7'),
+            "type": "Manual",
+            "desc": "Outstanding fines",
+            "staffInformation": f"Fine {self.account_id(account)}",
+            "borrowing": True,
+            "renewals": False,
+            "requests": False,
+            "userId": self.user_id(account * 2654435761 % self.patrons),
+        }
+
+    def refund_report(self):
+        """
+        This function builds the rows of the refund report.
+        :return: A list of refund rows, one per refunded fine.
+        """
+        step = max(self.fines // max(self.refunds, 1), 1)
+        rows = []
+        for i in range(min(self.refunds, self.fines)):
+            account = self.account(i * step)
+            user = self.user(self.user_index(account['userId']))
+            rows.append({
+                "feeFineId": account['id'],
+                "patronId": user['id'],
+                "patronName": f"{user['personal']['lastName']}, {user['personal']['firstName']}",
+                "patronBarcode": user['barcode'],
+                "feeFineType": account['feeFineType'],
+                "billedAmount": f"{account['amount']:.2f}",
+                "paidAmount": f"{account['amount']:.2f}",
+                "refundAmount": f"{account['amount']:.2f}",
+                "refundAction": "Refunded to patron",
+                "refundReason": "Item returned",
+                "feeFineOwner": account['feeFineOwner'],
+                "itemBarcode": account['barcode'],
+                "title": account['title'],
+            })
+        return rows
+
+# End of synthetic_folio.py